@@ -1,9 +1,9 @@
 import re
 from passlib.context import CryptContext
 import secrets
-import smtplib
-from email.mime.text import MIMEText
 import os
+import asyncio
+from concurrent.futures import ProcessPoolExecutor
 from dotenv import load_dotenv
 from jose import JWTError, jwt
 from datetime import datetime, timedelta
@@ -11,7 +11,23 @@ from sqlalchemy.orm import Session  # Добавляем импорт Session
 
 load_dotenv()
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Стоимость bcrypt. Хэши с другим числом раундов перехешируются при входе
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__default_rounds=BCRYPT_ROUNDS,
+    bcrypt__min_rounds=BCRYPT_ROUNDS,
+    bcrypt__max_rounds=BCRYPT_ROUNDS
+)
+
+# Пул процессов для bcrypt: хэширование не держит поток запроса и GIL
+PASSWORD_WORKERS = int(os.getenv("PASSWORD_WORKERS", "2"))
+# Сколько операций может выполняться и ждать в очереди одновременно
+PASSWORD_MAX_PENDING = int(os.getenv("PASSWORD_MAX_PENDING", "32"))
+# Сколько секунд запрос ждет места в очереди, прежде чем получить отказ
+PASSWORD_QUEUE_TIMEOUT = float(os.getenv("PASSWORD_QUEUE_TIMEOUT", "5"))
 
 # JWT настройки
 SECRET_KEY = os.getenv("JWT_SECRET_KEY", "your-secret-key-change-in-production")
@@ -72,23 +88,55 @@ def get_password_hash(password):
 def verify_password(plain_password, hashed_password):
     return pwd_context.verify(plain_password, hashed_password)
 
+def verify_and_update_password(plain_password, hashed_password):
+    """(пароль верен, новый хэш или None, если пересчет не нужен)"""
+    return pwd_context.verify_and_update(plain_password, hashed_password)
+
+class PasswordPoolBusy(Exception):
+    """Очередь операций с паролями переполнена"""
+
+_password_pool = None
+_password_slots = asyncio.Semaphore(PASSWORD_MAX_PENDING)
+
+def get_password_pool():
+    global _password_pool
+    if _password_pool is None:
+        _password_pool = ProcessPoolExecutor(max_workers=PASSWORD_WORKERS)
+    return _password_pool
+
+def shutdown_password_pool():
+    global _password_pool
+    if _password_pool is not None:
+        _password_pool.shutdown(wait=False, cancel_futures=True)
+        _password_pool = None
+
+async def run_password_job(func, *args):
+    """Выполнить bcrypt в пуле процессов с ограниченной очередью"""
+    try:
+        await asyncio.wait_for(_password_slots.acquire(), PASSWORD_QUEUE_TIMEOUT)
+    except asyncio.TimeoutError:
+        raise PasswordPoolBusy()
+    try:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(get_password_pool(), func, *args)
+    finally:
+        _password_slots.release()
+
+async def get_password_hash_async(password):
+    if len(password.encode('utf-8')) > 72:
+        raise ValueError("Password too long")
+    return await run_password_job(get_password_hash, password)
+
+async def verify_password_async(plain_password, hashed_password):
+    return await run_password_job(verify_and_update_password, plain_password, hashed_password)
+
 def generate_registration_token():
     return secrets.token_urlsafe(32)
 
-def send_registration_email(email: str, token: str):
-    """Отправка email с регистрационным токеном"""
-    try:
-        smtp_server = os.getenv("SMTP_SERVER", "smtp.yandex.ru")
-        smtp_port = int(os.getenv("SMTP_PORT", "587"))
-        smtp_username = os.getenv("SMTP_USERNAME")
-        smtp_password = os.getenv("SMTP_PASSWORD")
-        
-        if not all([smtp_username, smtp_password]):
-            print(f"SMTP credentials not configured. Token for {email}: {token}")
-            raise Exception("SMTP не настроен")
-        
-        subject = "Регистрация в системе СистемаКонтроля"
-        body = f"""
+def build_registration_email(token: str):
+    """Тема и текст письма с регистрационным токеном"""
+    subject = "Регистрация в системе СистемаКонтроля"
+    body = f"""
         Добро пожаловать в систему СистемаКонтроля!
         
         Для завершения регистрации перейдите по ссылке:
@@ -99,23 +147,7 @@ def send_registration_email(email: str, token: str):
         С уважением,
         Команда СистемаКонтроля
         """
-        
-        msg = MIMEText(body)
-        msg['Subject'] = subject
-        msg['From'] = smtp_username
-        msg['To'] = email
-        
-        with smtplib.SMTP(smtp_server, smtp_port) as server:
-            server.starttls()
-            server.login(smtp_username, smtp_password)
-            server.send_message(msg)
-            
-        print(f"Registration email sent to {email}")
-        return True
-        
-    except Exception as e:
-        print(f"Failed to send email to {email}: {str(e)}")
-        raise Exception(f"Ошибка отправки email: {str(e)}")
+    return subject, body
 
 def create_access_token(data: dict, expires_delta: timedelta = None):
     to_encode = data.copy()
@@ -0,0 +1,356 @@
+"""Нагрузочный тест API с отчетом в JSON.
+
+Синтетические данные — тот же генератор, что python -m app.seed:
+
+    python -m app.bench seed --projects 100 --defects 1000000 --history 5000000
+
+Прогон сценариев (вход, список дефектов, статистика, создание и изменение
+дефекта) с фиксированной конкурентностью. Без --url приложение запускается
+в этом же процессе; с --url нагружается уже запущенный сервер:
+
+    python -m app.bench run --concurrency 16 --duration 30 --output bench.json
+
+Холодный старт: каждый прогон — новый процесс Python, который импортирует
+app.main, выполняет lifespan и отвечает на первый запрос:
+
+    python -m app.bench startup --runs 5
+
+Число SQL-запросов на HTTP-запрос берется из /metrics до и после прогона.
+В отчет пишется текущий коммит, чтобы результаты можно было сравнивать.
+"""
+import argparse
+import asyncio
+import json
+import random
+import re
+import subprocess
+import sys
+import time
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import func, select
+
+from . import models
+from .seed import DEFECT_TITLES
+
+
+# 🌱 ДАННЫЕ
+def dataset_size(db) -> dict:
+    return {
+        name: db.scalar(select(func.count()).select_from(model))
+        for name, model in [
+            ("users", models.User), ("projects", models.Project), ("defects", models.Defect),
+            ("history", models.DefectHistory), ("comments", models.DefectComment),
+        ]
+    }
+
+
+# 🏃 ПРОГОН
+def percentile(sorted_values: list, fraction: float) -> Optional[float]:
+    if not sorted_values:
+        return None
+    index = min(int(fraction * len(sorted_values)), len(sorted_values) - 1)
+    return sorted_values[index]
+
+
+def summarize(latencies: list, errors: int, seconds: float) -> dict:
+    values = sorted(latencies)
+    ms = lambda value: round(value * 1000, 2) if value is not None else None
+    return {
+        "requests": len(values),
+        "errors": errors,
+        "throughput_rps": round(len(values) / seconds, 2) if seconds else None,
+        "mean_ms": ms(sum(values) / len(values)) if values else None,
+        "p50_ms": ms(percentile(values, 0.50)),
+        "p95_ms": ms(percentile(values, 0.95)),
+        "p99_ms": ms(percentile(values, 0.99)),
+        "max_ms": ms(values[-1]) if values else None,
+    }
+
+
+METRIC_LINE = re.compile(r'^db_queries_per_request_(sum|count)\{method="([^"]*)",route="([^"]*)"\} (\S+)$')
+
+
+async def query_counters(client) -> dict:
+    """{"МЕТОД маршрут": [сумма запросов к БД, число HTTP-запросов]} из /metrics"""
+    counters = {}
+    response = await client.get("/metrics")
+    for line in response.text.splitlines():
+        match = METRIC_LINE.match(line)
+        if match:
+            kind, method, route, value = match.groups()
+            counters.setdefault(f"{method} {route}", [0.0, 0.0])[0 if kind == "sum" else 1] = float(value)
+    return counters
+
+
+class Scenarios:
+    """Сценарии нагрузки; каждый возвращает HTTP-ответ"""
+
+    def __init__(self, client, headers: dict, login: str, password: str, project_ids: list, defect_ids: list):
+        self.client = client
+        self.headers = headers
+        self.login_data = {"login": login, "password": password}
+        self.project_ids = project_ids
+        self.defect_ids = defect_ids
+
+    async def login(self, rng):
+        return await self.client.post("/auth/login", json=self.login_data)
+
+    async def list_defects(self, rng):
+        params = {"limit": 100}
+        if rng.random() < 0.5:
+            params["project_id"] = rng.choice(self.project_ids)
+        return await self.client.get("/api/defects", params=params, headers=self.headers)
+
+    async def statistics(self, rng):
+        return await self.client.get(
+            "/api/reports/defects-statistics", params={"breakdown": "project"}, headers=self.headers
+        )
+
+    async def create_defect(self, rng):
+        response = await self.client.post("/api/defects", headers=self.headers, json={
+            "title": rng.choice(DEFECT_TITLES),
+            "description": "Создан нагрузочным тестом",
+            "project_id": rng.choice(self.project_ids),
+            "priority": rng.choice(list(models.PriorityLevel)).value,
+        })
+        if response.status_code == 200:
+            self.defect_ids.append(response.json()["id"])
+        return response
+
+    async def update_defect(self, rng):
+        return await self.client.patch(
+            f"/api/defects/{rng.choice(self.defect_ids)}",
+            headers=self.headers,
+            json={"status": rng.choice(list(models.DefectStatus)).value}
+        )
+
+
+SCENARIO_WEIGHTS = {
+    "list_defects": 50,
+    "statistics": 15,
+    "update_defect": 15,
+    "create_defect": 10,
+    "login": 10,
+}
+
+
+async def run_benchmark(client, concurrency: int, duration: float, requests: Optional[int],
+                        login: str, password: str, seed: int, warmup: int) -> dict:
+    response = await client.post("/auth/login", json={"login": login, "password": password})
+    response.raise_for_status()
+    headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+    project_ids = [project["id"] for project in (await client.get("/api/projects", headers=headers)).json()]
+    defect_ids = [defect["id"] for defect in (await client.get(
+        "/api/defects", params={"limit": 1000}, headers=headers
+    )).json()]
+    if not project_ids or not defect_ids:
+        raise SystemExit("Нет проектов или дефектов: сначала python -m app.bench seed")
+
+    scenarios = Scenarios(client, headers, login, password, project_ids, defect_ids)
+    names = list(SCENARIO_WEIGHTS)
+    weights = [SCENARIO_WEIGHTS[name] for name in names]
+
+    # Прогрев: соединения пула, кэши и JIT-кэши драйверов
+    for i in range(warmup):
+        rng = random.Random(seed - i - 1)
+        await getattr(scenarios, rng.choices(names, weights)[0])(rng)
+
+    latencies = {name: [] for name in names}
+    errors = {name: 0 for name in names}
+    issued = 0
+    before = await query_counters(client)
+    started = time.perf_counter()
+    deadline = started + duration
+
+    async def worker(worker_id: int):
+        nonlocal issued
+        rng = random.Random(seed * 1000 + worker_id)
+        while time.perf_counter() < deadline and (requests is None or issued < requests):
+            issued += 1
+            name = rng.choices(names, weights)[0]
+            request_started = time.perf_counter()
+            try:
+                response = await getattr(scenarios, name)(rng)
+                failed = response.status_code >= 400
+            except Exception:
+                failed = True
+            latencies[name].append(time.perf_counter() - request_started)
+            errors[name] += failed
+
+    await asyncio.gather(*(worker(i) for i in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    after = await query_counters(client)
+
+    queries = {}
+    for route, (total, count) in after.items():
+        old_total, old_count = before.get(route, [0.0, 0.0])
+        if count > old_count and not route.endswith(" /metrics"):
+            queries[route] = round((total - old_total) / (count - old_count), 2)
+
+    return {
+        "seconds": round(elapsed, 2),
+        "total": summarize([v for values in latencies.values() for v in values], sum(errors.values()), elapsed),
+        "scenarios": {name: summarize(latencies[name], errors[name], elapsed) for name in names},
+        "db_queries_per_request": queries,
+    }
+
+
+# 🚀 ХОЛОДНЫЙ СТАРТ
+STARTUP_PROBE = """
+import asyncio, json, sys, time
+import httpx
+started = time.perf_counter()
+from app.main import app
+imported = time.perf_counter()
+
+async def probe():
+    async with app.router.lifespan_context(app):
+        ready = time.perf_counter()
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            response = await client.get(sys.argv[1])
+            response.raise_for_status()
+        return ready, time.perf_counter()
+
+ready, answered = asyncio.run(probe())
+print(json.dumps({
+    "import": imported - started,
+    "lifespan": ready - imported,
+    "first_request": answered - ready,
+}))
+"""
+
+
+def run_startup(runs: int, path: str) -> dict:
+    """Фазы старта по отдельности и общее время от запуска процесса до первого ответа"""
+    phases = {"process": [], "import": [], "lifespan": [], "first_request": []}
+    for _ in range(runs):
+        started = time.perf_counter()
+        completed = subprocess.run(
+            [sys.executable, "-c", STARTUP_PROBE, path], capture_output=True, text=True
+        )
+        elapsed = time.perf_counter() - started
+        if completed.returncode != 0:
+            raise SystemExit(f"Приложение не запустилось:\n{completed.stderr}")
+        result = json.loads(completed.stdout.strip().splitlines()[-1])
+        phases["process"].append(elapsed)
+        for name, value in result.items():
+            phases[name].append(value)
+
+    ms = lambda value: round(value * 1000, 1)
+    return {
+        "commit": git_commit(),
+        "started_at": datetime.utcnow().isoformat(timespec="seconds") + "Z",
+        "runs": runs,
+        "path": path,
+        "phases_ms": {
+            name: {
+                "min": ms(min(values)),
+                "median": ms(sorted(values)[len(values) // 2]),
+                "max": ms(max(values)),
+            }
+            for name, values in phases.items()
+        },
+    }
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def run_command(args) -> dict:
+    import httpx
+
+    if args.url:
+        transport = None
+        base_url = args.url
+    else:
+        from .main import app
+        transport = httpx.ASGITransport(app=app)
+        base_url = "http://bench"
+
+    limits = httpx.Limits(max_connections=args.concurrency * 2)
+    async with httpx.AsyncClient(base_url=base_url, transport=transport, limits=limits, timeout=60) as client:
+        result = await run_benchmark(
+            client, args.concurrency, args.duration, args.requests,
+            args.login, args.password, args.seed, args.warmup
+        )
+
+    dataset = None
+    if not args.url:
+        from .database import SessionLocal
+        with SessionLocal() as db:
+            dataset = dataset_size(db)
+
+    return {
+        "commit": git_commit(),
+        "started_at": datetime.utcnow().isoformat(timespec="seconds") + "Z",
+        "target": args.url or "in-process",
+        "config": {
+            "concurrency": args.concurrency,
+            "duration": args.duration,
+            "requests": args.requests,
+            "seed": args.seed,
+            "weights": SCENARIO_WEIGHTS,
+        },
+        "dataset": dataset,
+        **result,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m app.bench", description="Нагрузочный тест API")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    seed_parser = commands.add_parser("seed", help="добавить синтетические данные")
+    seed_parser.add_argument("--projects", type=int, default=100)
+    seed_parser.add_argument("--defects", type=int, default=1_000_000)
+    seed_parser.add_argument("--history", type=int, default=5_000_000)
+    seed_parser.add_argument("--comments", type=int, default=500_000)
+    seed_parser.add_argument("--users", type=int, default=200)
+    seed_parser.add_argument("--seed", type=int, default=42)
+
+    run_parser = commands.add_parser("run", help="прогнать сценарии и вывести отчет JSON")
+    run_parser.add_argument("--url", help="адрес запущенного сервера; без него — в этом процессе")
+    run_parser.add_argument("--concurrency", type=int, default=16)
+    run_parser.add_argument("--duration", type=float, default=30, help="секунд")
+    run_parser.add_argument("--requests", type=int, help="остановиться после N запросов")
+    run_parser.add_argument("--warmup", type=int, default=20, help="запросов до начала замера")
+    run_parser.add_argument("--login", default="test@example.com")
+    run_parser.add_argument("--password", default="Test123!")
+    run_parser.add_argument("--seed", type=int, default=42)
+    run_parser.add_argument("--output", help="файл для отчета (по умолчанию stdout)")
+
+    startup_parser = commands.add_parser("startup", help="время холодного старта до первого ответа")
+    startup_parser.add_argument("--runs", type=int, default=5)
+    startup_parser.add_argument("--path", default="/health", help="первый запрос")
+    startup_parser.add_argument("--output", help="файл для отчета (по умолчанию stdout)")
+
+    args = parser.parse_args(argv)
+
+    if args.command == "seed":
+        from .database import engine
+        from .seed import seed_dataset
+        result = seed_dataset(engine, args.projects, args.defects, args.history, args.comments, args.users, args.seed)
+    elif args.command == "startup":
+        result = run_startup(args.runs, args.path)
+    else:
+        result = asyncio.run(run_command(args))
+
+    report = json.dumps(result, ensure_ascii=False, indent=2)
+    if getattr(args, "output", None):
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(report + "\n")
+    print(report)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,29 +1,85 @@
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 import os
+import time
 from dotenv import load_dotenv
 
+from .metrics import observe_pool_wait
+
 load_dotenv()
 
 DATABASE_URL = os.getenv("DATABASE_URL")
 
+# Асинхронный драйвер для того же сервера: mysql+pymysql -> mysql+aiomysql
+ASYNC_DRIVERS = {
+    "mysql+pymysql": "mysql+aiomysql",
+    "mysql": "mysql+aiomysql",
+    "sqlite": "sqlite+aiosqlite",
+    "postgresql": "postgresql+asyncpg",
+    "postgresql+psycopg2": "postgresql+asyncpg",
+}
+
+def make_async_url(url: str) -> str:
+    scheme, rest = url.split("://", 1)
+    return f"{ASYNC_DRIVERS.get(scheme, scheme)}://{rest}"
+
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL") or make_async_url(DATABASE_URL)
+
+# SQL_ECHO=1 — печатать все запросы (для отладки; медленные — SQL_PROFILING в app.profiling)
+SQL_ECHO = os.getenv("SQL_ECHO", "0") == "1"
+
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+
+def pool_options(url: str) -> dict:
+    # У SQLite свой пул без size/overflow
+    if url.startswith("sqlite"):
+        return {}
+    return {
+        "pool_pre_ping": True,
+        "pool_recycle": 300,
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+    }
+
+# Синхронный движок: регистрация/вход и служебные команды
 engine = create_engine(
     DATABASE_URL,
-    pool_pre_ping=True,
-    pool_recycle=300,
-    pool_size=5,
-    max_overflow=10,
-    echo=False
+    echo=SQL_ECHO,
+    **pool_options(DATABASE_URL)
+)
+
+# Асинхронный движок: обработчики /api/*
+async_engine = create_async_engine(
+    ASYNC_DATABASE_URL,
+    echo=SQL_ECHO,
+    **pool_options(ASYNC_DATABASE_URL)
 )
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+AsyncSessionLocal = async_sessionmaker(
+    async_engine,
+    class_=AsyncSession,
+    autoflush=False,
+    expire_on_commit=False
+)
+
 Base = declarative_base()
 
-def get_db():
+async def get_db():
+    async with AsyncSessionLocal() as db:
+        # Соединение берется сразу, чтобы измерить ожидание свободного в пуле
+        started = time.perf_counter()
+        await db.connection()
+        observe_pool_wait(time.perf_counter() - started)
+        yield db
+
+def get_sync_db():
     db = SessionLocal()
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
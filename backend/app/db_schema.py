@@ -0,0 +1,203 @@
+"""Миграции схемы (Alembic) и сверка моделей с живой базой.
+
+Схема меняется только миграциями из backend/migrations: create_all не
+добавляет индексы и колонки к существующим таблицам и блокирует их на время
+ALTER. Индексы на больших таблицах (defects, defect_history) строятся
+без блокировки записи: в PostgreSQL — CREATE INDEX CONCURRENTLY, в MySQL —
+ALGORITHM=INPLACE, LOCK=NONE. Базу, созданную раньше через create_all,
+migrate сначала помечает исходной ревизией, затем доводит до последней.
+
+    python -m app.manage migrate        применить миграции
+    python -m app.manage check-schema   app.models совпадают с базой?
+"""
+import os
+
+from alembic import command, op
+from alembic.autogenerate import compare_metadata
+from alembic.config import Config
+from alembic.runtime.migration import MigrationContext
+from alembic.script import ScriptDirectory
+from sqlalchemy import inspect, text
+
+from .database import Base
+from . import models  # noqa: F401 — регистрирует таблицы в Base.metadata
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Схема, которую создавал create_all до появления миграций
+BASELINE_REVISION = "0001"
+# Объекты, которых нет в моделях или которые есть только в одной СУБД
+IGNORED_TABLES = {"alembic_version", "search_fts"}
+DIALECT_ONLY_INDEXES = {"ix_search_documents_terms": "mysql"}
+
+
+def alembic_config(connection=None) -> Config:
+    config = Config(os.path.join(BACKEND_DIR, "alembic.ini"))
+    config.set_main_option("script_location", os.path.join(BACKEND_DIR, "migrations"))
+    if connection is not None:
+        config.attributes["connection"] = connection
+    return config
+
+
+def include_object_for(dialect: str):
+    """Фильтр объектов для автогенерации и check-schema"""
+    def include_object(obj, name, type_, reflected, compare_to):
+        if type_ == "table" and (name in IGNORED_TABLES or name.startswith("search_fts_")):
+            return False
+        if type_ == "index" and name in DIALECT_ONLY_INDEXES:
+            return DIALECT_ONLY_INDEXES[name] == dialect
+        return True
+    return include_object
+
+
+def migrate(engine, revision: str = "head"):
+    with engine.connect() as connection:
+        tables = set(inspect(connection).get_table_names())
+        # Инспекция открыла транзакцию; миграции управляют транзакциями сами
+        connection.commit()
+
+        config = alembic_config(connection)
+        if "defects" in tables and "alembic_version" not in tables:
+            print(f"Схема создана без миграций: помечаем ревизией {BASELINE_REVISION}")
+            command.stamp(config, BASELINE_REVISION)
+        command.upgrade(config, revision)
+
+
+def schema_status(engine) -> dict:
+    """Текущая и последняя ревизии и расхождения app.models с базой"""
+    heads = set(ScriptDirectory.from_config(alembic_config()).get_heads())
+    with engine.connect() as connection:
+        context = MigrationContext.configure(connection, opts={
+            "include_object": include_object_for(connection.dialect.name),
+            "compare_type": True,
+        })
+        current = set(context.get_current_heads())
+        differences = compare_metadata(context, Base.metadata)
+    return {"current": sorted(current), "heads": sorted(heads), "differences": differences}
+
+
+def describe_difference(difference) -> str:
+    """Строка для отчета check-schema из элемента compare_metadata"""
+    if isinstance(difference, list):
+        # modify_* одной колонки приходят списком
+        return "; ".join(describe_difference(item) for item in difference)
+    kind = difference[0]
+    if kind.startswith("modify_"):
+        _, _, table, column, _, old, new = difference
+        return f"{kind} {table}.{column}: {old} -> {new}"
+    if kind in ("add_column", "remove_column"):
+        return f"{kind} {difference[2]}.{difference[3].name}"
+    obj = difference[1]
+    table = getattr(obj, "table", None)
+    if table is not None:
+        columns = ", ".join(column.name for column in obj.columns) if hasattr(obj, "columns") else ""
+        return f"{kind} {table.name}.{obj.name or ''}({columns})"
+    return f"{kind} {obj.name}"
+
+
+# Помощники для файлов миграций (работают внутри alembic.op)
+
+def _inspector():
+    # alembic upgrade --sql выводит SQL без базы: схема считается пустой
+    if op.get_context().as_sql:
+        return None
+    return inspect(op.get_bind())
+
+
+def has_table(table: str) -> bool:
+    inspector = _inspector()
+    return inspector is not None and inspector.has_table(table)
+
+
+def has_column(table: str, column: str) -> bool:
+    inspector = _inspector()
+    return inspector is not None and any(c["name"] == column for c in inspector.get_columns(table))
+
+
+def has_index(table: str, name: str) -> bool:
+    inspector = _inspector()
+    return inspector is not None and any(i["name"] == name for i in inspector.get_indexes(table))
+
+
+def has_foreign_key(table: str, columns: list) -> bool:
+    inspector = _inspector()
+    return inspector is not None and any(
+        fk["constrained_columns"] == columns for fk in inspector.get_foreign_keys(table)
+    )
+
+
+def _quote(name: str) -> str:
+    return op.get_bind().dialect.identifier_preparer.quote(name)
+
+
+def create_index_online(name: str, table: str, columns: list, unique: bool = False):
+    """Индекс без блокировки записи в таблицу; уже существующий пропускается"""
+    if has_index(table, name):
+        return
+    dialect = op.get_bind().dialect.name
+    if dialect == "postgresql":
+        # CONCURRENTLY нельзя выполнять внутри транзакции
+        with op.get_context().autocommit_block():
+            op.create_index(name, table, columns, unique=unique, postgresql_concurrently=True)
+    elif dialect == "mysql":
+        op.execute(
+            f"ALTER TABLE {_quote(table)} ADD {'UNIQUE ' if unique else ''}INDEX {_quote(name)} "
+            f"({', '.join(_quote(c) for c in columns)}), ALGORITHM=INPLACE, LOCK=NONE"
+        )
+    else:
+        op.create_index(name, table, columns, unique=unique)
+
+
+def drop_index_online(name: str, table: str):
+    """Удалить индекс, не блокируя запись в таблицу; отсутствующий пропускается"""
+    if not op.get_context().as_sql and not has_index(table, name):
+        return
+    if op.get_bind().dialect.name == "postgresql":
+        with op.get_context().autocommit_block():
+            op.drop_index(name, table_name=table, postgresql_concurrently=True)
+    else:
+        # MySQL удаляет вторичный индекс INPLACE, меняя только метаданные
+        op.drop_index(name, table_name=table)
+
+
+def create_foreign_key_online(name: str, table: str, referent: str, columns: list, remote_columns: list):
+    """Внешний ключ без долгой блокировки; уже существующий пропускается.
+
+    Индекс по колонкам ключа должен быть создан заранее: иначе MySQL построит
+    его сам, уже с блокировкой.
+    """
+    if has_foreign_key(table, columns):
+        return
+    dialect = op.get_bind().dialect.name
+    definition = (
+        f"ALTER TABLE {_quote(table)} ADD CONSTRAINT {_quote(name)} "
+        f"FOREIGN KEY ({', '.join(_quote(c) for c in columns)}) "
+        f"REFERENCES {_quote(referent)} ({', '.join(_quote(c) for c in remote_columns)})"
+    )
+    if dialect == "postgresql":
+        # NOT VALID не проверяет старые строки; VALIDATE проверяет, не блокируя запись
+        op.execute(f"{definition} NOT VALID")
+        op.execute(f"ALTER TABLE {_quote(table)} VALIDATE CONSTRAINT {_quote(name)}")
+    elif dialect == "mysql":
+        # INPLACE для внешнего ключа MySQL разрешает только без проверки строк
+        op.execute("SET foreign_key_checks = 0")
+        op.execute(f"{definition}, ALGORITHM=INPLACE, LOCK=NONE")
+        op.execute("SET foreign_key_checks = 1")
+    elif not op.get_context().as_sql:
+        # SQLite не умеет ALTER ... ADD CONSTRAINT: таблица пересоздается (по живой схеме)
+        with op.batch_alter_table(table) as batch:
+            batch.create_foreign_key(name, referent, columns, remote_columns)
+
+
+def backfill_by_id(table: str, assignment: str, condition: str, batch_size: int):
+    """UPDATE пачками по диапазонам id, каждая в своей транзакции"""
+    if op.get_context().as_sql:
+        op.execute(f"UPDATE {_quote(table)} SET {assignment} WHERE {condition}")
+        return
+    with op.get_context().autocommit_block():
+        bind = op.get_bind()
+        last_id = bind.scalar(text(f"SELECT max(id) FROM {_quote(table)}")) or 0
+        for start in range(0, last_id + 1, batch_size):
+            bind.execute(
+                text(f"UPDATE {_quote(table)} SET {assignment} WHERE id >= :start AND id < :end AND {condition}"),
+                {"start": start, "end": start + batch_size}
+            )
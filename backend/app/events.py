@@ -0,0 +1,133 @@
+"""Рассылка изменений дефектов подписчикам (Server-Sent Events).
+
+Обработчики публикуют событие после commit там же, где пишут DefectHistory.
+У каждого подписчика своя ограниченная очередь: если клиент не успевает
+читать и очередь переполнена, он отключается событием "evicted" и должен
+заново загрузить данные. При нескольких воркерах события доходят до
+подписчиков других процессов через shared_state.
+"""
+import asyncio
+import itertools
+import json
+import os
+from typing import Optional
+
+from .shared_state import shared_state
+
+EVENTS_QUEUE_SIZE = int(os.getenv("EVENTS_QUEUE_SIZE", "100"))
+EVENTS_KEEPALIVE = float(os.getenv("EVENTS_KEEPALIVE", "15"))
+EVENTS_MAX_SUBSCRIBERS = int(os.getenv("EVENTS_MAX_SUBSCRIBERS", "1000"))
+
+# Служебные события, после которых поток закрывается
+EVICTED = "evicted"
+SHUTDOWN = "shutdown"
+
+
+class TooManySubscribers(Exception):
+    pass
+
+
+class Subscriber:
+    def __init__(self, user_id: int, role: str, project_id: Optional[int]):
+        self.user_id = user_id
+        self.role = role
+        self.project_id = project_id
+        self.queue = asyncio.Queue(maxsize=EVENTS_QUEUE_SIZE)
+
+    def wants(self, event: dict) -> bool:
+        if self.project_id and event["project_id"] != self.project_id:
+            return False
+        # Инженеры получают события только по своим дефектам
+        if self.role == "engineer":
+            return self.user_id in (event.get("reported_by"), event.get("assigned_to"))
+        return True
+
+    def close(self, reason: str):
+        """Очистить очередь и оставить в ней одно служебное событие"""
+        while not self.queue.empty():
+            self.queue.get_nowait()
+        self.queue.put_nowait({"type": reason})
+
+
+class EventBroker:
+    def __init__(self):
+        self._subscribers = set()
+        self._ids = itertools.count(1)
+        self.published = 0
+        self.evicted = 0
+
+    def subscribe(self, user_id: int, role: str, project_id: Optional[int] = None) -> Subscriber:
+        if len(self._subscribers) >= EVENTS_MAX_SUBSCRIBERS:
+            raise TooManySubscribers()
+        subscriber = Subscriber(user_id, role, project_id)
+        self._subscribers.add(subscriber)
+        return subscriber
+
+    def has_subscribers(self) -> bool:
+        # Подписчиков других воркеров отсюда не видно
+        return bool(self._subscribers) or shared_state.shared
+
+    def unsubscribe(self, subscriber: Subscriber):
+        self._subscribers.discard(subscriber)
+
+    def publish(self, event: dict):
+        """Разослать событие; вызывается из цикла событий, не блокирует"""
+        shared_state.broadcast("events", event)
+        self.deliver(event)
+
+    def deliver(self, event: dict):
+        """Разослать подписчикам этого процесса"""
+        event["id"] = next(self._ids)
+        self.published += 1
+        for subscriber in list(self._subscribers):
+            if not subscriber.wants(event):
+                continue
+            try:
+                subscriber.queue.put_nowait(event)
+            except asyncio.QueueFull:
+                # Медленный клиент не должен держать память и тормозить остальных
+                self._subscribers.discard(subscriber)
+                subscriber.close(EVICTED)
+                self.evicted += 1
+
+    def close(self):
+        for subscriber in list(self._subscribers):
+            subscriber.close(SHUTDOWN)
+        self._subscribers.clear()
+
+    def stats(self) -> dict:
+        return {
+            "subscribers": len(self._subscribers),
+            "published": self.published,
+            "evicted": self.evicted,
+        }
+
+
+def format_event(event: dict) -> str:
+    lines = [f"event: {event['type']}"]
+    if "id" in event:
+        lines.append(f"id: {event['id']}")
+    lines.append(f"data: {json.dumps(event, ensure_ascii=False, default=str)}")
+    return "\n".join(lines) + "\n\n"
+
+
+async def event_stream(subscriber: Subscriber):
+    """Поток SSE подписчика с комментариями-пингами, пока клиент подключен"""
+    try:
+        # Первая строка сразу: клиент видит, что подписка состоялась
+        yield "retry: 3000\n\n"
+        while True:
+            try:
+                event = await asyncio.wait_for(subscriber.queue.get(), EVENTS_KEEPALIVE)
+            except asyncio.TimeoutError:
+                yield ": ping\n\n"
+                continue
+            yield format_event(event)
+            if event["type"] in (EVICTED, SHUTDOWN):
+                return
+    finally:
+        broker.unsubscribe(subscriber)
+
+
+broker = EventBroker()
+shared_state.on("events", broker.deliver)
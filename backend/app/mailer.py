@@ -0,0 +1,224 @@
+"""Фоновая отправка писем из таблицы email_outbox.
+
+Обработчики только добавляют строку в outbox в своей транзакции и вызывают
+notify(). Диспетчер забирает письма пачками, держит одно SMTP-соединение
+между пачками и повторяет неудачные отправки с экспоненциальной задержкой.
+"""
+import asyncio
+import logging
+import os
+from datetime import datetime, timedelta
+from email.mime.text import MIMEText
+
+from sqlalchemy import select, update
+
+from .database import AsyncSessionLocal
+from .models import EmailOutbox
+
+SMTP_SERVER = os.getenv("SMTP_SERVER", "smtp.yandex.ru")
+SMTP_PORT = int(os.getenv("SMTP_PORT", "587"))
+SMTP_USERNAME = os.getenv("SMTP_USERNAME")
+SMTP_PASSWORD = os.getenv("SMTP_PASSWORD")
+SMTP_FROM = os.getenv("SMTP_FROM") or SMTP_USERNAME or "noreply@localhost"
+SMTP_STARTTLS = os.getenv("SMTP_STARTTLS", "1") == "1"
+SMTP_TIMEOUT = float(os.getenv("SMTP_TIMEOUT", "30"))
+
+EMAIL_BATCH_SIZE = int(os.getenv("EMAIL_BATCH_SIZE", "50"))
+EMAIL_MAX_ATTEMPTS = int(os.getenv("EMAIL_MAX_ATTEMPTS", "8"))
+EMAIL_RETRY_BASE = float(os.getenv("EMAIL_RETRY_BASE", "10"))
+EMAIL_RETRY_MAX = float(os.getenv("EMAIL_RETRY_MAX", "3600"))
+EMAIL_POLL_INTERVAL = float(os.getenv("EMAIL_POLL_INTERVAL", "30"))
+# Сколько секунд письмо считается взятым в работу; потом его заберет другой процесс
+EMAIL_LEASE = float(os.getenv("EMAIL_LEASE", "300"))
+# Соединение без писем дольше этого времени закрывается
+SMTP_IDLE_TIMEOUT = float(os.getenv("SMTP_IDLE_TIMEOUT", "60"))
+
+logger = logging.getLogger(__name__)
+
+
+def smtp_configured() -> bool:
+    # Локальный сервер без авторизации (например, aiosmtpd) задается явным SMTP_SERVER
+    return bool(SMTP_USERNAME and SMTP_PASSWORD) or "SMTP_SERVER" in os.environ
+
+
+def queue_email(db, recipient: str, subject: str, body: str) -> EmailOutbox:
+    """Поставить письмо в очередь (без commit — в транзакции вызывающего)"""
+    message = EmailOutbox(
+        recipient=recipient,
+        subject=subject,
+        body=body,
+        status="pending",
+        attempts=0,
+        next_attempt_at=datetime.utcnow()
+    )
+    db.add(message)
+    return message
+
+
+def retry_delay(attempts: int) -> timedelta:
+    return timedelta(seconds=min(EMAIL_RETRY_BASE * 2 ** (attempts - 1), EMAIL_RETRY_MAX))
+
+
+class EmailDispatcher:
+    def __init__(self):
+        self._wakeup = asyncio.Event()
+        self._task = None
+        self._smtp = None
+        self._last_used = 0.0
+        self.sent = 0
+        self.retried = 0
+        self.failed = 0
+        self.errors = 0
+
+    def notify(self):
+        """Разбудить диспетчер: в outbox появились новые письма"""
+        self._wakeup.set()
+
+    def start(self):
+        if not smtp_configured():
+            logger.warning("SMTP credentials not configured. Письма остаются в email_outbox")
+            return
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self._disconnect()
+
+    async def _run(self):
+        while True:
+            try:
+                sent = await self.dispatch_batch()
+            except Exception:
+                self.errors += 1
+                logger.exception("Email dispatcher error")
+                sent = 0
+            if sent < EMAIL_BATCH_SIZE:
+                await self._idle()
+
+    async def _idle(self):
+        self._wakeup.clear()
+        timeout = min(EMAIL_POLL_INTERVAL, SMTP_IDLE_TIMEOUT) if self._smtp else EMAIL_POLL_INTERVAL
+        try:
+            await asyncio.wait_for(self._wakeup.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        loop = asyncio.get_running_loop()
+        if self._smtp and loop.time() - self._last_used > SMTP_IDLE_TIMEOUT:
+            await self._disconnect()
+
+    async def _connection(self):
+        if self._smtp is None or not self._smtp.is_connected:
+            import aiosmtplib
+            smtp = aiosmtplib.SMTP(
+                hostname=SMTP_SERVER,
+                port=SMTP_PORT,
+                username=SMTP_USERNAME or None,
+                password=SMTP_PASSWORD or None,
+                start_tls=SMTP_STARTTLS,
+                timeout=SMTP_TIMEOUT
+            )
+            await smtp.connect()
+            self._smtp = smtp
+        return self._smtp
+
+    async def _disconnect(self):
+        if self._smtp is not None:
+            try:
+                await self._smtp.quit()
+            except Exception:
+                self._smtp.close()
+            self._smtp = None
+
+    async def _claim(self, db):
+        """Забрать пачку писем, которым пора уходить"""
+        now = datetime.utcnow()
+        due = (await db.scalars(
+            select(EmailOutbox.id)
+            .where(
+                EmailOutbox.status.in_(["pending", "sending"]),
+                EmailOutbox.next_attempt_at <= now
+            )
+            .order_by(EmailOutbox.next_attempt_at, EmailOutbox.id)
+            .limit(EMAIL_BATCH_SIZE)
+        )).all()
+
+        claimed = []
+        lease_until = now + timedelta(seconds=EMAIL_LEASE)
+        for message_id in due:
+            # Условный UPDATE: письмо не уйдет дважды, если диспетчеров несколько
+            result = await db.execute(
+                update(EmailOutbox)
+                .where(
+                    EmailOutbox.id == message_id,
+                    EmailOutbox.status.in_(["pending", "sending"]),
+                    EmailOutbox.next_attempt_at <= now
+                )
+                .values(status="sending", next_attempt_at=lease_until)
+            )
+            if result.rowcount:
+                claimed.append(message_id)
+        await db.commit()
+
+        if not claimed:
+            return []
+        return (await db.scalars(select(EmailOutbox).where(EmailOutbox.id.in_(claimed)))).all()
+
+    async def dispatch_batch(self) -> int:
+        """Отправить одну пачку; вернуть число взятых в работу писем"""
+        async with AsyncSessionLocal() as db:
+            messages = await self._claim(db)
+            for message in messages:
+                await self._send(message)
+                await db.commit()
+            return len(messages)
+
+    async def _send(self, message: EmailOutbox):
+        msg = MIMEText(message.body)
+        msg['Subject'] = message.subject
+        msg['From'] = SMTP_FROM
+        msg['To'] = message.recipient
+
+        message.attempts += 1
+        # SMTP-клиент нужен только диспетчеру, и только когда есть письма
+        import aiosmtplib
+        try:
+            smtp = await self._connection()
+            await smtp.send_message(msg)
+        except Exception as e:
+            if isinstance(e, (aiosmtplib.SMTPServerDisconnected, aiosmtplib.SMTPConnectError, OSError)):
+                await self._disconnect()
+            message.last_error = str(e)
+            if message.attempts >= EMAIL_MAX_ATTEMPTS:
+                message.status = "failed"
+                self.failed += 1
+                logger.error("Failed to send email to %s: %s", message.recipient, e)
+            else:
+                message.status = "pending"
+                self.retried += 1
+                message.next_attempt_at = datetime.utcnow() + retry_delay(message.attempts)
+            return
+
+        self._last_used = asyncio.get_running_loop().time()
+        message.status = "sent"
+        message.sent_at = datetime.utcnow()
+        message.last_error = None
+        self.sent += 1
+        logger.info("Email sent to %s", message.recipient)
+
+    def stats(self) -> dict:
+        return {
+            "sent": self.sent,
+            "retried": self.retried,
+            "failed": self.failed,
+            "errors": self.errors,
+        }
+
+
+email_dispatcher = EmailDispatcher()
@@ -1,57 +1,85 @@
-from fastapi import FastAPI, Depends, HTTPException, Request, status, UploadFile, File
+from fastapi import FastAPI, Body, Depends, HTTPException, Request, Response, Query, status, UploadFile, File
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.concurrency import run_in_threadpool
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse, RedirectResponse, JSONResponse
-from sqlalchemy.orm import Session
+from fastapi.responses import FileResponse, RedirectResponse, JSONResponse, StreamingResponse, PlainTextResponse
+from sqlalchemy import String, or_, and_, func, insert, select, type_coerce
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, joinedload, selectinload
 import os
+import asyncio
+import base64
+from contextlib import asynccontextmanager
 from urllib.parse import quote
 from datetime import datetime, timedelta
-from typing import List, Optional
+from typing import Any, Dict, List, Optional
+from collections import Counter
+from pydantic import TypeAdapter, ValidationError
 
-from .database import get_db, engine, Base
+from .database import get_db, get_sync_db, engine, async_engine, AsyncSessionLocal
 from . import models
 from .models import User, Project, ProjectStage, Defect, DefectComment, DefectAttachment, DefectHistory
 from .schemas import (
     UserCreate, UserLogin, UserResponseAuth, Token, UserProfile,
     ProjectCreate, Project,
     ProjectStageCreate, ProjectStage,
-    DefectCreate, Defect, DefectUpdate,
-    CommentCreate, Comment,
-    AttachmentCreate, Attachment
+    DefectCreate, Defect, DefectUpdate, DefectBulkUpdate, BulkItemResult,
+    CommentCreate, Comment, SearchHit, SearchResults,
+    AttachmentCreate, Attachment,
+    UserBrief, DefectHistoryEntry, DefectFull, Dashboard
 )
-from .auth import get_password_hash, generate_registration_token, send_registration_email, check_password, check_reg_data, verify_password, create_access_token, verify_token
-
-# Создаем таблицы
-Base.metadata.create_all(bind=engine)
-print("Все таблицы созданы")
-
-try:
-    db = next(get_db())
-    
-    # Создаем тестового пользователя если его нет
-    test_user = db.query(User).filter(User.email == "test@example.com").first()
-    if not test_user:
-        test_user = User(
-            email="test@example.com",
-            login="testuser",
-            fio="Тестовый Пользователь",
-            password_hash=get_password_hash("Test123!"),
-            role="manager"
-        )
-        db.add(test_user)
-        db.commit()
-        db.refresh(test_user)
-        print("✅ Тестовый пользователь создан")
-    
-    # Создаем остальные тестовые данные
-    from .test_data import create_test_data
-    create_test_data(db)
-    print("✅ Тестовые данные добавлены")
-    
-except Exception as e:
-    print(f"⚠️ Тестовые данные не созданы: {e}")
+from .user_cache import CachedUser, user_cache
+from .mailer import email_dispatcher, queue_email
+from .events import broker, event_stream, TooManySubscribers
+from .response_cache import response_cache
+from .static_assets import static_assets
+from .metrics import MetricsMiddleware, CallbackMetric, instrument_engine, render_metrics, merge_metrics
+from .shared_state import shared_state
+from .profiling import SQL_PROFILING, instrument_slow_queries, server_timing
+from .versions import PROJECTS, bump_version, bump_defect_versions, defect_versions, get_version, make_etag
+from .thumbnails import (
+    THUMBNAIL_FORMATS, THUMBNAIL_SIZE, ThumbnailError, is_image, schedule_thumbnails, ensure_thumbnail, shutdown_thumbnail_pool
+)
+from .search import (
+    stems, highlight, search_documents, index_new_defects, index_defect, index_new_comment
+)
+from .storage import (
+    AttachmentTooLarge, store_file, content_path, absolute_path, sha256_of, parse_range, iter_file
+)
+from .statistics import (
+    NO_STAGE, defect_key, apply_defect_deltas,
+    track_defect_created, track_defect_changed
+)
+from .auth import (
+    generate_registration_token, build_registration_email, check_password, check_reg_data,
+    create_access_token, verify_token,
+    get_password_hash_async, verify_password_async, PasswordPoolBusy, shutdown_password_pool
+)
+
+# Схема БД и демо-данные — разовые команды (python -m app.manage init), а не
+# побочный эффект импорта в каждом воркере. DB_INIT_ON_STARTUP=1 — для
+# разработки в одном процессе.
+DB_INIT_ON_STARTUP = os.getenv("DB_INIT_ON_STARTUP", "0") == "1"
 
-app = FastAPI(title="Construction Control System API", version="1.0.0")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if DB_INIT_ON_STARTUP:
+        from .manage import init_database
+        await run_in_threadpool(init_database)
+    # Сброс кэшей, события и метрики между воркерами (SHARED_STATE_BACKEND)
+    shared_state.register_snapshot("metrics", lambda: render_metrics().encode("utf-8"))
+    await shared_state.start()
+    email_dispatcher.start()
+    # Статика сжимается в фоне: API отвечает сразу, первый запрос файла дождется сборки
+    asyncio.get_running_loop().run_in_executor(None, static_assets.ensure_loaded)
+    yield
+    broker.close()
+    await shared_state.stop()
+    await email_dispatcher.stop()
+    shutdown_password_pool()
+    shutdown_thumbnail_pool()
+
+app = FastAPI(title="Construction Control System API", version="1.0.0", lifespan=lifespan)
 
 # CORS middleware
 app.add_middleware(
@@ -60,6 +88,43 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "ETag", "Content-Range", "Accept-Ranges", "Server-Timing"],
+)
+
+# Метрики: добавляется последней, чтобы учитывать и время остальных middleware
+app.add_middleware(MetricsMiddleware, fastapi_app=app, server_timing=server_timing if SQL_PROFILING else None)
+instrument_engine(engine, "sync")
+instrument_engine(async_engine.sync_engine, "async")
+if SQL_PROFILING:
+    instrument_slow_queries(engine)
+    instrument_slow_queries(async_engine.sync_engine)
+
+def cache_operations():
+    user_stats, response_stats = user_cache.stats(), response_cache.stats()
+    return {
+        ("user", "hit"): user_stats["hits"],
+        ("user", "miss"): user_stats["misses"],
+        ("response", "hit"): response_stats["hits"],
+        ("response", "miss"): response_stats["misses"],
+        ("response", "error"): response_stats["errors"],
+    }
+
+def cache_entries():
+    entries = {("user",): user_cache.stats()["size"]}
+    # У Redis размер не считается
+    response_size = response_cache.stats()["size"]
+    if response_size is not None:
+        entries[("response",)] = response_size
+    return entries
+
+CallbackMetric("cache_operations_total", "Cache lookups by result", ["cache", "result"], cache_operations, type="counter")
+CallbackMetric("cache_entries", "Cached entries", ["cache"], cache_entries)
+CallbackMetric("events_subscribers", "Open /api/events streams", [], lambda: {(): broker.stats()["subscribers"]})
+CallbackMetric("events_evicted_total", "Slow /api/events consumers evicted", [], lambda: {(): broker.stats()["evicted"]}, type="counter")
+CallbackMetric("shared_state_errors_total", "Shared state publish/listen/handler errors", [], lambda: {(): shared_state.stats()["errors"]}, type="counter")
+CallbackMetric(
+    "email_messages_total", "Outbox delivery attempts by result", ["result"],
+    lambda: {(result,): count for result, count in email_dispatcher.stats().items()}, type="counter"
 )
 
 # Вспомогательные функции
@@ -72,7 +137,192 @@ def get_user_by_email(db: Session, email: str):
 def get_user_by_token(db: Session, token: str):
     return db.query(User).filter(User.reg_token == token).first()
 
-def get_current_user(request: Request, db: Session = Depends(get_db)):
+def encode_cursor(created_at, row_id: int) -> str:
+    """Курсор keyset-пагинации: последняя выданная пара (время, id).
+
+    Время — datetime или текст в том виде, в каком его хранит SQLite (keyset_page).
+    """
+    time_text = created_at if isinstance(created_at, str) else created_at.isoformat()
+    raw = f"{time_text}|{row_id}"
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii")
+
+def decode_cursor(cursor: str):
+    """-> (время текстом, id); время проверяется, но остается строкой"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode("ascii")).decode("utf-8")
+        created_at, row_id = raw.split("|", 1)
+        datetime.fromisoformat(created_at)
+        return created_at, int(row_id)
+    except (ValueError, UnicodeError):
+        raise HTTPException(status_code=400, detail="Неверный курсор")
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """Совпадает ли ETag с If-None-Match (список, * и слабые W/ учитываются)"""
+    header = request.headers.get("If-None-Match")
+    if not header:
+        return False
+    candidates = [value.strip() for value in header.split(",")]
+    return "*" in candidates or any(value.removeprefix("W/") == etag for value in candidates)
+
+def conditional_headers(etag: str) -> dict:
+    # Ответ зависит от пользователя: кэшировать только в браузере и всегда перепроверять
+    return {"ETag": etag, "Cache-Control": "private, no-cache"}
+
+def not_modified(etag: str) -> Response:
+    return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=conditional_headers(etag))
+
+async def serve_cached(request: Request, namespace: str, key: str, load) -> Response:
+    """JSON-ответ из кэша ответов, при промахе load() -> (ETag, тело) и сохранение"""
+    cache_key = await response_cache.make_key(namespace, key)
+    entry = await response_cache.get(cache_key)
+    if entry is None:
+        entry = await load()
+        await response_cache.set(cache_key, *entry)
+    etag, body = entry
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    return Response(content=body, media_type="application/json", headers=conditional_headers(etag))
+
+def parse_defect_status(value: str) -> models.DefectStatus:
+    try:
+        return models.DefectStatus(value)
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Неизвестный статус: {value}")
+
+def parse_priority(value: str) -> models.PriorityLevel:
+    try:
+        return models.PriorityLevel(value)
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Неизвестный приоритет: {value}")
+
+def history_value(value):
+    """Значение поля для DefectHistory: у Enum пишем русское значение, а не имя"""
+    if isinstance(value, (models.DefectStatus, models.PriorityLevel)):
+        return value.value
+    return str(value)
+
+def build_defects_query(user_id: int, role: str, project_id: Optional[int], status: Optional[str]):
+    """Запрос дефектов с фильтрами и ограничением видимости по роли"""
+    query = select(models.Defect)
+    
+    # Фильтрация по проекту
+    if project_id:
+        query = query.where(models.Defect.project_id == project_id)
+    
+    # Фильтрация по статусу
+    if status:
+        query = query.where(models.Defect.status == parse_defect_status(status))
+    
+    # Для инженеров показываем только их дефекты
+    if role == "engineer":
+        query = query.where(
+            (models.Defect.reported_by == user_id) | 
+            (models.Defect.assigned_to == user_id)
+        )
+    
+    return query
+
+# Связанные данные дефекта: (отношение, схема, список ли это)
+DEFECT_EXPANSIONS = {
+    "project": (models.Defect.project, Project, False),
+    "stage": (models.Defect.stage, ProjectStage, False),
+    "assignee": (models.Defect.assignee, UserBrief, False),
+    "reporter": (models.Defect.reporter, UserBrief, False),
+    "comments": (models.Defect.comments, Comment, True),
+    "attachments": (models.Defect.attachments, Attachment, True),
+    "history": (models.Defect.history, DefectHistoryEntry, True),
+}
+
+def parse_expand(value: Optional[str]) -> List[str]:
+    fields = [field.strip() for field in (value or "").split(",") if field.strip()]
+    unknown = [field for field in fields if field not in DEFECT_EXPANSIONS]
+    if unknown:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Неизвестные значения expand: {', '.join(unknown)}. Допустимо: {', '.join(DEFECT_EXPANSIONS)}"
+        )
+    return list(dict.fromkeys(fields))
+
+def defect_load_options(fields: List[str]) -> list:
+    """Жадная загрузка связей: ссылки — JOIN в том же запросе, списки — по одному IN-запросу"""
+    options = []
+    for field in fields:
+        relation, _, is_list = DEFECT_EXPANSIONS[field]
+        options.append(selectinload(relation) if is_list else joinedload(relation))
+    return options
+
+def expand_defect(defect: models.Defect, fields: List[str]) -> dict:
+    """Дефект с запрошенными связями; незагруженные связи не трогаем"""
+    data = Defect.model_validate(defect).model_dump(mode="json")
+    for field in fields:
+        _, schema, is_list = DEFECT_EXPANSIONS[field]
+        value = getattr(defect, field)
+        if is_list:
+            data[field] = [schema.model_validate(item).model_dump(mode="json") for item in value]
+        else:
+            data[field] = schema.model_validate(value).model_dump(mode="json") if value is not None else None
+    return data
+
+async def keyset_page(db: AsyncSession, query, time_column, id_column, after: Optional[tuple], limit: int):
+    """Одна страница после курсора (время, id), от новых к старым.
+
+    Возвращает (строки, курсор следующей страницы или None).
+    """
+    # SQLite хранит DATETIME текстом, причем в разных форматах (server_default —
+    # без долей секунды, ORM — с микросекундами), а datetime-параметр сравнивает
+    # со своим форматом: равенство с сохраненным значением не срабатывает, и при
+    # одинаковом времени у limit строк курсор стоит на месте. Поэтому там в
+    # курсор попадает сохраненный текст, и сравнивается строка со строкой —
+    # в том же порядке, что и ORDER BY.
+    if db.get_bind().dialect.name == "sqlite":
+        time_key = type_coerce(time_column, String)
+    else:
+        time_key = time_column
+    if after:
+        after_time, after_id = after
+        if time_key is time_column:
+            after_time = datetime.fromisoformat(after_time)
+        query = query.where(or_(
+            time_key < after_time,
+            and_(time_key == after_time, id_column < after_id)
+        ))
+    query = (
+        query.add_columns(time_key.label("cursor_time"), id_column.label("cursor_id"))
+        .order_by(time_column.desc(), id_column.desc())
+        .limit(limit)
+    )
+    rows = (await db.execute(query)).all()
+    next_cursor = encode_cursor(rows[-1][1], rows[-1][2]) if len(rows) == limit else None
+    return [row[0] for row in rows], next_cursor
+
+async def defects_page(db: AsyncSession, query, after: Optional[tuple], limit: int):
+    """Одна страница дефектов после курсора, от новых к старым; -> (дефекты, курсор следующей)"""
+    return await keyset_page(db, query, models.Defect.created_at, models.Defect.id, after, limit)
+
+async def history_page(db: AsyncSession, query, response: Response, cursor: Optional[str], limit: int):
+    """Страница истории от новых записей к старым, курсор следующей — в X-Next-Cursor"""
+    after = decode_cursor(cursor) if cursor else None
+    entries, next_cursor = await keyset_page(
+        db, query, models.DefectHistory.changed_at, models.DefectHistory.id, after, limit
+    )
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return entries
+
+def password_pool_busy():
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="Сервер перегружен, попробуйте позже",
+        headers={"Retry-After": "1"}
+    )
+
+async def hash_password_or_503(password: str) -> str:
+    try:
+        return await get_password_hash_async(password)
+    except PasswordPoolBusy:
+        raise password_pool_busy()
+
+async def get_current_user(request: Request, db: AsyncSession = Depends(get_db)):
     auth_header = request.headers.get("Authorization")
     
     if not auth_header or not auth_header.startswith("Bearer "):
@@ -97,7 +347,12 @@ def get_current_user(request: Request, db: Session = Depends(get_db)):
             detail="Неверный токен"
         )
     
-    user = get_user_by_email(db, email)
+    # Подтвержденные пользователи кэшируются, чтобы не ходить в БД на каждый запрос
+    cached_user = user_cache.get(email)
+    if cached_user:
+        return cached_user
+    
+    user = await db.scalar(select(User).where(User.email == email))
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -110,32 +365,57 @@ def get_current_user(request: Request, db: Session = Depends(get_db)):
             detail="Подтвердите почту для доступа"
         )
     
-    return user
-
-@app.get("/", response_class=FileResponse)
-async def read_root():
-    return FileResponse("../frontend/index.html")
+    cached_user = CachedUser(user)
+    user_cache.put(email, cached_user)
+    return cached_user
 
-@app.get("/css/{file_path:path}", response_class=FileResponse)
-async def serve_css(file_path: str):
-    full_path = f"../frontend/css/{file_path}"
-    if not os.path.exists(full_path):
+# Статические файлы: из памяти, сжатые, с ?v=<хэш> в ссылках
+async def static_response(request: Request, path: str) -> Response:
+    assets = static_assets.ready()
+    if assets is not None:
+        asset = assets.get(path)
+    else:
+        # Ожидание фоновой сборки (блокировка) и проверка файлов на диске — не в цикле событий
+        asset = await run_in_threadpool(static_assets.get, path)
+    if asset is None:
         raise HTTPException(status_code=404, detail="File not found")
-    return FileResponse(full_path)
+    return asset.response(request.headers, request.query_params.get("v"))
 
-@app.get("/js/{file_path:path}", response_class=FileResponse)
-async def serve_js(file_path: str):
-    full_path = f"../frontend/js/{file_path}"
-    if not os.path.exists(full_path):
-        raise HTTPException(status_code=404, detail="File not found")
-    return FileResponse(full_path)
+@app.get("/", response_class=Response)
+async def read_root(request: Request):
+    return await static_response(request, "index.html")
+
+@app.get("/css/{file_path:path}", response_class=Response)
+async def serve_css(request: Request, file_path: str):
+    return await static_response(request, f"css/{file_path}")
+
+@app.get("/js/{file_path:path}", response_class=Response)
+async def serve_js(request: Request, file_path: str):
+    return await static_response(request, f"js/{file_path}")
 
 @app.get("/health")
 def health_check():
-    return {"status": "healthy", "message": "Service is running"}
+    return {
+        "status": "healthy",
+        "message": "Service is running",
+        "user_cache": user_cache.stats(),
+        "events": broker.stats(),
+        "response_cache": response_cache.stats(),
+        "shared_state": shared_state.stats(),
+        "email": email_dispatcher.stats()
+    }
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Метрики в текстовом формате Prometheus (при нескольких воркерах — их сумма)"""
+    text = render_metrics()
+    others = await shared_state.snapshots("metrics")
+    if others:
+        text = merge_metrics([text, *(snapshot.decode("utf-8") for snapshot in others)])
+    return PlainTextResponse(text, media_type="text/plain; version=0.0.4; charset=utf-8")
 
 @app.get("/verify")
-def verify_register(request: Request, db: Session = Depends(get_db)):
+def verify_register(request: Request, db: Session = Depends(get_sync_db)):
     # Получаем токен из query параметров
     token = request.query_params.get("token")
     
@@ -161,7 +441,7 @@ def verify_register(request: Request, db: Session = Depends(get_db)):
     return RedirectResponse(url=f"/?success={quote(success_message)}")
 
 @app.post("/auth/register", response_model=UserResponseAuth)
-def register(user: UserCreate, db: Session = Depends(get_db)):
+async def register(user: UserCreate, db: AsyncSession = Depends(get_db)):
     if not(user.email and user.username and user.full_name and user.password and user.confirm_password):
         raise HTTPException(status_code=400, detail="Недостаточно данных")
     
@@ -170,12 +450,12 @@ def register(user: UserCreate, db: Session = Depends(get_db)):
         raise HTTPException(status_code=400, detail=is_data_bad)
     
     # Проверка существования логина
-    existing_user = get_user_by_login(db, login=user.username)
+    existing_user = await db.scalar(select(User).where(User.login == user.username))
     if existing_user:
         raise HTTPException(status_code=400, detail="Логин уже занят")
     
     # Проверка существования email
-    existing_email = get_user_by_email(db, email=user.email)
+    existing_email = await db.scalar(select(User).where(User.email == user.email))
     if existing_email:
         raise HTTPException(status_code=400, detail="Email уже зарегистрирован")
     
@@ -192,45 +472,42 @@ def register(user: UserCreate, db: Session = Depends(get_db)):
     if len(user.password.encode('utf-8')) > 72:
         raise HTTPException(status_code=400, detail="Пароль слишком длинный")
     
+    # Хэшируем пароль в пуле процессов
+    password_hash = await hash_password_or_503(user.password)
+    
     # Генерация регистрационного токена
     reg_token = generate_registration_token()
     
-    try:
-        # ПЕРВОЕ: Пытаемся отправить письмо
-        send_registration_email(user.email, reg_token)
-        
-        # ВТОРОЕ: Если отправка успешна, создаем пользователя
-        db_user = User(
-            email=user.email,
-            login=user.username,
-            fio=user.full_name,
-            password_hash=get_password_hash(user.password),
-            reg_token=reg_token,
-            role="observer"
-        )
-        
-        db.add(db_user)
-        db.commit()
-        db.refresh(db_user)
-        
-        return {"detail":"Подтвердите почту"}
-        
-    except Exception as e:
-        # Если отправка письма не удалась, НЕ создаем пользователя
-        raise HTTPException(status_code=500, detail="Не можем отправить письмо, попробуйте позже")
+    # Пользователь и письмо в outbox сохраняются одной транзакцией,
+    # само письмо отправляет фоновый диспетчер
+    db_user = User(
+        email=user.email,
+        login=user.username,
+        fio=user.full_name,
+        password_hash=password_hash,
+        reg_token=reg_token,
+        role="observer"
+    )
+    db.add(db_user)
+    subject, body = build_registration_email(reg_token)
+    queue_email(db, user.email, subject, body)
+    await db.commit()
+    email_dispatcher.notify()
+    
+    return {"detail":"Подтвердите почту"}
     
 @app.post("/auth/login", response_model=Token)
-def login(user: UserLogin, db: Session = Depends(get_db)):
+async def login(user: UserLogin, db: AsyncSession = Depends(get_db)):
     if not(user.login and user.password):
         raise HTTPException(status_code=400, detail="Недостаточно данных")
     
     # Определяем, это email или username
     if "@" in user.login:
         # Это email
-        db_user = get_user_by_email(db, user.login)
+        db_user = await db.scalar(select(User).where(User.email == user.login))
     else:
         # Это username
-        db_user = get_user_by_login(db, user.login)
+        db_user = await db.scalar(select(User).where(User.login == user.login))
     
     if not db_user:
         raise HTTPException(status_code=400, detail="Неверный логин или пароль")
@@ -240,9 +517,18 @@ def login(user: UserLogin, db: Session = Depends(get_db)):
         raise HTTPException(status_code=400, detail="Подтвердите почту перед входом")
     
     # Проверяем пароль
-    if not verify_password(user.password, db_user.password_hash):
+    try:
+        is_valid, new_hash = await verify_password_async(user.password, db_user.password_hash)
+    except PasswordPoolBusy:
+        raise password_pool_busy()
+    if not is_valid:
         raise HTTPException(status_code=400, detail="Неверный логин или пароль")
     
+    # Хэш со старым числом раундов bcrypt незаметно пересчитываем
+    if new_hash:
+        db_user.password_hash = new_hash
+        await db.commit()
+    
     # Создаем JWT токен ТОЛЬКО с email
     access_token = create_access_token(
         data={"email": db_user.email}  # Только email, без login и role
@@ -254,14 +540,14 @@ if __name__ == "__main__":
     uvicorn.run(app, host="0.0.0.0", port=25526)
 
 
-@app.get("/main-page")
-def main_page_html():
+@app.get("/main-page", response_class=Response)
+async def main_page_html(request: Request):
     """Страница main.html"""
-    return FileResponse("../frontend/main.html")
+    return await static_response(request, "main.html")
 
 # Также обновите endpoint /main для проверки аутентификации
 @app.get("/main")
-def main_page(request: Request, db: Session = Depends(get_db)):
+def main_page(request: Request, db: Session = Depends(get_sync_db)):
     # Получаем токен из заголовков Authorization
     auth_header = request.headers.get("Authorization")
     
@@ -316,61 +602,261 @@ def main_page(request: Request, db: Session = Depends(get_db)):
         }
     }
 
+PROJECT_LIST = TypeAdapter(List[Project])
+
 @app.get("/api/projects", response_model=List[Project])
-def get_projects(
+async def get_projects(
+    request: Request,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Получить список проектов (доступно всем ролям)"""
-    projects = db.query(models.Project).all()
-    return projects
+    async def load():
+        etag = make_etag("projects", await get_version(db, PROJECTS))
+        projects = (await db.scalars(select(models.Project))).all()
+        return etag, PROJECT_LIST.dump_json(PROJECT_LIST.validate_python(projects, from_attributes=True))
+    
+    return await serve_cached(request, "projects", f"list:{current_user.role}", load)
 
 @app.get("/api/projects/{project_id}", response_model=Project)
-def get_project(
+async def get_project(
     project_id: int,
+    request: Request,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Получить детальную информацию о проекте (доступно всем ролям)"""
-    project = db.query(models.Project).filter(models.Project.id == project_id).first()
-    if not project:
-        raise HTTPException(status_code=404, detail="Проект не найден")
-    return project
+    async def load():
+        etag = make_etag("project", project_id, await get_version(db, PROJECTS))
+        project = await db.get(models.Project, project_id)
+        if not project:
+            raise HTTPException(status_code=404, detail="Проект не найден")
+        return etag, Project.model_validate(project).model_dump_json().encode("utf-8")
+    
+    return await serve_cached(request, "projects", f"detail:{project_id}:{current_user.role}", load)
 
 @app.get("/api/defects", response_model=List[Defect])
-def get_defects(
+async def get_defects(
+    request: Request,
+    response: Response,
     current_user: User = Depends(get_current_user),
     project_id: Optional[int] = None,
     status: Optional[str] = None,
-    db: Session = Depends(get_db)
+    limit: int = Query(100, ge=1, le=1000),
+    cursor: Optional[str] = None,
+    expand: Optional[str] = None,
+    db: AsyncSession = Depends(get_db)
 ):
-    """Получить список дефектов с фильтрацией"""
-    query = db.query(models.Defect)
-    
-    # Фильтрация по проекту
-    if project_id:
-        query = query.filter(models.Defect.project_id == project_id)
-    
-    # Фильтрация по статусу
+    """Получить страницу дефектов с фильтрацией.
+
+    Курсор следующей страницы возвращается в заголовке X-Next-Cursor.
+    expand=project,stage,assignee,reporter,comments,attachments,history
+    добавляет к каждому дефекту связанные данные без запроса на каждую строку.
+    """
+    fields = parse_expand(expand)
+    
+    # Комментарии и вложения версий не меняют, поэтому ответы с expand без ETag
+    etag = None
+    if not fields:
+        # Инженеры видят свою выборку, остальные роли — одну и ту же
+        scope = current_user.id if current_user.role == "engineer" else "all"
+        etag = make_etag(
+            "defects", scope, project_id, status, limit, cursor,
+            await defect_versions(db, project_id)
+        )
+        if etag_matches(request, etag):
+            return not_modified(etag)
+    
+    query = build_defects_query(current_user.id, current_user.role, project_id, status)
+    query = query.options(*defect_load_options(fields))
+    after = decode_cursor(cursor) if cursor else None
+    
+    defects, next_cursor = await defects_page(db, query, after, limit)
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    if fields:
+        return JSONResponse(
+            content=[expand_defect(defect, fields) for defect in defects],
+            headers=dict(response.headers)
+        )
+    response.headers.update(conditional_headers(etag))
+    return defects
+
+EXPORT_BATCH_SIZE = 1000
+
+@app.get("/api/defects/export")
+async def export_defects(
+    current_user: User = Depends(get_current_user),
+    project_id: Optional[int] = None,
+    status: Optional[str] = None,
+    db: AsyncSession = Depends(get_db)
+):
+    """Выгрузить все дефекты потоком в формате NDJSON"""
     if status:
-        query = query.filter(models.Defect.status == status)
+        parse_defect_status(status)
+    user_id, role = current_user.id, current_user.role
+    # Сессия проверки токена иначе держала бы второе соединение из пула всю выгрузку
+    await db.close()
+    
+    async def generate():
+        # Отдельная сессия: ответ отдается уже после выхода из обработчика
+        async with AsyncSessionLocal() as export_db:
+            query = build_defects_query(user_id, role, project_id, status)
+            after = None
+            while True:
+                batch, next_cursor = await defects_page(export_db, query, after, EXPORT_BATCH_SIZE)
+                for defect in batch:
+                    yield Defect.model_validate(defect).model_dump_json() + "\n"
+                if next_cursor is None:
+                    break
+                after = decode_cursor(next_cursor)
+                export_db.expunge_all()
+    
+    return StreamingResponse(generate(), media_type="application/x-ndjson")
+
+@app.get("/api/defects/{defect_id}/full", response_model=DefectFull)
+async def get_defect_full(
+    defect_id: int,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """Дефект со всеми связанными данными за фиксированное число запросов"""
+    query = (
+        select(models.Defect)
+        .where(models.Defect.id == defect_id)
+        .options(*defect_load_options(list(DEFECT_EXPANSIONS)))
+    )
+    defect = (await db.scalars(query)).unique().one_or_none()
+    if not defect:
+        raise HTTPException(status_code=404, detail="Дефект не найден")
+    check_defect_read_access(defect, current_user)
+    return defect
+
+HISTORY_PAGE_LIMIT = 500
+
+@app.get("/api/defects/{defect_id}/history", response_model=List[DefectHistoryEntry])
+async def get_defect_history(
+    defect_id: int,
+    response: Response,
+    current_user: User = Depends(get_current_user),
+    limit: int = Query(50, ge=1, le=HISTORY_PAGE_LIMIT),
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(get_db)
+):
+    """История изменений дефекта, от новых записей к старым"""
+    defect = await db.get(models.Defect, defect_id)
+    if not defect:
+        raise HTTPException(status_code=404, detail="Дефект не найден")
+    check_defect_read_access(defect, current_user)
     
-    # Для инженеров показываем только их дефекты
+    query = select(models.DefectHistory).where(models.DefectHistory.defect_id == defect_id)
+    return await history_page(db, query, response, cursor, limit)
+
+@app.get("/api/projects/{project_id}/activity", response_model=List[DefectHistoryEntry])
+async def get_project_activity(
+    project_id: int,
+    response: Response,
+    current_user: User = Depends(get_current_user),
+    limit: int = Query(50, ge=1, le=HISTORY_PAGE_LIMIT),
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(get_db)
+):
+    """Лента изменений всех дефектов проекта, от новых записей к старым"""
+    project = await db.get(models.Project, project_id)
+    if not project:
+        raise HTTPException(status_code=404, detail="Проект не найден")
+    
+    query = select(models.DefectHistory).where(models.DefectHistory.project_id == project_id)
+    # Инженеры видят только изменения своих дефектов
     if current_user.role == "engineer":
-        query = query.filter(
-            (models.Defect.reported_by == current_user.id) | 
+        own_defects = select(models.Defect.id).where(
+            (models.Defect.reported_by == current_user.id) |
             (models.Defect.assigned_to == current_user.id)
         )
-    
-    defects = query.all()
-    return defects
+        query = query.where(models.DefectHistory.defect_id.in_(own_defects))
+    return await history_page(db, query, response, cursor, limit)
 
 # 👷 ЭНДПОИНТЫ ДЛЯ ИНЖЕНЕРОВ
+BULK_MAX_ITEMS = 500
+
+def new_defect(defect: DefectCreate, user_id: int) -> models.Defect:
+    defect_data = defect.model_dump()
+    defect_data["status"] = parse_defect_status(defect.status)
+    defect_data["priority"] = parse_priority(defect.priority)
+    return models.Defect(**defect_data, reported_by=user_id)
+
+def created_history(db_defect: models.Defect, user_id: int) -> dict:
+    return {
+        "defect_id": db_defect.id,
+        "project_id": db_defect.project_id,
+        "field_name": "created",
+        "old_value": None,
+        "new_value": "Дефект создан",
+        "changed_by": user_id
+    }
+
+def check_defect_edit_access(db_defect: models.Defect, current_user: User):
+    if current_user.role == "engineer" and db_defect.reported_by != current_user.id:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Вы можете редактировать только свои дефекты"
+        )
+
+def apply_defect_changes(db_defect: models.Defect, defect_update: DefectUpdate, user_id: int) -> List[dict]:
+    """Применить изменения к дефекту и вернуть строки для DefectHistory"""
+    update_data = defect_update.model_dump(exclude_unset=True)
+    if "status" in update_data:
+        update_data["status"] = parse_defect_status(update_data["status"])
+    if "priority" in update_data:
+        update_data["priority"] = parse_priority(update_data["priority"])
+    
+    history = []
+    for field, value in update_data.items():
+        if hasattr(db_defect, field):
+            old_value = history_value(getattr(db_defect, field))
+            setattr(db_defect, field, value)
+            history.append({
+                "defect_id": db_defect.id,
+                "project_id": db_defect.project_id,
+                "field_name": field,
+                "old_value": old_value,
+                "new_value": history_value(value),
+                "changed_by": user_id
+            })
+    
+    db_defect.updated_at = datetime.utcnow()
+    return history
+
+def changes_text(history: List[dict]) -> bool:
+    """Изменились ли поля, попадающие в поисковый индекс"""
+    return any(change["field_name"] in ("title", "description") for change in history)
+
+def publish_defect_event(event_type: str, db_defect: models.Defect, **data):
+    """Разослать событие подписчикам /api/events (вызывать после commit)"""
+    # Без подписчиков дефект незачем сериализовать
+    if not broker.has_subscribers():
+        return
+    broker.publish({
+        "type": event_type,
+        "project_id": db_defect.project_id,
+        "defect_id": db_defect.id,
+        "reported_by": db_defect.reported_by,
+        "assigned_to": db_defect.assigned_to,
+        "defect": Defect.model_validate(db_defect).model_dump(mode="json"),
+        **data
+    })
+
+def validation_detail(error: ValidationError) -> str:
+    return "; ".join(
+        f"{'.'.join(str(part) for part in e['loc'])}: {e['msg']}" if e["loc"] else e["msg"]
+        for e in error.errors()
+    )
+
 @app.post("/api/defects", response_model=Defect)
-def create_defect(
+async def create_defect(
     defect: DefectCreate,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Создать новый дефект (только инженеры и менеджеры)"""
     if current_user.role not in ["engineer", "manager"]:
@@ -380,80 +866,236 @@ def create_defect(
         )
     
     # Проверяем существование проекта
-    project = db.query(Project).filter(Project.id == defect.project_id).first()
+    project = await db.get(models.Project, defect.project_id)
     if not project:
         raise HTTPException(status_code=404, detail="Проект не найден")
     
     # Создаем дефект
-    db_defect = Defect(
-        **defect.model_dump(),
-        reported_by=current_user.id
-    )
-    
+    db_defect = new_defect(defect, current_user.id)
     db.add(db_defect)
-    db.commit()
-    db.refresh(db_defect)
-    
-    # Записываем в историю
-    history = DefectHistory(
-        defect_id=db_defect.id,
-        field_name="created",
-        old_value=None,
-        new_value="Дефект создан",
-        changed_by=current_user.id
-    )
-    db.add(history)
-    db.commit()
+    await db.flush()
+    
+    # Записываем в историю и статистику в той же транзакции
+    db.add(models.DefectHistory(**created_history(db_defect, current_user.id)))
+    await db.run_sync(track_defect_created, db_defect)
+    await db.run_sync(bump_defect_versions, [db_defect.project_id])
+    await db.run_sync(index_new_defects, [db_defect])
+    await db.commit()
+    await db.refresh(db_defect)
+    publish_defect_event("defect_created", db_defect)
     
     return db_defect
 
+@app.post("/api/defects/bulk", response_model=List[BulkItemResult])
+async def create_defects_bulk(
+    items: List[Dict[str, Any]] = Body(...),
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """Создать пачку дефектов одной транзакцией (только инженеры и менеджеры)
+
+    Каждый элемент проверяется отдельно, результат возвращается по каждому.
+    """
+    if current_user.role not in ["engineer", "manager"]:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Недостаточно прав для создания дефектов"
+        )
+    if len(items) > BULK_MAX_ITEMS:
+        raise HTTPException(status_code=400, detail=f"Не более {BULK_MAX_ITEMS} дефектов за раз")
+    
+    results = [BulkItemResult(index=index, ok=False) for index in range(len(items))]
+    parsed = {}
+    for index, item in enumerate(items):
+        try:
+            parsed[index] = DefectCreate.model_validate(item)
+        except ValidationError as e:
+            results[index].detail = validation_detail(e)
+    
+    # Проекты, этапы и исполнители пачки проверяем одним запросом на таблицу:
+    # иначе неверная ссылка в одном элементе уронит flush всей пачки
+    project_ids = {defect.project_id for defect in parsed.values()}
+    existing_projects = set(
+        await db.scalars(select(models.Project.id).where(models.Project.id.in_(project_ids)))
+    ) if project_ids else set()
+    stage_ids = {defect.project_stage_id for defect in parsed.values() if defect.project_stage_id is not None}
+    stage_projects = dict((await db.execute(
+        select(models.ProjectStage.id, models.ProjectStage.project_id).where(models.ProjectStage.id.in_(stage_ids))
+    )).all()) if stage_ids else {}
+    assignee_ids = {defect.assigned_to for defect in parsed.values() if defect.assigned_to is not None}
+    existing_users = set(
+        await db.scalars(select(models.User.id).where(models.User.id.in_(assignee_ids)))
+    ) if assignee_ids else set()
+    
+    created = {}
+    for index, defect in parsed.items():
+        if defect.project_id not in existing_projects:
+            results[index].detail = "Проект не найден"
+            continue
+        if defect.project_stage_id is not None and defect.project_stage_id not in stage_projects:
+            results[index].detail = "Этап не найден"
+            continue
+        if defect.project_stage_id is not None and stage_projects[defect.project_stage_id] != defect.project_id:
+            results[index].detail = "Этап относится к другому проекту"
+            continue
+        if defect.assigned_to is not None and defect.assigned_to not in existing_users:
+            results[index].detail = "Исполнитель не найден"
+            continue
+        try:
+            created[index] = new_defect(defect, current_user.id)
+        except HTTPException as e:
+            results[index].detail = e.detail
+    
+    if created:
+        db.add_all(created.values())
+        await db.flush()
+        
+        deltas = Counter(defect_key(db_defect) for db_defect in created.values())
+        await db.execute(insert(models.DefectHistory), [
+            created_history(db_defect, current_user.id) for db_defect in created.values()
+        ])
+        await db.run_sync(apply_defect_deltas, deltas)
+        await db.run_sync(bump_defect_versions, [db_defect.project_id for db_defect in created.values()])
+        await db.run_sync(index_new_defects, list(created.values()))
+        await db.commit()
+        
+        if broker.has_subscribers():
+            # Один запрос дочитывает серверные значения (created_at) всех новых дефектов
+            await db.scalars(select(models.Defect).where(
+                models.Defect.id.in_([db_defect.id for db_defect in created.values()])
+            ))
+            for db_defect in created.values():
+                publish_defect_event("defect_created", db_defect)
+    
+    for index, db_defect in created.items():
+        results[index].ok = True
+        results[index].id = db_defect.id
+    return results
+
+@app.patch("/api/defects/bulk", response_model=List[BulkItemResult])
+async def update_defects_bulk(
+    items: List[Dict[str, Any]] = Body(...),
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """Обновить пачку дефектов одной транзакцией (инженеры - только свои, менеджеры - любые)
+
+    Элемент - поля DefectUpdate плюс id дефекта.
+    """
+    if len(items) > BULK_MAX_ITEMS:
+        raise HTTPException(status_code=400, detail=f"Не более {BULK_MAX_ITEMS} дефектов за раз")
+    
+    results = [BulkItemResult(index=index, ok=False) for index in range(len(items))]
+    parsed = {}
+    for index, item in enumerate(items):
+        try:
+            parsed[index] = DefectBulkUpdate.model_validate(item)
+        except ValidationError as e:
+            results[index].detail = validation_detail(e)
+    
+    # Все дефекты пачки загружаем одним запросом и блокируем до commit: старые
+    # группы статистики должны браться из строк, которые никто не меняет параллельно.
+    # Порядок по id — один порядок блокировок во всех транзакциях
+    defect_ids = {defect.id for defect in parsed.values()}
+    defects = {
+        db_defect.id: db_defect for db_defect in await db.scalars(
+            select(models.Defect)
+            .where(models.Defect.id.in_(defect_ids))
+            .order_by(models.Defect.id)
+            .with_for_update()
+        )
+    } if defect_ids else {}
+    # Исполнители проверяются одним запросом: иначе неизвестный id роняет
+    # всю пачку ошибкой внешнего ключа при commit
+    assignee_ids = {
+        defect.assigned_to for defect in parsed.values() if defect.assigned_to is not None
+    }
+    existing_users = set(
+        await db.scalars(select(models.User.id).where(models.User.id.in_(assignee_ids)))
+    ) if assignee_ids else set()
+    
+    history = []
+    deltas = Counter()
+    reindex = {}
+    events = []
+    for index, defect_update in parsed.items():
+        db_defect = defects.get(defect_update.id)
+        if not db_defect:
+            results[index].detail = "Дефект не найден"
+            continue
+        try:
+            check_defect_edit_access(db_defect, current_user)
+            if defect_update.assigned_to is not None and defect_update.assigned_to not in existing_users:
+                raise HTTPException(status_code=400, detail="Исполнитель не найден")
+            old_key = defect_key(db_defect)
+            changes = DefectUpdate(**defect_update.model_dump(exclude={"id"}, exclude_unset=True))
+            changed = apply_defect_changes(db_defect, changes, current_user.id)
+        except HTTPException as e:
+            results[index].detail = e.detail
+            continue
+        history.extend(changed)
+        if changed:
+            events.append((db_defect, [change["field_name"] for change in changed]))
+        if changes_text(changed):
+            reindex[db_defect.id] = db_defect
+        deltas[old_key] -= 1
+        deltas[defect_key(db_defect)] += 1
+        results[index].ok = True
+        results[index].id = db_defect.id
+    
+    if history:
+        await db.execute(insert(models.DefectHistory), history)
+    await db.run_sync(apply_defect_deltas, deltas)
+    await db.run_sync(bump_defect_versions, [db_defect.project_id for db_defect, _ in events])
+    for db_defect in reindex.values():
+        await db.run_sync(index_defect, db_defect)
+    await db.commit()
+    
+    for db_defect, fields in events:
+        publish_defect_event("defect_updated", db_defect, changes=fields)
+    return results
+
 @app.patch("/api/defects/{defect_id}", response_model=Defect)
-def update_defect(
+async def update_defect(
     defect_id: int,
     defect_update: DefectUpdate,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Обновить дефект (инженеры - только свои, менеджеры - любые)"""
-    db_defect = db.query(Defect).filter(Defect.id == defect_id).first()
+    # Строка блокируется до commit: старая группа статистики не устареет под нами
+    db_defect = await db.scalar(
+        select(models.Defect).where(models.Defect.id == defect_id).with_for_update()
+    )
     if not db_defect:
         raise HTTPException(status_code=404, detail="Дефект не найден")
     
     # Проверка прав
-    if current_user.role == "engineer" and db_defect.reported_by != current_user.id:
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Вы можете редактировать только свои дефекты"
-        )
-    
-    # Обновляем поля
-    update_data = defect_update.model_dump(exclude_unset=True)
-    for field, value in update_data.items():
-        if hasattr(db_defect, field):
-            old_value = str(getattr(db_defect, field))
-            setattr(db_defect, field, value)
-            
-            # Записываем в историю
-            history = DefectHistory(
-                defect_id=defect_id,
-                field_name=field,
-                old_value=old_value,
-                new_value=str(value),
-                changed_by=current_user.id
-            )
-            db.add(history)
-    
-    db_defect.updated_at = datetime.utcnow()
-    db.commit()
-    db.refresh(db_defect)
+    check_defect_edit_access(db_defect, current_user)
+    
+    # Обновляем поля и записываем в историю
+    old_key = defect_key(db_defect)
+    history = apply_defect_changes(db_defect, defect_update, current_user.id)
+    if history:
+        await db.execute(insert(models.DefectHistory), history)
+    
+    await db.run_sync(track_defect_changed, old_key, db_defect)
+    if history:
+        await db.run_sync(bump_defect_versions, [db_defect.project_id])
+    if changes_text(history):
+        await db.run_sync(index_defect, db_defect)
+    await db.commit()
+    await db.refresh(db_defect)
+    if history:
+        publish_defect_event("defect_updated", db_defect, changes=[change["field_name"] for change in history])
     
     return db_defect
 
 @app.post("/api/comments", response_model=Comment)
-def create_comment(
+async def create_comment(
     comment: CommentCreate,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Добавить комментарий к дефекту (инженеры и менеджеры)"""
     if current_user.role not in ["engineer", "manager"]:
@@ -463,7 +1105,7 @@ def create_comment(
         )
     
     # Проверяем существование дефекта
-    defect = db.query(Defect).filter(Defect.id == comment.defect_id).first()
+    defect = await db.get(models.Defect, comment.defect_id)
     if not defect:
         raise HTTPException(status_code=404, detail="Дефект не найден")
     
@@ -474,23 +1116,254 @@ def create_comment(
             detail="Вы можете комментировать только свои дефекты"
         )
     
-    db_comment = DefectComment(
+    db_comment = models.DefectComment(
         **comment.model_dump(),
         user_id=current_user.id
     )
     
     db.add(db_comment)
-    db.commit()
-    db.refresh(db_comment)
+    await db.flush()
+    await db.run_sync(index_new_comment, db_comment, defect.project_id)
+    await db.commit()
+    await db.refresh(db_comment)
+    publish_defect_event(
+        "comment_created", defect,
+        comment=Comment.model_validate(db_comment).model_dump(mode="json")
+    )
     
     return db_comment
 
+# 📡 СОБЫТИЯ
+@app.get("/api/events")
+async def defect_events(
+    current_user: User = Depends(get_current_user),
+    project_id: Optional[int] = None,
+    db: AsyncSession = Depends(get_db)
+):
+    """Поток изменений дефектов (Server-Sent Events) вместо опроса /api/defects
+
+    События: defect_created, defect_updated, comment_created; evicted —
+    клиент не успевал читать и должен перезагрузить данные.
+    """
+    try:
+        subscriber = broker.subscribe(current_user.id, current_user.role, project_id)
+    except TooManySubscribers:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Слишком много подписчиков, попробуйте позже",
+            headers={"Retry-After": "5"}
+        )
+    # Сессия проверки токена иначе держала бы соединение из пула весь поток
+    await db.close()
+    
+    return StreamingResponse(
+        event_stream(subscriber),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+# 🔎 ПОИСК
+@app.get("/api/search", response_model=SearchResults)
+async def search(
+    q: str,
+    current_user: User = Depends(get_current_user),
+    project_id: Optional[int] = None,
+    limit: int = Query(20, ge=1, le=100),
+    offset: int = Query(0, ge=0),
+    db: AsyncSession = Depends(get_db)
+):
+    """Полнотекстовый поиск по дефектам и комментариям с учетом словоформ"""
+    query_stems = list(dict.fromkeys(stems(q)))
+    if not query_stems:
+        raise HTTPException(status_code=400, detail="Пустой поисковый запрос")
+    
+    # Берем на одну запись больше, чтобы понять, есть ли следующая страница
+    rows = await search_documents(db, query_stems, current_user.id, current_user.role, project_id, limit + 1, offset)
+    items = [
+        SearchHit(
+            source=document.source,
+            defect_id=document.defect_id,
+            comment_id=document.source_id if document.source == "comment" else None,
+            project_id=document.project_id,
+            title=highlight(document.title, query_stems),
+            snippet=highlight(document.body, query_stems),
+            score=float(score or 0)
+        )
+        for document, score in rows[:limit]
+    ]
+    return SearchResults(items=items, limit=limit, offset=offset, has_more=len(rows) > limit)
+
+# 📎 ВЛОЖЕНИЯ
+def check_defect_read_access(defect: models.Defect, current_user: User):
+    if current_user.role == "engineer" and defect.reported_by != current_user.id and defect.assigned_to != current_user.id:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Нет доступа к этому дефекту"
+        )
+
+@app.post("/api/defects/{defect_id}/attachments", response_model=Attachment)
+async def upload_attachment(
+    defect_id: int,
+    file: UploadFile = File(...),
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """Загрузить вложение к дефекту (инженеры и менеджеры)"""
+    if current_user.role not in ["engineer", "manager"]:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Недостаточно прав для загрузки вложений"
+        )
+    
+    defect = await db.get(models.Defect, defect_id)
+    if not defect:
+        raise HTTPException(status_code=404, detail="Дефект не найден")
+    check_defect_read_access(defect, current_user)
+    
+    # Файл копируется в хранилище кусками в отдельном потоке
+    try:
+        sha256, size = await run_in_threadpool(store_file, file.file)
+    except AttachmentTooLarge:
+        raise HTTPException(status_code=413, detail="Файл слишком большой")
+    finally:
+        await file.close()
+    
+    db_attachment = models.DefectAttachment(
+        defect_id=defect_id,
+        filename=os.path.basename(file.filename or sha256)[:255],
+        file_path=content_path(sha256),
+        file_type=file.content_type,
+        uploaded_by=current_user.id
+    )
+    db.add(db_attachment)
+    await db.commit()
+    await db.refresh(db_attachment)
+    
+    # Превью фотографий строятся в фоне, ответ их не ждет
+    if is_image(db_attachment.file_type):
+        schedule_thumbnails(absolute_path(db_attachment.file_path))
+    
+    return db_attachment
+
+@app.get("/api/defects/{defect_id}/attachments", response_model=List[Attachment])
+async def get_attachments(
+    defect_id: int,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """Список вложений дефекта"""
+    defect = await db.get(models.Defect, defect_id)
+    if not defect:
+        raise HTTPException(status_code=404, detail="Дефект не найден")
+    check_defect_read_access(defect, current_user)
+    
+    query = select(models.DefectAttachment).where(models.DefectAttachment.defect_id == defect_id)
+    return (await db.scalars(query.order_by(models.DefectAttachment.id))).all()
+
+@app.get("/api/attachments/{attachment_id}/content")
+async def download_attachment(
+    attachment_id: int,
+    request: Request,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """Скачать вложение (поддерживаются Range и If-None-Match)"""
+    attachment = await db.get(models.DefectAttachment, attachment_id)
+    if not attachment:
+        raise HTTPException(status_code=404, detail="Вложение не найдено")
+    defect = await db.get(models.Defect, attachment.defect_id)
+    check_defect_read_access(defect, current_user)
+    
+    path = absolute_path(attachment.file_path)
+    if not os.path.exists(path):
+        raise HTTPException(status_code=404, detail="Файл вложения не найден")
+    size = os.path.getsize(path)
+    
+    # Содержимое адресуется хэшем, поэтому хэш и есть сильный ETag
+    etag = f'"{sha256_of(attachment.file_path)}"'
+    headers = {
+        "ETag": etag,
+        "Accept-Ranges": "bytes",
+        "Cache-Control": "private, max-age=31536000, immutable",
+        "Content-Disposition": f"attachment; filename*=UTF-8''{quote(attachment.filename)}"
+    }
+    if etag_matches(request, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    
+    media_type = attachment.file_type or "application/octet-stream"
+    byte_range = None
+    if_range = request.headers.get("If-Range")
+    if not if_range or if_range == etag:
+        try:
+            byte_range = parse_range(request.headers.get("Range"), size)
+        except ValueError:
+            return Response(
+                status_code=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE,
+                headers={**headers, "Content-Range": f"bytes */{size}"}
+            )
+    
+    if byte_range is None:
+        headers["Content-Length"] = str(size)
+        return StreamingResponse(iter_file(path, 0, size - 1), media_type=media_type, headers=headers)
+    
+    start, end = byte_range
+    headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+    headers["Content-Length"] = str(end - start + 1)
+    return StreamingResponse(
+        iter_file(path, start, end),
+        status_code=status.HTTP_206_PARTIAL_CONTENT,
+        media_type=media_type,
+        headers=headers
+    )
+
+@app.get("/api/attachments/{attachment_id}/thumbnail")
+async def get_attachment_thumbnail(
+    attachment_id: int,
+    request: Request,
+    format: Optional[str] = None,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """Превью фотографии (jpeg или webp, по умолчанию - по заголовку Accept)"""
+    attachment = await db.get(models.DefectAttachment, attachment_id)
+    if not attachment:
+        raise HTTPException(status_code=404, detail="Вложение не найдено")
+    defect = await db.get(models.Defect, attachment.defect_id)
+    check_defect_read_access(defect, current_user)
+    
+    if not is_image(attachment.file_type):
+        raise HTTPException(status_code=404, detail="Превью доступно только для изображений")
+    if format is None:
+        format = "webp" if "image/webp" in request.headers.get("Accept", "") else "jpeg"
+    if format not in THUMBNAIL_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Неизвестный формат превью: {format}")
+    
+    etag = f'"{sha256_of(attachment.file_path)}-{THUMBNAIL_SIZE}-{format}"'
+    headers = {
+        "ETag": etag,
+        "Cache-Control": "private, max-age=31536000, immutable",
+        "Vary": "Accept"
+    }
+    if etag_matches(request, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    
+    original_path = absolute_path(attachment.file_path)
+    if not os.path.exists(original_path):
+        raise HTTPException(status_code=404, detail="Файл вложения не найден")
+    try:
+        path = await ensure_thumbnail(original_path, format)
+    except ThumbnailError:
+        raise HTTPException(status_code=422, detail="Не удалось построить превью")
+    
+    _, media_type = THUMBNAIL_FORMATS[format]
+    return FileResponse(path, media_type=media_type, headers=headers)
+
 # 👨‍💼 ЭНДПОИНТЫ ДЛЯ МЕНЕДЖЕРОВ
 @app.post("/api/projects", response_model=Project)
-def create_project(
+async def create_project(
     project: ProjectCreate,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Создать новый проект (только менеджеры)"""
     if current_user.role != "manager":
@@ -499,22 +1372,24 @@ def create_project(
             detail="Недостаточно прав для создания проектов"
         )
     
-    db_project = Project(
+    db_project = models.Project(
         **project.model_dump(),
         created_by=current_user.id
     )
     
     db.add(db_project)
-    db.commit()
-    db.refresh(db_project)
+    await db.run_sync(bump_version, PROJECTS)
+    await db.commit()
+    await db.refresh(db_project)
+    await response_cache.invalidate("projects")
     
     return db_project
 
 @app.post("/api/project-stages", response_model=ProjectStage)
-def create_project_stage(
+async def create_project_stage(
     stage: ProjectStageCreate,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Создать этап проекта (только менеджеры)"""
     if current_user.role != "manager":
@@ -523,18 +1398,33 @@ def create_project_stage(
             detail="Недостаточно прав для создания этапов проектов"
         )
     
-    db_stage = ProjectStage(**stage.model_dump())
+    db_stage = models.ProjectStage(**stage.model_dump())
     
     db.add(db_stage)
-    db.commit()
-    db.refresh(db_stage)
+    await db.run_sync(bump_version, PROJECTS)
+    await db.commit()
+    await db.refresh(db_stage)
+    # Этапы относятся к данным проекта: кэш проектов сбрасываем и здесь
+    await response_cache.invalidate("projects")
     
     return db_stage
 
+async def confirmed_users(db: AsyncSession) -> List[UserProfile]:
+    users = (await db.scalars(select(User).where(User.reg_token == None))).all()
+    return [
+        UserProfile(
+            email=user.email,
+            login=user.login,
+            full_name=user.fio,
+            role=user.role
+        )
+        for user in users
+    ]
+
 @app.get("/api/users", response_model=List[UserProfile])
-def get_users(
+async def get_users(
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Получить список пользователей (только менеджеры)"""
     if current_user.role != "manager":
@@ -543,71 +1433,150 @@ def get_users(
             detail="Недостаточно прав для просмотра списка пользователей"
         )
     
-    users = db.query(User).filter(User.reg_token == None).all()
-    return [
-        UserProfile(
-            email=user.email,
-            login=user.login,
-            full_name=user.fio,
-            role=user.role
-        )
-        for user in users
-    ]
+    return await confirmed_users(db)
 
 # 📈 ЭНДПОИНТЫ ДЛЯ ОТЧЕТНОСТИ
+STATISTICS_BREAKDOWNS = {
+    "project": "project_id",
+    "stage": "project_stage_id",
+}
+
+def empty_defect_counts():
+    return {
+        "total": 0,
+        "by_status": {s.value: 0 for s in models.DefectStatus},
+        "by_priority": {p.value: 0 for p in models.PriorityLevel},
+    }
+
+def add_defect_counts(counts: dict, status, priority, count: int):
+    counts["total"] += count
+    if status is not None:
+        counts["by_status"][status.value] += count
+    if priority is not None:
+        counts["by_priority"][priority.value] += count
+
+def summarize_defect_counts(rows, breakdown: List[str]):
+    """Свести строки (status, priority, [project_id], [project_stage_id], count) в ответ статистики"""
+    summary = empty_defect_counts()
+    groups = {name: {} for name in breakdown}
+    
+    for row in rows:
+        row = row._mapping
+        count = int(row["count"])
+        add_defect_counts(summary, row["status"], row["priority"], count)
+        for name in breakdown:
+            column = STATISTICS_BREAKDOWNS[name]
+            group = groups[name].setdefault(row[column], {column: row[column], **empty_defect_counts()})
+            add_defect_counts(group, row["status"], row["priority"], count)
+    
+    total = summary["total"]
+    closed = summary["by_status"][models.DefectStatus.CLOSED.value]
+    result = {
+        "total": total,
+        "new": summary["by_status"][models.DefectStatus.NEW.value],
+        "in_progress": summary["by_status"][models.DefectStatus.IN_PROGRESS.value],
+        "closed": closed,
+        "completion_rate": round((closed / total * 100) if total > 0 else 0, 2),
+        "by_status": summary["by_status"],
+        "by_priority": summary["by_priority"],
+    }
+    for name in breakdown:
+        result[f"by_{name}"] = list(groups[name].values())
+    return result
+
+async def defect_statistics(db: AsyncSession, project_id: Optional[int], breakdown: List[str]) -> dict:
+    # Читаем сводную таблицу: число групп, а не число дефектов
+    rollup = models.DefectStatistic
+    group_columns = [rollup.status, rollup.priority]
+    if "project" in breakdown:
+        group_columns.append(rollup.project_id)
+    if "stage" in breakdown:
+        group_columns.append(func.nullif(rollup.project_stage_id, NO_STAGE).label("project_stage_id"))
+    
+    query = select(*group_columns, func.sum(rollup.count).label("count"))
+    if project_id:
+        query = query.where(rollup.project_id == project_id)
+    
+    rows = (await db.execute(query.group_by(*group_columns))).all()
+    return summarize_defect_counts(rows, breakdown)
+
 @app.get("/api/reports/defects-statistics")
-def get_defects_statistics(
+async def get_defects_statistics(
+    request: Request,
+    response: Response,
     current_user: User = Depends(get_current_user),
     project_id: Optional[int] = None,
-    db: Session = Depends(get_db)
+    breakdown: List[str] = Query([]),
+    db: AsyncSession = Depends(get_db)
 ):
-    """Получить статистику по дефектам (менеджеры и наблюдатели)"""
+    """Получить статистику по дефектам (менеджеры и наблюдатели)
+
+    breakdown=project и/или breakdown=stage добавляют разбивку по проектам и этапам.
+    """
     if current_user.role not in ["manager", "observer"]:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Недостаточно прав для просмотра статистики"
         )
     
-    # Базовая статистика
-    query = db.query(models.Defect)
-    if project_id:
-        query = query.filter(models.Defect.project_id == project_id)
+    unknown = [name for name in breakdown if name not in STATISTICS_BREAKDOWNS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Неизвестная разбивка: {', '.join(unknown)}")
+    breakdown = list(dict.fromkeys(breakdown))
     
-    total_defects = query.count()
-    new_defects = query.filter(models.Defect.status == "новая").count()
-    in_progress_defects = query.filter(models.Defect.status == "в работе").count()
-    closed_defects = query.filter(models.Defect.status == "закрыта").count()
+    etag = make_etag("statistics", project_id, sorted(breakdown), await defect_versions(db, project_id))
+    if etag_matches(request, etag):
+        return not_modified(etag)
     
-    return {
-        "total": total_defects,
-        "new": new_defects,
-        "in_progress": in_progress_defects,
-        "closed": closed_defects,
-        "completion_rate": round((closed_defects / total_defects * 100) if total_defects > 0 else 0, 2)
-    }
+    result = await defect_statistics(db, project_id, breakdown)
+    response.headers.update(conditional_headers(etag))
+    return result
 
-# Статические файлы (остаются без изменений)
-@app.get("/", response_class=FileResponse)
-async def read_root():
-    return FileResponse("../frontend/index.html")
+# 🏠 СТАРТОВЫЕ ДАННЫЕ ГЛАВНОЙ СТРАНИЦЫ
+async def in_own_session(load, *args):
+    """Выполнить load(db, *args) в отдельной сессии: одна AsyncSession не выполняет запросы параллельно"""
+    async with AsyncSessionLocal() as db:
+        return await load(db, *args)
 
-@app.get("/css/{file_path:path}", response_class=FileResponse)
-async def serve_css(file_path: str):
-    full_path = f"../frontend/css/{file_path}"
-    if not os.path.exists(full_path):
-        raise HTTPException(status_code=404, detail="File not found")
-    return FileResponse(full_path)
+async def all_projects(db: AsyncSession):
+    return (await db.scalars(select(models.Project))).all()
 
-@app.get("/js/{file_path:path}", response_class=FileResponse)
-async def serve_js(file_path: str):
-    full_path = f"../frontend/js/{file_path}"
-    if not os.path.exists(full_path):
-        raise HTTPException(status_code=404, detail="File not found")
-    return FileResponse(full_path)
+async def first_defects_page(db: AsyncSession, current_user: User, limit: int):
+    query = build_defects_query(current_user.id, current_user.role, None, None)
+    return await defects_page(db, query, None, limit)
 
-@app.get("/health")
-def health_check():
-    return {"status": "healthy", "message": "Service is running"}
+@app.get("/api/dashboard", response_model=Dashboard)
+async def get_dashboard(
+    current_user: User = Depends(get_current_user),
+    limit: int = Query(100, ge=1, le=1000)
+):
+    """Все данные для главной страницы за один запрос.
+
+    Пользователь, проекты, первая страница дефектов (курсор следующей — next_cursor),
+    статистика для менеджеров и наблюдателей, список пользователей для менеджеров.
+    Независимые запросы выполняются параллельно, каждый в своей сессии.
+    """
+    loads = {
+        "projects": in_own_session(all_projects),
+        "defects": in_own_session(first_defects_page, current_user, limit),
+    }
+    if current_user.role in ["manager", "observer"]:
+        # С разбивкой по проектам: счетчики карточек проектов не зависят от загруженных страниц
+        loads["statistics"] = in_own_session(defect_statistics, None, ["project"])
+    if current_user.role == "manager":
+        loads["users"] = in_own_session(confirmed_users)
+    
+    data = dict(zip(loads, await asyncio.gather(*loads.values())))
+    
+    data["defects"], data["next_cursor"] = data["defects"]
+    data["user"] = UserProfile(
+        id=current_user.id,
+        email=current_user.email,
+        login=current_user.login,
+        full_name=current_user.fio,
+        role=current_user.role
+    )
+    return data
 
 if __name__ == "__main__":
     import uvicorn
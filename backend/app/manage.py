@@ -0,0 +1,123 @@
+"""Разовые служебные команды: схема БД и демо-данные.
+
+    python -m app.manage migrate         применить миграции схемы (app.db_schema) и
+                                         заполнить пустые статистику и поисковый индекс
+    python -m app.manage check-schema    сверить app.models с базой (код 1 при расхождении)
+    python -m app.manage seed-demo       тестовый пользователь и демо-данные
+    python -m app.manage init            migrate и seed-demo (первый запуск для разработки)
+
+Раньше это выполнялось при импорте app.main в каждом воркере; теперь —
+один раз перед запуском сервера.
+"""
+import argparse
+import sys
+
+from sqlalchemy.orm import Session
+
+from . import models
+
+
+def migrate_schema(engine):
+    from .db_schema import migrate
+    migrate(engine)
+    print("Схема БД обновлена до последней миграции")
+
+
+def check_schema(engine) -> int:
+    from .db_schema import describe_difference, schema_status
+    status = schema_status(engine)
+    ok = True
+    if status["current"] != status["heads"]:
+        ok = False
+        print(f"Ревизия базы {status['current'] or 'нет'}, последняя {status['heads']}: python -m app.manage migrate")
+    if status["differences"]:
+        ok = False
+        print("Модели не совпадают со схемой базы (нужна миграция):")
+        for difference in status["differences"]:
+            print(f"  {describe_difference(difference)}")
+    if ok:
+        print(f"Схема совпадает с моделями, ревизия {', '.join(status['current'])}")
+    return 0 if ok else 1
+
+
+def fill_derived_tables(db: Session):
+    """Заполнить пустые производные таблицы по существующим дефектам.
+
+    Нужно после обновления базы, созданной без них (0002 создает их пустыми
+    для поиска и для баз, уже прошедших 0002): иначе статистика покажет нули,
+    а поиск ничего не найдет.
+    """
+    from .search import rebuild_search_index
+    from .statistics import rebuild_defect_statistics
+
+    if db.query(models.Defect.id).first() is None:
+        return
+
+    if db.query(models.DefectStatistic).first() is None:
+        rebuild_defect_statistics(db)
+        print("✅ Статистика дефектов пересчитана")
+
+    if db.query(models.SearchDocument).first() is None:
+        rebuild_search_index(db)
+        print("✅ Поисковый индекс построен")
+
+
+def seed_demo(db: Session):
+    """Тестовый пользователь, демо-данные и производные таблицы (если их еще нет)"""
+    from .auth import get_password_hash
+    from .test_data import create_test_data
+
+    # Создаем тестового пользователя если его нет
+    test_user = db.query(models.User).filter(models.User.email == "test@example.com").first()
+    if not test_user:
+        test_user = models.User(
+            email="test@example.com",
+            login="testuser",
+            fio="Тестовый Пользователь",
+            password_hash=get_password_hash("Test123!"),
+            role="manager"
+        )
+        db.add(test_user)
+        db.commit()
+        print("✅ Тестовый пользователь создан")
+
+    create_test_data(db)
+    print("✅ Тестовые данные добавлены")
+
+    fill_derived_tables(db)
+
+
+def init_database():
+    from .database import engine, SessionLocal
+
+    migrate_schema(engine)
+    with SessionLocal() as db:
+        seed_demo(db)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m app.manage", description="Служебные команды")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("migrate", help="применить миграции схемы")
+    commands.add_parser("check-schema", help="сверить модели со схемой базы")
+    commands.add_parser("seed-demo", help="тестовый пользователь и демо-данные")
+    commands.add_parser("init", help="migrate и seed-demo")
+    args = parser.parse_args(argv)
+
+    from .database import engine, SessionLocal
+
+    if args.command == "migrate":
+        migrate_schema(engine)
+        with SessionLocal() as db:
+            fill_derived_tables(db)
+    elif args.command == "check-schema":
+        return check_schema(engine)
+    elif args.command == "seed-demo":
+        with SessionLocal() as db:
+            seed_demo(db)
+    else:
+        init_database()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
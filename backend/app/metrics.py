@@ -0,0 +1,322 @@
+"""Метрики в текстовом формате Prometheus (/metrics).
+
+HTTP: число запросов, гистограмма задержек и запросы в работе по шаблону
+маршрута (/api/defects/{defect_id}, а не конкретный id) и методу. БД:
+ожидание соединения из пула (app.database.get_db), открытие соединений и
+время их удержания, занятость пула, длительность SQL-запросов и число
+запросов и время БД на один HTTP-запрос.
+"""
+import threading
+import time
+from contextvars import ContextVar
+from typing import Callable, Dict, Optional, Sequence, Tuple
+
+from sqlalchemy import event
+from starlette.routing import Match
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 5)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 200)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names: Sequence[str], values: Sequence, extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = [(name, value) for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+registry = []
+
+
+class Metric:
+    type = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], object] = {}
+        self._lock = threading.Lock()
+        registry.append(self)
+
+    def header(self) -> list:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type}"]
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def inc(self, *labels, amount: float = 1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self) -> list:
+        with self._lock:
+            items = list(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, labels)} {value}" for labels, value in items]
+
+
+class Gauge(Counter):
+    type = "gauge"
+
+    def set(self, *labels, value: float):
+        with self._lock:
+            self._values[labels] = value
+
+    def dec(self, *labels, amount: float = 1):
+        self.inc(*labels, amount=-amount)
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, *labels, value: float):
+        with self._lock:
+            state = self._values.get(labels)
+            if state is None:
+                state = self._values[labels] = [[0] * len(self.buckets), 0.0, 0]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[0][index] += 1
+                    break
+            state[1] += value
+            state[2] += 1
+
+    def render(self) -> list:
+        with self._lock:
+            items = [(labels, (list(state[0]), state[1], state[2])) for labels, state in self._values.items()]
+        lines = []
+        for labels, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, labels, ('le', bound))} {cumulative}")
+            lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, labels, ('le', '+Inf'))} {count}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, labels)} {total}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, labels)} {count}")
+        return lines
+
+
+class CallbackMetric(Metric):
+    """Значения считаются в момент чтения /metrics: fn() -> {(метки...): значение}"""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str], fn: Callable, type: str = "gauge"):
+        super().__init__(name, documentation, labelnames)
+        self.type = type
+        self.fn = fn
+
+    def render(self) -> list:
+        return [f"{self.name}{_format_labels(self.labelnames, labels)} {value}" for labels, value in self.fn().items()]
+
+
+def render_metrics() -> str:
+    lines = []
+    for metric in registry:
+        lines.extend(metric.header())
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+def merge_metrics(texts: list) -> str:
+    """Сложить одноименные ряды из вывода render_metrics() нескольких воркеров"""
+    families = {}
+    for text in texts:
+        family = None
+        for line in text.splitlines():
+            if line.startswith("# "):
+                # Заголовки HELP/TYPE открывают семейство; его ряды идут следом
+                family = families.setdefault(line.split(" ", 3)[2], {"header": [], "series": {}})
+                if line not in family["header"]:
+                    family["header"].append(line)
+            elif line and family is not None:
+                series, _, value = line.rpartition(" ")
+                family["series"][series] = family["series"].get(series, 0) + float(value)
+    lines = []
+    for family in families.values():
+        lines.extend(family["header"])
+        lines.extend(
+            f"{series} {int(value) if value.is_integer() else value}" for series, value in family["series"].items()
+        )
+    return "\n".join(lines) + "\n"
+
+
+HTTP_REQUESTS = Counter("http_requests_total", "HTTP requests", ["method", "route", "status"])
+HTTP_LATENCY = Histogram("http_request_duration_seconds", "HTTP request latency", ["method", "route"])
+HTTP_IN_PROGRESS = Gauge("http_requests_in_progress", "HTTP requests in progress", ["method", "route"])
+
+DB_POOL_WAIT = Histogram(
+    "db_pool_checkout_wait_seconds", "Time spent waiting for a pooled connection", ["method", "route"], QUERY_BUCKETS
+)
+DB_POOL_CONNECT = Histogram(
+    "db_pool_connect_seconds", "Time to open a new database connection", ["engine"], QUERY_BUCKETS
+)
+DB_POOL_HOLD = Histogram(
+    "db_pool_connection_hold_seconds", "Time a connection stays checked out of the pool", ["engine"], LATENCY_BUCKETS
+)
+DB_POOL_CHECKOUTS = Counter("db_pool_checkouts_total", "Connections checked out of the pool", ["engine"])
+DB_QUERY_DURATION = Histogram(
+    "db_query_duration_seconds", "SQL statement duration", ["method", "route"], QUERY_BUCKETS
+)
+DB_QUERIES_PER_REQUEST = Histogram(
+    "db_queries_per_request", "SQL statements per HTTP request", ["method", "route"], COUNT_BUCKETS
+)
+DB_TIME_PER_REQUEST = Histogram(
+    "db_time_per_request_seconds", "Total SQL time per HTTP request", ["method", "route"], LATENCY_BUCKETS
+)
+
+
+class RequestStats:
+    __slots__ = ("method", "route", "queries", "db_seconds")
+
+    def __init__(self, method: str, route: str):
+        self.method = method
+        self.route = route
+        self.queries = 0
+        self.db_seconds = 0.0
+
+
+# Статистика текущего HTTP-запроса; вне запроса (фоновые задачи, CLI) — None
+current_request: ContextVar[Optional[RequestStats]] = ContextVar("current_request", default=None)
+
+_pools = {}
+
+
+def observe_pool_wait(seconds: float):
+    """Учесть ожидание соединения из пула для текущего HTTP-запроса"""
+    stats = current_request.get()
+    if stats is None:
+        DB_POOL_WAIT.observe("-", "-", value=seconds)
+    else:
+        DB_POOL_WAIT.observe(stats.method, stats.route, value=seconds)
+
+
+def _pool_stats():
+    values = {}
+    for name, engine in _pools.items():
+        pool = engine.pool
+        # У пулов SQLite нет размера и переполнения
+        for field in ("size", "checkedout", "overflow", "checkedin"):
+            method = getattr(pool, field, None)
+            if callable(method):
+                values[(name, field)] = method()
+    return values
+
+
+CallbackMetric("db_pool_connections", "Connection pool state", ["engine", "state"], _pool_stats)
+
+
+def instrument_engine(engine, name: str):
+    """Подключить метрики SQL и пула к синхронному движку (для async — engine.sync_engine)"""
+    _pools[name] = engine
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["query_started"].pop()
+        stats = current_request.get()
+        if stats is None:
+            DB_QUERY_DURATION.observe("-", "-", value=elapsed)
+        else:
+            DB_QUERY_DURATION.observe(stats.method, stats.route, value=elapsed)
+            stats.queries += 1
+            stats.db_seconds += elapsed
+
+    @event.listens_for(engine, "handle_error")
+    def _error(context):
+        started = context.connection.info.get("query_started") if context.connection is not None else None
+        if started:
+            started.pop()
+
+    # Открытие соединения: от do_connect диалекта до события connect пула
+    @event.listens_for(engine, "do_connect")
+    def _do_connect(dialect, connection_record, cargs, cparams):
+        connection_record.info["connect_started"] = time.perf_counter()
+
+    @event.listens_for(engine, "connect")
+    def _connect(dbapi_connection, connection_record):
+        started = connection_record.info.pop("connect_started", None)
+        if started is not None:
+            DB_POOL_CONNECT.observe(name, value=time.perf_counter() - started)
+
+    # Долгое удержание соединений и есть причина ожидания пула (само ожидание — DB_POOL_WAIT)
+    @event.listens_for(engine, "checkout")
+    def _checkout(dbapi_connection, connection_record, connection_proxy):
+        connection_record.info["checked_out_at"] = time.perf_counter()
+        DB_POOL_CHECKOUTS.inc(name)
+
+    @event.listens_for(engine, "checkin")
+    def _checkin(dbapi_connection, connection_record):
+        started = connection_record.info.pop("checked_out_at", None)
+        if started is not None:
+            DB_POOL_HOLD.observe(name, value=time.perf_counter() - started)
+
+
+def route_template(app, scope) -> str:
+    """Шаблон пути маршрута; неизвестные пути сводятся к одной метке"""
+    partial = None
+    for route in app.router.routes:
+        match, _ = route.matches(scope)
+        if match == Match.FULL:
+            return route.path
+        if match == Match.PARTIAL and partial is None:
+            partial = route.path
+    return partial or "unmatched"
+
+
+class MetricsMiddleware:
+    """ASGI-middleware: время считается до конца отдачи тела, в т.ч. потоковых ответов
+
+    server_timing(stats, секунды) -> значение заголовка Server-Timing (если задан).
+    """
+
+    def __init__(self, app, fastapi_app=None, server_timing: Optional[Callable] = None):
+        self.app = app
+        self.fastapi_app = fastapi_app
+        self.server_timing = server_timing
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        route = route_template(self.fastapi_app, scope)
+        stats = RequestStats(method, route)
+        token = current_request.set(stats)
+        status_code = 500
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                if self.server_timing is not None:
+                    # К началу ответа обработчик уже выполнил свои запросы к БД
+                    value = self.server_timing(stats, time.perf_counter() - started)
+                    message["headers"] = [*message.get("headers", []), (b"server-timing", value.encode("latin-1"))]
+            await send(message)
+
+        HTTP_IN_PROGRESS.inc(method, route)
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            HTTP_IN_PROGRESS.dec(method, route)
+            HTTP_LATENCY.observe(method, route, value=time.perf_counter() - started)
+            HTTP_REQUESTS.inc(method, route, str(status_code))
+            DB_QUERIES_PER_REQUEST.observe(method, route, value=stats.queries)
+            DB_TIME_PER_REQUEST.observe(method, route, value=stats.db_seconds)
+            current_request.reset(token)
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, Text, ForeignKey, Boolean, Enum, Date
+from sqlalchemy import Column, Integer, String, DateTime, Text, ForeignKey, Boolean, Enum, Date, Index, DDL, event
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 from .database import Base
@@ -81,6 +81,38 @@ class Defect(Base):
     stage = relationship("ProjectStage")
     assignee = relationship("User", foreign_keys=[assigned_to])
     reporter = relationship("User", foreign_keys=[reported_by])
+    comments = relationship(
+        "DefectComment", back_populates="defect",
+        order_by="(DefectComment.created_at, DefectComment.id)"
+    )
+    attachments = relationship("DefectAttachment", back_populates="defect", order_by="DefectAttachment.id")
+    history = relationship(
+        "DefectHistory", back_populates="defect",
+        order_by="(DefectHistory.changed_at, DefectHistory.id)"
+    )
+
+    __table_args__ = (
+        # Фильтры списка дефектов и keyset-пагинация по (created_at, id): страница
+        # с фильтром читается по индексу уже в порядке сортировки, без сортировки
+        # всех дефектов проекта или статуса
+        Index("ix_defects_project_created", "project_id", "created_at", "id"),
+        Index("ix_defects_status_created", "status", "created_at", "id"),
+        Index("ix_defects_project_status_created", "project_id", "status", "created_at", "id"),
+        Index("ix_defects_reported_by", "reported_by"),
+        Index("ix_defects_assigned_to", "assigned_to"),
+        Index("ix_defects_created_at_id", "created_at", "id"),
+    )
+
+class DefectStatistic(Base):
+    """Счетчики дефектов по (проект, этап, статус, приоритет) для отчетности"""
+    __tablename__ = "defect_statistics"
+
+    project_id = Column(Integer, primary_key=True, autoincrement=False)
+    # 0 — дефект без этапа (NULL нельзя включить в первичный ключ)
+    project_stage_id = Column(Integer, primary_key=True, autoincrement=False, default=0)
+    status = Column(Enum(DefectStatus), primary_key=True)
+    priority = Column(Enum(PriorityLevel), primary_key=True)
+    count = Column(Integer, nullable=False, default=0)
 
 class DefectComment(Base):
     __tablename__ = "defect_comments"
@@ -91,7 +123,7 @@ class DefectComment(Base):
     comment = Column(Text, nullable=False)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
-    defect = relationship("Defect")
+    defect = relationship("Defect", back_populates="comments")
     user = relationship("User")
 
 class DefectAttachment(Base):
@@ -105,7 +137,7 @@ class DefectAttachment(Base):
     uploaded_by = Column(Integer, ForeignKey("users.id"), nullable=False)
     uploaded_at = Column(DateTime(timezone=True), server_default=func.now())
 
-    defect = relationship("Defect")
+    defect = relationship("Defect", back_populates="attachments")
     uploader = relationship("User")
 
 class DefectHistory(Base):
@@ -113,11 +145,88 @@ class DefectHistory(Base):
 
     id = Column(Integer, primary_key=True, index=True, autoincrement=True)
     defect_id = Column(Integer, ForeignKey("defects.id"), nullable=False)
+    # Копия defects.project_id: лента проекта читается по индексу без JOIN
+    project_id = Column(Integer, ForeignKey("projects.id"))
     field_name = Column(String(100), nullable=False)
     old_value = Column(Text)
     new_value = Column(Text)
     changed_by = Column(Integer, ForeignKey("users.id"), nullable=False)
     changed_at = Column(DateTime(timezone=True), server_default=func.now())
 
-    defect = relationship("Defect")
-    user = relationship("User")
\ No newline at end of file
+    defect = relationship("Defect", back_populates="history")
+    user = relationship("User")
+
+    __table_args__ = (
+        # Keyset-пагинация истории дефекта и ленты проекта по (changed_at, id)
+        Index("ix_defect_history_defect_changed", "defect_id", "changed_at", "id"),
+        Index("ix_defect_history_project_changed", "project_id", "changed_at", "id"),
+    )
+
+class DataVersion(Base):
+    """Версии данных для ETag: увеличиваются в транзакции каждого изменения (app.versions)"""
+    __tablename__ = "data_versions"
+
+    key = Column(String(100), primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+
+class EmailOutbox(Base):
+    """Исходящие письма: отправляются фоновым диспетчером (app.mailer)"""
+    __tablename__ = "email_outbox"
+
+    id = Column(Integer, primary_key=True, index=True, autoincrement=True)
+    recipient = Column(String(255), nullable=False)
+    subject = Column(String(255), nullable=False)
+    body = Column(Text, nullable=False)
+    # pending — ждет отправки, sending — взято диспетчером, sent, failed
+    status = Column(String(20), default="pending", nullable=False)
+    attempts = Column(Integer, default=0, nullable=False)
+    next_attempt_at = Column(DateTime, nullable=False)
+    last_error = Column(Text)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    sent_at = Column(DateTime)
+
+    __table_args__ = (
+        Index("ix_email_outbox_status_next_attempt", "status", "next_attempt_at"),
+    )
+
+class SearchDocument(Base):
+    """Полнотекстовый индекс по дефектам и комментариям (app.search)"""
+    __tablename__ = "search_documents"
+
+    id = Column(Integer, primary_key=True, index=True, autoincrement=True)
+    # defect — заголовок и описание дефекта, comment — текст комментария
+    source = Column(String(20), nullable=False)
+    source_id = Column(Integer, nullable=False)
+    defect_id = Column(Integer, ForeignKey("defects.id"), nullable=False)
+    project_id = Column(Integer, ForeignKey("projects.id"), nullable=False)
+    title = Column(String(500))
+    body = Column(Text)
+    # Основы слов после стемминга: по ним и строится полнотекстовый индекс
+    terms = Column(Text, nullable=False)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+    __table_args__ = (
+        Index("ix_search_documents_source", "source", "source_id", unique=True),
+        Index("ix_search_documents_project_id", "project_id"),
+        Index("ix_search_documents_terms", "terms", mysql_prefix="FULLTEXT").ddl_if(dialect="mysql"),
+    )
+
+# В SQLite (локальная разработка) вместо FULLTEXT используется FTS5,
+# синхронизируемый с search_documents триггерами
+SQLITE_SEARCH_DDL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS search_fts USING fts5(terms, content='search_documents', content_rowid='id')",
+    """CREATE TRIGGER IF NOT EXISTS search_documents_ai AFTER INSERT ON search_documents BEGIN
+        INSERT INTO search_fts(rowid, terms) VALUES (new.id, new.terms);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS search_documents_ad AFTER DELETE ON search_documents BEGIN
+        INSERT INTO search_fts(search_fts, rowid, terms) VALUES ('delete', old.id, old.terms);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS search_documents_au AFTER UPDATE ON search_documents BEGIN
+        INSERT INTO search_fts(search_fts, rowid, terms) VALUES ('delete', old.id, old.terms);
+        INSERT INTO search_fts(rowid, terms) VALUES (new.id, new.terms);
+    END""",
+]
+
+for statement in SQLITE_SEARCH_DDL:
+    event.listen(SearchDocument.__table__, "after_create", DDL(statement).execute_if(dialect="sqlite"))
+event.listen(SearchDocument.__table__, "before_drop", DDL("DROP TABLE IF EXISTS search_fts").execute_if(dialect="sqlite"))
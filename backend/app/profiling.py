@@ -0,0 +1,78 @@
+"""Профилирование SQL (включается SQL_PROFILING=1).
+
+Запросы дольше SLOW_QUERY_MS пишутся в лог app.sql.slow с параметрами и
+планом выполнения (EXPLAIN), а ответы получают заголовок Server-Timing с
+числом запросов и временем БД — N+1 в обработчике видно прямо в DevTools.
+"""
+import logging
+import os
+import time
+
+from sqlalchemy import event
+
+from .metrics import current_request
+
+SQL_PROFILING = os.getenv("SQL_PROFILING", "0") == "1"
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "100"))
+SLOW_QUERY_EXPLAIN = os.getenv("SLOW_QUERY_EXPLAIN", "1") == "1"
+PARAMS_LOG_LIMIT = 1000
+
+logger = logging.getLogger("app.sql.slow")
+
+
+def explain_prefix(dialect: str) -> str:
+    return "EXPLAIN QUERY PLAN " if dialect == "sqlite" else "EXPLAIN "
+
+
+def explain(conn, statement: str, parameters) -> str:
+    """План запроса; выполняется на том же соединении, в той же транзакции"""
+    conn.info["explaining"] = True
+    try:
+        result = conn.exec_driver_sql(explain_prefix(conn.dialect.name) + statement, parameters)
+        return "\n".join(" | ".join(str(value) for value in row) for row in result)
+    except Exception as e:
+        return f"EXPLAIN не выполнен: {e}"
+    finally:
+        conn.info["explaining"] = False
+
+
+def instrument_slow_queries(engine):
+    """Логировать медленные запросы синхронного движка (для async — engine.sync_engine)"""
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("profile_started", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        elapsed_ms = (time.perf_counter() - conn.info["profile_started"].pop()) * 1000
+        if elapsed_ms < SLOW_QUERY_MS or conn.info.get("explaining"):
+            return
+
+        stats = current_request.get()
+        plan = None
+        # EXPLAIN только для чтения: для изменений он в некоторых СУБД выполняет сам запрос
+        if SLOW_QUERY_EXPLAIN and not executemany and statement.lstrip().upper().startswith("SELECT"):
+            plan = explain(conn, statement, parameters)
+        logger.warning(
+            "Slow query %.1f ms [%s]\n%s\nparams: %s%s",
+            elapsed_ms,
+            f"{stats.method} {stats.route}" if stats else "-",
+            statement,
+            repr(parameters)[:PARAMS_LOG_LIMIT],
+            f"\nplan:\n{plan}" if plan else ""
+        )
+
+    @event.listens_for(engine, "handle_error")
+    def _error(context):
+        started = context.connection.info.get("profile_started") if context.connection is not None else None
+        if started:
+            started.pop()
+
+
+def server_timing(stats, total_seconds: float) -> str:
+    """Значение заголовка Server-Timing для итогов запроса"""
+    return (
+        f'db;dur={stats.db_seconds * 1000:.1f};desc="{stats.queries} queries", '
+        f"app;dur={total_seconds * 1000:.1f}"
+    )
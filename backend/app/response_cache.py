@@ -0,0 +1,191 @@
+"""Кэш готовых JSON-ответов для редко меняющихся данных (проекты, этапы).
+
+Ключ — пространство имен, его поколение, эндпоинт и роль. Обработчики
+изменений вызывают invalidate(пространство): поколение увеличивается, и
+старые записи больше не читаются (в Redis они уходят по TTL). Бэкенды:
+
+    RESPONSE_CACHE_BACKEND=memory  — LRU в памяти процесса (по умолчанию)
+    RESPONSE_CACHE_BACKEND=redis   — Redis или совместимый сервер, RESPONSE_CACHE_URL
+    RESPONSE_CACHE_BACKEND=shared  — хранилище app.shared_state (shm или redis)
+    RESPONSE_CACHE_BACKEND=none    — без кэша
+
+При нескольких воркерах сброс кэша в памяти рассылается через shared_state.
+"""
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+from .shared_state import shared_state
+
+logger = logging.getLogger(__name__)
+
+RESPONSE_CACHE_BACKEND = os.getenv("RESPONSE_CACHE_BACKEND", "memory")
+RESPONSE_CACHE_URL = os.getenv("RESPONSE_CACHE_URL", "redis://localhost:6379/0")
+RESPONSE_CACHE_TTL = int(os.getenv("RESPONSE_CACHE_TTL", "300"))
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "1024"))
+RESPONSE_CACHE_PREFIX = os.getenv("RESPONSE_CACHE_PREFIX", "control:")
+
+
+class MemoryBackend:
+    """LRU в памяти процесса с ограничением времени жизни"""
+    name = "memory"
+    shared = False
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._items = OrderedDict()
+        self._counters = {}
+        self._lock = threading.Lock()
+
+    async def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            item = self._items.get(key)
+            if item is None or item[1] < time.monotonic():
+                if item is not None:
+                    del self._items[key]
+                return None
+            self._items.move_to_end(key)
+            return item[0]
+
+    async def set(self, key: str, value: bytes, ttl: int):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._items[key] = (value, time.monotonic() + ttl)
+            self._items.move_to_end(key)
+            while len(self._items) > self.maxsize:
+                self._items.popitem(last=False)
+
+    async def counter(self, key: str) -> int:
+        with self._lock:
+            return self._counters.get(key, 0)
+
+    async def incr(self, key: str) -> int:
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + 1
+            return self._counters[key]
+
+    def size(self) -> int:
+        return len(self._items)
+
+
+class RedisBackend:
+    """Redis или совместимый сервер; клиент — redis.asyncio.Redis или его аналог"""
+    name = "redis"
+    shared = True
+
+    def __init__(self, client):
+        self.client = client
+
+    @classmethod
+    def from_url(cls, url: str):
+        # Пакет redis нужен только для этого бэкенда
+        import redis.asyncio
+        return cls(redis.asyncio.from_url(url))
+
+    async def get(self, key: str) -> Optional[bytes]:
+        return await self.client.get(key)
+
+    async def set(self, key: str, value: bytes, ttl: int):
+        await self.client.set(key, value, ex=ttl)
+
+    async def counter(self, key: str) -> int:
+        return int(await self.client.get(key) or 0)
+
+    async def incr(self, key: str) -> int:
+        return await self.client.incr(key)
+
+    def size(self):
+        return None
+
+
+class ResponseCache:
+    def __init__(self, backend, ttl: int, prefix: str = ""):
+        self.backend = backend
+        self.ttl = ttl
+        self.prefix = prefix
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+        self._get_seconds = 0.0
+
+    async def make_key(self, namespace: str, key: str) -> str:
+        generation = await self.backend.counter(f"{self.prefix}gen:{namespace}")
+        return f"{self.prefix}{namespace}:{generation}:{key}"
+
+    async def get(self, key: str) -> Optional[Tuple[str, bytes]]:
+        """(ETag, тело ответа) или None. Ошибка кэша — промах, а не ошибка запроса."""
+        started = time.perf_counter()
+        try:
+            value = await self.backend.get(key)
+        except Exception as e:
+            self.errors += 1
+            logger.warning("Response cache error: %s", e)
+            value = None
+        self._get_seconds += time.perf_counter() - started
+        if value is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        etag, body = value.split(b"\n", 1)
+        return etag.decode("ascii"), body
+
+    async def set(self, key: str, etag: str, body: bytes):
+        try:
+            await self.backend.set(key, etag.encode("ascii") + b"\n" + body, self.ttl)
+        except Exception as e:
+            self.errors += 1
+            logger.warning("Response cache error: %s", e)
+
+    async def invalidate(self, namespace: str):
+        """Сбросить все ответы пространства имен (вызывать после commit)"""
+        await self.invalidate_local(namespace)
+        # Поколения в памяти у каждого процесса свои — сообщаем остальным
+        if not self.backend.shared:
+            shared_state.broadcast("response_cache", namespace)
+
+    async def invalidate_local(self, namespace: str):
+        try:
+            await self.backend.incr(f"{self.prefix}gen:{namespace}")
+        except Exception as e:
+            self.errors += 1
+            logger.warning("Response cache error: %s", e)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "backend": self.backend.name,
+            "hits": self.hits,
+            "misses": self.misses,
+            "errors": self.errors,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else None,
+            "avg_get_ms": round(self._get_seconds / lookups * 1000, 3) if lookups else None,
+            "size": self.backend.size(),
+        }
+
+
+class NullBackend(MemoryBackend):
+    """Кэш выключен: ничего не хранится, все обращения — промахи"""
+    name = "none"
+
+    def __init__(self):
+        super().__init__(0)
+
+
+def create_backend(name: str):
+    if name == "memory":
+        return MemoryBackend(RESPONSE_CACHE_SIZE)
+    if name == "redis":
+        return RedisBackend.from_url(RESPONSE_CACHE_URL)
+    if name == "shared":
+        return shared_state.backend if shared_state.shared else MemoryBackend(RESPONSE_CACHE_SIZE)
+    if name == "none":
+        return NullBackend()
+    raise ValueError(f"Неизвестный RESPONSE_CACHE_BACKEND: {name}")
+
+
+response_cache = ResponseCache(create_backend(RESPONSE_CACHE_BACKEND), RESPONSE_CACHE_TTL, RESPONSE_CACHE_PREFIX)
+shared_state.on("response_cache", response_cache.invalidate_local)
@@ -1,5 +1,5 @@
-from pydantic import BaseModel, EmailStr
-from typing import Optional, List
+from pydantic import AliasChoices, BaseModel, EmailStr, Field
+from typing import Any, Dict, Optional, List
 from datetime import date, datetime
 from enum import Enum
 
@@ -31,6 +31,15 @@ class UserProfile(BaseModel):
     class Config:
         from_attributes = True
 
+class UserBrief(BaseModel):
+    id: int
+    login: str
+    full_name: str = Field(validation_alias=AliasChoices("full_name", "fio"))
+    role: str
+
+    class Config:
+        from_attributes = True
+
 # Простые схемы для проектов
 class ProjectBase(BaseModel):
     name: str
@@ -94,6 +103,15 @@ class DefectUpdate(BaseModel):
     due_date: Optional[date] = None
     actual_completion_date: Optional[date] = None
 
+class DefectBulkUpdate(DefectUpdate):
+    id: int
+
+class BulkItemResult(BaseModel):
+    index: int
+    ok: bool
+    id: Optional[int] = None
+    detail: Optional[str] = None
+
 class Defect(DefectBase):
     id: int
     project_id: int
@@ -139,4 +157,53 @@ class Attachment(AttachmentBase):
     uploaded_at: Optional[datetime] = None
 
     class Config:
-        from_attributes = True
\ No newline at end of file
+        from_attributes = True
+
+# Схемы для поиска
+class SearchHit(BaseModel):
+    source: str
+    defect_id: int
+    comment_id: Optional[int] = None
+    project_id: int
+    title: Optional[str] = None
+    snippet: Optional[str] = None
+    score: float
+
+class SearchResults(BaseModel):
+    items: List[SearchHit]
+    limit: int
+    offset: int
+    has_more: bool
+
+# Схемы для истории изменений
+class DefectHistoryEntry(BaseModel):
+    id: int
+    defect_id: int
+    project_id: Optional[int] = None
+    field_name: str
+    old_value: Optional[str] = None
+    new_value: Optional[str] = None
+    changed_by: int
+    changed_at: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
+
+# Дефект со всеми связанными данными
+class DefectFull(Defect):
+    project: Project
+    stage: Optional[ProjectStage] = None
+    assignee: Optional[UserBrief] = None
+    reporter: UserBrief
+    comments: List[Comment] = []
+    attachments: List[Attachment] = []
+    history: List[DefectHistoryEntry] = []
+
+# Схема стартовых данных главной страницы
+class Dashboard(BaseModel):
+    user: UserProfile
+    projects: List[Project]
+    defects: List[Defect]
+    next_cursor: Optional[str] = None
+    statistics: Optional[Dict[str, Any]] = None
+    users: Optional[List[UserProfile]] = None
@@ -0,0 +1,217 @@
+"""Полнотекстовый поиск по дефектам и комментариям.
+
+Тексты приводятся к основам слов стеммером Snowball (русский и английский),
+поэтому «трещина», «трещины» и «трещиной» находятся одним запросом. Основы
+лежат в search_documents.terms, по которому построен FULLTEXT-индекс MySQL
+(в SQLite — таблица FTS5). Индекс обновляется в транзакциях обработчиков;
+пересчет с нуля:
+
+    python -m app.search rebuild
+"""
+import html
+import re
+import sys
+import threading
+
+from sqlalchemy import select, text, insert
+from sqlalchemy.orm import Session
+
+from . import models
+
+WORD_RE = re.compile(r"[0-9a-zа-яё]+", re.IGNORECASE)
+CYRILLIC_RE = re.compile(r"[а-яё]")
+SNIPPET_LENGTH = 200
+
+_stemmers = threading.local()
+
+
+def stem(word: str) -> str:
+    # Стеммеры Snowball хранят состояние, поэтому у каждого потока свои
+    if not hasattr(_stemmers, "ru"):
+        # Словари стеммеров грузятся при первом поиске, а не при старте
+        import snowballstemmer
+        _stemmers.ru = snowballstemmer.stemmer("russian")
+        _stemmers.en = snowballstemmer.stemmer("english")
+    word = word.lower().replace("ё", "е")
+    stemmer = _stemmers.ru if CYRILLIC_RE.search(word) else _stemmers.en
+    return stemmer.stemWord(word)
+
+
+def stems(value) -> list:
+    return [stem(word) for word in WORD_RE.findall(value or "")]
+
+
+def document_values(source: str, source_id: int, defect_id: int, project_id: int, title, body) -> dict:
+    return {
+        "source": source,
+        "source_id": source_id,
+        "defect_id": defect_id,
+        "project_id": project_id,
+        "title": title,
+        "body": body,
+        "terms": " ".join(stems(f"{title or ''} {body or ''}")),
+    }
+
+
+def defect_document(defect: models.Defect) -> dict:
+    return document_values("defect", defect.id, defect.id, defect.project_id, defect.title, defect.description)
+
+
+def comment_document(comment: models.DefectComment, project_id: int) -> dict:
+    return document_values("comment", comment.id, comment.defect_id, project_id, None, comment.comment)
+
+
+def insert_documents(db: Session, documents: list):
+    """Добавить документы новых записей одним executemany"""
+    if documents:
+        db.execute(insert(models.SearchDocument), documents)
+
+
+def upsert_document(db: Session, values: dict):
+    document = db.execute(
+        select(models.SearchDocument).where(
+            models.SearchDocument.source == values["source"],
+            models.SearchDocument.source_id == values["source_id"]
+        )
+    ).scalar_one_or_none()
+    if document is None:
+        db.add(models.SearchDocument(**values))
+        return
+    for field, value in values.items():
+        setattr(document, field, value)
+
+
+def index_new_defects(db: Session, defects: list):
+    insert_documents(db, [defect_document(defect) for defect in defects])
+
+
+def index_defect(db: Session, defect: models.Defect):
+    upsert_document(db, defect_document(defect))
+
+
+def index_new_comment(db: Session, comment: models.DefectComment, project_id: int):
+    insert_documents(db, [comment_document(comment, project_id)])
+
+
+def match_query(dialect: str, query_stems: list):
+    """(условия WHERE, выражение релевантности — больше лучше, параметры)"""
+    if dialect == "mysql":
+        against = " ".join(f"+{term}*" for term in query_stems)
+        match = "MATCH (search_documents.terms) AGAINST (:fts_query IN BOOLEAN MODE)"
+        return [text(match)], text(f"{match} AS score"), {"fts_query": against}
+    if dialect == "sqlite":
+        fts_query = " ".join(f'"{term}"*' for term in query_stems)
+        condition = text(
+            "search_documents.id IN (SELECT rowid FROM search_fts WHERE search_fts MATCH :fts_query)"
+        )
+        # bm25 в FTS5 отрицательный: чем меньше, тем релевантнее
+        score = text(
+            "(SELECT -bm25(search_fts) FROM search_fts "
+            "WHERE search_fts MATCH :fts_query AND search_fts.rowid = search_documents.id) AS score"
+        )
+        return [condition], score, {"fts_query": fts_query}
+    # Прочие СУБД: без индекса, только чтобы поиск работал
+    conditions = [models.SearchDocument.terms.like(f"%{term}%") for term in query_stems]
+    return conditions, text("1 AS score"), {}
+
+
+async def search_documents(db, query_stems: list, user_id: int, role: str, project_id, limit: int, offset: int):
+    """Страница (SearchDocument, score), отсортированная по релевантности"""
+    conditions, score, params = match_query(db.get_bind().dialect.name, query_stems)
+
+    statement = (
+        select(models.SearchDocument, score)
+        .join(models.Defect, models.Defect.id == models.SearchDocument.defect_id)
+        .where(*conditions)
+    )
+    if project_id:
+        statement = statement.where(models.SearchDocument.project_id == project_id)
+    # Инженеры видят только свои дефекты
+    if role == "engineer":
+        statement = statement.where(
+            (models.Defect.reported_by == user_id) | (models.Defect.assigned_to == user_id)
+        )
+    statement = statement.order_by(text("score DESC"), models.SearchDocument.id.desc())
+    statement = statement.limit(limit).offset(offset)
+
+    return (await db.execute(statement, params)).all()
+
+
+def highlight(value, query_stems: list):
+    """Фрагмент текста с найденными словами в <mark>, HTML экранирован"""
+    if not value:
+        return None
+    matches = [
+        m for m in WORD_RE.finditer(value)
+        if any(stem(m.group()).startswith(term) for term in query_stems)
+    ]
+
+    start = 0
+    if len(value) > SNIPPET_LENGTH and matches:
+        start = max(matches[0].start() - SNIPPET_LENGTH // 4, 0)
+    end = min(start + SNIPPET_LENGTH, len(value))
+
+    parts = ["…" if start > 0 else ""]
+    position = start
+    for m in matches:
+        if m.start() < start or m.end() > end:
+            continue
+        parts.append(html.escape(value[position:m.start()]))
+        parts.append(f"<mark>{html.escape(m.group())}</mark>")
+        position = m.end()
+    parts.append(html.escape(value[position:end]))
+    parts.append("…" if end < len(value) else "")
+    return "".join(parts)
+
+
+REBUILD_BATCH_SIZE = 1000
+
+
+def _batches(db: Session, statement, id_column):
+    """Строки запроса пачками по возрастанию id (без серверного курсора)"""
+    last_id = 0
+    while True:
+        rows = db.execute(
+            statement.where(id_column > last_id).order_by(id_column).limit(REBUILD_BATCH_SIZE)
+        ).all()
+        if not rows:
+            return
+        yield rows
+        last_id = rows[-1][0].id
+        db.expunge_all()
+
+
+def rebuild_search_index(db: Session):
+    """Пересчитать search_documents с нуля"""
+    db.query(models.SearchDocument).delete()
+    if db.get_bind().dialect.name == "sqlite":
+        db.execute(text("INSERT INTO search_fts(search_fts) VALUES ('rebuild')"))
+
+    count = 0
+    for rows in _batches(db, select(models.Defect), models.Defect.id):
+        insert_documents(db, [defect_document(defect) for (defect,) in rows])
+        count += len(rows)
+
+    comments = select(models.DefectComment, models.Defect.project_id).join(
+        models.Defect, models.Defect.id == models.DefectComment.defect_id
+    )
+    for rows in _batches(db, comments, models.DefectComment.id):
+        insert_documents(db, [comment_document(comment, project_id) for comment, project_id in rows])
+        count += len(rows)
+
+    db.commit()
+    return count
+
+
+if __name__ == "__main__":
+    from .database import SessionLocal
+
+    if sys.argv[1:] != ["rebuild"]:
+        print("Использование: python -m app.search rebuild")
+        sys.exit(2)
+    db = SessionLocal()
+    try:
+        documents = rebuild_search_index(db)
+        print(f"✅ Поисковый индекс пересчитан: {documents} документов")
+    finally:
+        db.close()
@@ -0,0 +1,280 @@
+"""Быстрое заполнение базы синтетическими данными.
+
+    python -m app.seed --projects 100 --defects 1000000 --history 5000000 --seed 42
+
+Строки вставляются пачками через executemany драйвера (без ORM и без
+обработки параметров SQLAlchemy на каждую строку). Новые id идут после
+существующих, поэтому запуск добавляет данные к уже имеющимся; счетчики
+id в PostgreSQL после загрузки сдвигаются за вставленные строки. У каждой
+таблицы свой генератор случайных чисел от --seed: одинаковые параметры дают
+одинаковые строки, а изменение размера одной таблицы не меняет другие.
+"""
+import argparse
+import json
+import random
+import sys
+import time
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import func, select, text
+
+from . import models
+
+SEED_BATCH_SIZE = 5000
+# Commit реже, чем пачка: меньше fsync, но транзакции не растут неограниченно
+SEED_COMMIT_ROWS = 100000
+SEED_PASSWORD = "Bench123!"
+BASE_TIME = datetime(2024, 1, 1)
+
+DEFECT_TITLES = [
+    "Трещина в несущей стене", "Протечка кровли", "Скол плитки", "Отслоение штукатурки",
+    "Неровность стяжки", "Дефект остекления", "Нарушение гидроизоляции", "Коррозия арматуры",
+]
+STAGE_NAMES = ["Фундамент", "Каркас", "Кровля", "Инженерные сети", "Отделка"]
+HISTORY_FIELDS = ["status", "priority", "assigned_to", "title", "due_date"]
+USER_ROLES = ["engineer"] * 6 + ["manager"] * 2 + ["observer"] * 2
+
+
+def table_rng(seed: int, table: str) -> random.Random:
+    return random.Random(f"{seed}:{table}")
+
+
+def next_id(conn, model) -> int:
+    return (conn.scalar(select(func.max(model.id))) or 0) + 1
+
+
+def sync_sequences(conn, *tables):
+    """Сдвинуть последовательности id за строки, вставленные с явными id (conn или Session)"""
+    dialect = conn.dialect if hasattr(conn, "dialect") else conn.get_bind().dialect
+    # MySQL и SQLite сами продолжают счетчик после наибольшего id
+    if dialect.name != "postgresql":
+        return
+    for model in tables:
+        table = model.__table__
+        conn.execute(
+            text(
+                "SELECT setval(pg_get_serial_sequence(:table, 'id'), coalesce(max(id), 1), max(id) IS NOT NULL) "
+                f"FROM {dialect.identifier_preparer.format_table(table)}"
+            ),
+            {"table": table.name}
+        )
+
+
+class BulkLoader:
+    """Пачечная вставка кортежей в таблицу с commit каждые SEED_COMMIT_ROWS строк.
+
+    Используется как контекстный менеджер: на выходе настройки сессии,
+    ускоряющие загрузку, возвращаются к прежним, ведь соединение уходит
+    обратно в пул.
+    """
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.placeholder = "?" if conn.dialect.paramstyle == "qmark" else "%s"
+        self.uncommitted = 0
+        self.restore_sql = None
+
+    def __enter__(self):
+        conn = self.conn
+        if conn.dialect.name == "mysql":
+            foreign_key_checks, unique_checks = conn.exec_driver_sql(
+                "SELECT @@SESSION.foreign_key_checks, @@SESSION.unique_checks"
+            ).one()
+            self.restore_sql = (
+                f"SET SESSION foreign_key_checks = {int(foreign_key_checks)}, unique_checks = {int(unique_checks)}"
+            )
+            # Ключи новых строк заведомо уникальны и ссылаются на существующие записи
+            conn.exec_driver_sql("SET SESSION foreign_key_checks = 0, unique_checks = 0")
+        if conn.dialect.name == "sqlite":
+            synchronous = conn.exec_driver_sql("PRAGMA synchronous").scalar()
+            self.restore_sql = f"PRAGMA synchronous = {int(synchronous)}"
+            # Генерацию можно повторить, поэтому ждать записи на диск незачем
+            conn.exec_driver_sql("PRAGMA synchronous = OFF")
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            self.conn.rollback()
+        if self.restore_sql is not None:
+            self.conn.exec_driver_sql(self.restore_sql)
+            self.conn.commit()
+
+    def load(self, model, columns: list, rows) -> int:
+        table = model.__table__
+        preparer = self.conn.dialect.identifier_preparer
+        sql = "INSERT INTO {} ({}) VALUES ({})".format(
+            preparer.format_table(table),
+            ", ".join(preparer.quote(column) for column in columns),
+            ", ".join([self.placeholder] * len(columns)),
+        )
+        count = 0
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= SEED_BATCH_SIZE:
+                count += self._flush(sql, batch)
+                batch = []
+        if batch:
+            count += self._flush(sql, batch)
+        self.commit()
+        return count
+
+    def _flush(self, sql: str, batch: list) -> int:
+        self.conn.exec_driver_sql(sql, batch)
+        self.uncommitted += len(batch)
+        if self.uncommitted >= SEED_COMMIT_ROWS:
+            self.commit()
+        return len(batch)
+
+    def commit(self):
+        self.conn.commit()
+        self.uncommitted = 0
+
+
+def seed_dataset(engine, projects: int, defects: int, history: int, comments: int, users: int, seed: int) -> dict:
+    """Добавить синтетические данные и пересчитать производные таблицы"""
+    from sqlalchemy.orm import Session
+
+    from .auth import get_password_hash
+    from .statistics import rebuild_defect_statistics
+    from .versions import PROJECTS, bump_version, bump_defect_versions
+
+    started = time.perf_counter()
+    counts = {}
+
+    with engine.connect() as conn, BulkLoader(conn) as loader:
+        # Пароль у всех один, хэш считаем один раз
+        password_hash = get_password_hash(SEED_PASSWORD)
+        first_user = next_id(conn, models.User)
+        user_ids = list(range(first_user, first_user + users))
+        counts["users"] = loader.load(
+            models.User, ["id", "email", "login", "fio", "password_hash", "role", "created_at"],
+            (
+                (user_id, f"seed{user_id}@example.com", f"seed{user_id}", f"Пользователь {user_id}",
+                 password_hash, USER_ROLES[i % len(USER_ROLES)], BASE_TIME)
+                for i, user_id in enumerate(user_ids)
+            )
+        )
+        if not user_ids:
+            # Без новых пользователей автором всех записей будет последний существующий
+            user_ids = [max(first_user - 1, 1)]
+
+        first_project = next_id(conn, models.Project)
+        project_ids = list(range(first_project, first_project + projects))
+        counts["projects"] = loader.load(
+            models.Project, ["id", "name", "description", "address", "status", "created_by", "created_at"],
+            (
+                (project_id, f"Объект №{project_id}", "Синтетический проект", f"ул. Тестовая, {project_id}",
+                 "активный", user_ids[0], BASE_TIME)
+                for project_id in project_ids
+            )
+        )
+
+        first_stage = next_id(conn, models.ProjectStage)
+        stages = {
+            project_id: [first_stage + i * len(STAGE_NAMES) + j for j in range(len(STAGE_NAMES))]
+            for i, project_id in enumerate(project_ids)
+        }
+        counts["stages"] = loader.load(
+            models.ProjectStage, ["id", "project_id", "name", "sequence", "status", "created_at"],
+            (
+                (stage_id, project_id, STAGE_NAMES[j], j + 1, "активный", BASE_TIME)
+                for project_id, stage_ids in stages.items()
+                for j, stage_id in enumerate(stage_ids)
+            )
+        )
+
+        # Проект каждого дефекта нужен истории; массив id компактнее списка словарей
+        rng = table_rng(seed, "defects")
+        first_defect = next_id(conn, models.Defect)
+        defect_projects = [rng.choice(project_ids) for _ in range(defects)] if project_ids else []
+        defects = len(defect_projects)
+        statuses = [status.name for status in models.DefectStatus]
+        priorities = [priority.name for priority in models.PriorityLevel]
+
+        def defect_rows():
+            for i, project_id in enumerate(defect_projects):
+                created_at = BASE_TIME + timedelta(seconds=i * 30 + rng.randrange(30))
+                yield (
+                    first_defect + i, project_id,
+                    rng.choice(stages[project_id]) if rng.random() < 0.8 else None,
+                    rng.choice(DEFECT_TITLES), f"Синтетический дефект {first_defect + i}",
+                    rng.choice(priorities), rng.choice(statuses),
+                    rng.choice(user_ids) if rng.random() < 0.7 else None, rng.choice(user_ids),
+                    date(2024, 1, 1) + timedelta(days=rng.randrange(730)), created_at, created_at,
+                )
+
+        counts["defects"] = loader.load(
+            models.Defect,
+            ["id", "project_id", "project_stage_id", "title", "description", "priority", "status",
+             "assigned_to", "reported_by", "due_date", "created_at", "updated_at"],
+            defect_rows()
+        )
+
+        def history_rows():
+            history_rng = table_rng(seed, "history")
+            for i in range(history):
+                index = history_rng.randrange(defects)
+                yield (
+                    first_defect + index, defect_projects[index], history_rng.choice(HISTORY_FIELDS),
+                    "было", "стало", history_rng.choice(user_ids),
+                    BASE_TIME + timedelta(seconds=index * 30 + 60 + i % 86400),
+                )
+
+        def comment_rows():
+            comment_rng = table_rng(seed, "comments")
+            for i in range(comments):
+                index = comment_rng.randrange(defects)
+                yield (
+                    first_defect + index, comment_rng.choice(user_ids),
+                    f"Комментарий {i} к дефекту {first_defect + index}",
+                    BASE_TIME + timedelta(seconds=index * 30 + 120),
+                )
+
+        if defects:
+            counts["history"] = loader.load(
+                models.DefectHistory,
+                ["defect_id", "project_id", "field_name", "old_value", "new_value", "changed_by", "changed_at"],
+                history_rows()
+            )
+            counts["comments"] = loader.load(
+                models.DefectComment, ["defect_id", "user_id", "comment", "created_at"], comment_rows()
+            )
+
+        sync_sequences(conn, models.User, models.Project, models.ProjectStage, models.Defect)
+        conn.commit()
+
+    # Производные данные: сводная статистика и версии для ETag
+    with Session(engine) as db:
+        rebuild_defect_statistics(db)
+        bump_version(db, PROJECTS)
+        bump_defect_versions(db, project_ids)
+        db.commit()
+
+    counts["seconds"] = round(time.perf_counter() - started, 2)
+    return counts
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m app.seed", description="Синтетические данные")
+    parser.add_argument("--projects", type=int, default=100)
+    parser.add_argument("--defects", type=int, default=1_000_000)
+    parser.add_argument("--history", type=int, default=5_000_000)
+    parser.add_argument("--comments", type=int, default=500_000)
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--search-index", action="store_true", help="пересчитать поисковый индекс (долго)")
+    args = parser.parse_args(argv)
+
+    from .database import engine, SessionLocal
+
+    result = seed_dataset(engine, args.projects, args.defects, args.history, args.comments, args.users, args.seed)
+    if args.search_index:
+        from .search import rebuild_search_index
+        with SessionLocal() as db:
+            result["search_documents"] = rebuild_search_index(db)
+    print(json.dumps(result, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
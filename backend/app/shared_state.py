@@ -0,0 +1,372 @@
+"""Общее состояние процессов-воркеров: счетчики, значения с TTL и рассылка.
+
+В памяти процесса живут кэш пользователей, кэш ответов и подписчики
+/api/events. При нескольких воркерах (WORKERS в run.py) изменения в одном
+процессе рассылаются остальным: сброс кэшей и события дефектов. Здесь же
+воркеры оставляют снимки своих метрик, чтобы /metrics отдавал сумму.
+
+    SHARED_STATE_BACKEND=local  — один процесс, рассылать некому (по умолчанию)
+    SHARED_STATE_BACKEND=shm    — файл SQLite в /dev/shm, воркеры одного сервера;
+                                  путь — SHARED_STATE_PATH, по умолчанию свой
+                                  для каждого каталога приложения и базы
+    SHARED_STATE_BACKEND=redis  — Redis или совместимый сервер, SHARED_STATE_URL
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import socket
+import sqlite3
+import tempfile
+import threading
+import time
+from typing import Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+def default_state_path() -> str:
+    """Файл состояния одного развертывания: соседние копии на сервере его не делят"""
+    app_dir = os.path.dirname(os.path.abspath(__file__))
+    deployment = hashlib.sha1(f"{app_dir}|{os.getenv('DATABASE_URL', '')}".encode()).hexdigest()[:12]
+    directory = "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+    return os.path.join(directory, f"control-system-state-{deployment}.sqlite")
+
+
+SHARED_STATE_BACKEND = os.getenv("SHARED_STATE_BACKEND", "local")
+SHARED_STATE_URL = os.getenv("SHARED_STATE_URL", "redis://localhost:6379/0")
+SHARED_STATE_PATH = os.getenv("SHARED_STATE_PATH") or default_state_path()
+SHARED_STATE_PREFIX = os.getenv("SHARED_STATE_PREFIX", "control:")
+SHARED_POLL_INTERVAL = float(os.getenv("SHARED_POLL_INTERVAL", "0.05"))
+SHARED_SNAPSHOT_INTERVAL = float(os.getenv("SHARED_SNAPSHOT_INTERVAL", "5"))
+# Сколько секунд сообщения хранятся в shm: за это время их прочитают все воркеры
+SHARED_MESSAGE_RETENTION = 60
+
+
+class LocalState:
+    """Один процесс: значения в памяти, рассылать некому"""
+    name = "local"
+    shared = False
+
+    def __init__(self):
+        self._values = {}
+        self._counters = {}
+        self._lock = threading.Lock()
+
+    async def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            item = self._values.get(key)
+            if item is None or item[1] < time.monotonic():
+                self._values.pop(key, None)
+                return None
+            return item[0]
+
+    async def set(self, key: str, value: bytes, ttl: int):
+        with self._lock:
+            self._values[key] = (value, time.monotonic() + ttl)
+
+    async def items(self, prefix: str) -> Dict[str, bytes]:
+        now = time.monotonic()
+        with self._lock:
+            return {k: v for k, (v, expires) in self._values.items() if k.startswith(prefix) and expires >= now}
+
+    async def counter(self, key: str) -> int:
+        with self._lock:
+            return self._counters.get(key, 0)
+
+    async def incr(self, key: str) -> int:
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + 1
+            return self._counters[key]
+
+    async def publish(self, message: bytes):
+        pass
+
+    async def listen(self, callback: Callable):
+        await asyncio.Event().wait()
+
+    def size(self):
+        return None
+
+
+class SqliteState:
+    """Файл SQLite (в /dev/shm — в памяти) общий для процессов одного сервера.
+
+    Рассылка — таблица сообщений, которую каждый воркер опрашивает раз в
+    SHARED_POLL_INTERVAL. Запросы уходят в поток (asyncio.to_thread): при
+    блокировке файла другим процессом sqlite3 ждет до 5 секунд, и цикл
+    событий не должен стоять все это время.
+    """
+    name = "shm"
+    shared = True
+
+    def __init__(self, path: str):
+        self.path = path
+        self._conn = None
+        self._lock = threading.Lock()
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            conn = sqlite3.connect(self.path, isolation_level=None, check_same_thread=False, timeout=5)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=OFF")
+            conn.execute("CREATE TABLE IF NOT EXISTS kv (key TEXT PRIMARY KEY, value BLOB, expires REAL)")
+            conn.execute("CREATE TABLE IF NOT EXISTS counters (key TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS messages (id INTEGER PRIMARY KEY AUTOINCREMENT, data BLOB, created REAL)"
+            )
+            self._conn = conn
+        return self._conn
+
+    def _execute_sync(self, sql: str, parameters=()) -> list:
+        with self._lock:
+            return self._connection().execute(sql, parameters).fetchall()
+
+    async def _execute(self, sql: str, parameters=()) -> list:
+        return await asyncio.to_thread(self._execute_sync, sql, parameters)
+
+    async def get(self, key: str) -> Optional[bytes]:
+        rows = await self._execute("SELECT value FROM kv WHERE key = ? AND expires >= ?", (key, time.time()))
+        return rows[0][0] if rows else None
+
+    async def set(self, key: str, value: bytes, ttl: int):
+        await self._execute("INSERT OR REPLACE INTO kv VALUES (?, ?, ?)", (key, value, time.time() + ttl))
+
+    async def items(self, prefix: str) -> Dict[str, bytes]:
+        rows = await self._execute(
+            "SELECT key, value FROM kv WHERE substr(key, 1, ?) = ? AND expires >= ?",
+            (len(prefix), prefix, time.time())
+        )
+        return dict(rows)
+
+    async def counter(self, key: str) -> int:
+        rows = await self._execute("SELECT value FROM counters WHERE key = ?", (key,))
+        return rows[0][0] if rows else 0
+
+    async def incr(self, key: str) -> int:
+        rows = await self._execute(
+            "INSERT INTO counters VALUES (?, 1) ON CONFLICT(key) DO UPDATE SET value = value + 1 RETURNING value",
+            (key,)
+        )
+        return rows[0][0]
+
+    async def publish(self, message: bytes):
+        await self._execute("INSERT INTO messages (data, created) VALUES (?, ?)", (message, time.time()))
+
+    async def listen(self, callback: Callable):
+        last_id = (await self._execute("SELECT coalesce(max(id), 0) FROM messages"))[0][0]
+        polls = 0
+        while True:
+            await asyncio.sleep(SHARED_POLL_INTERVAL)
+            for message_id, data in await self._execute(
+                "SELECT id, data FROM messages WHERE id > ? ORDER BY id", (last_id,)
+            ):
+                last_id = message_id
+                await callback(data)
+            polls += 1
+            if polls % 200 == 0:
+                await self._cleanup()
+
+    async def _cleanup(self):
+        now = time.time()
+        await self._execute("DELETE FROM messages WHERE created < ?", (now - SHARED_MESSAGE_RETENTION,))
+        await self._execute("DELETE FROM kv WHERE expires < ?", (now,))
+
+    def size(self):
+        return None
+
+
+class RedisState:
+    """Redis или совместимый сервер; клиент — redis.asyncio.Redis или его аналог"""
+    name = "redis"
+    shared = True
+
+    def __init__(self, client, prefix: str = ""):
+        self.client = client
+        self.channel = f"{prefix}broadcast"
+
+    @classmethod
+    def from_url(cls, url: str, prefix: str = ""):
+        # Пакет redis нужен только для этого бэкенда
+        import redis.asyncio
+        return cls(redis.asyncio.from_url(url), prefix)
+
+    async def get(self, key: str) -> Optional[bytes]:
+        return await self.client.get(key)
+
+    async def set(self, key: str, value: bytes, ttl: int):
+        await self.client.set(key, value, ex=ttl)
+
+    async def items(self, prefix: str) -> Dict[str, bytes]:
+        keys = [key async for key in self.client.scan_iter(match=f"{prefix}*")]
+        if not keys:
+            return {}
+        values = await self.client.mget(keys)
+        return {
+            key.decode() if isinstance(key, bytes) else key: value
+            for key, value in zip(keys, values) if value is not None
+        }
+
+    async def counter(self, key: str) -> int:
+        return int(await self.client.get(key) or 0)
+
+    async def incr(self, key: str) -> int:
+        return await self.client.incr(key)
+
+    async def publish(self, message: bytes):
+        await self.client.publish(self.channel, message)
+
+    async def listen(self, callback: Callable):
+        pubsub = self.client.pubsub()
+        await pubsub.subscribe(self.channel)
+        try:
+            async for message in pubsub.listen():
+                if message["type"] == "message":
+                    await callback(message["data"])
+        finally:
+            await pubsub.close()
+
+    def size(self):
+        return None
+
+
+def create_backend(name: str):
+    if name == "local":
+        return LocalState()
+    if name == "shm":
+        return SqliteState(SHARED_STATE_PATH)
+    if name == "redis":
+        return RedisState.from_url(SHARED_STATE_URL, SHARED_STATE_PREFIX)
+    raise ValueError(f"Неизвестный SHARED_STATE_BACKEND: {name}")
+
+
+class SharedState:
+    """Рассылка по каналам между процессами и периодические снимки воркеров"""
+
+    def __init__(self, backend, prefix: str = ""):
+        self.backend = backend
+        self.prefix = prefix
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        self.sent = 0
+        self.received = 0
+        self.errors = 0
+        self._handlers: Dict[str, Callable] = {}
+        self._snapshots: Dict[str, Callable] = {}
+        self._loop = None
+        self._outbox = None
+        self._tasks = []
+
+    @property
+    def shared(self) -> bool:
+        return self.backend.shared
+
+    def on(self, channel: str, handler: Callable):
+        """handler(data) — для сообщений канала от других процессов (может быть async)"""
+        self._handlers[channel] = handler
+
+    def broadcast(self, channel: str, data):
+        """Отправить другим процессам. Не блокирует; можно вызывать из любого потока."""
+        if not self.shared or self._loop is None:
+            return
+        # Сериализуем сразу: вызывающий может изменить data после возврата
+        message = json.dumps(
+            {"origin": self.worker_id, "channel": channel, "data": data}, ensure_ascii=False, default=str
+        ).encode("utf-8")
+        try:
+            self._loop.call_soon_threadsafe(self._outbox.put_nowait, message)
+        except RuntimeError:
+            # Цикл событий уже остановлен
+            pass
+
+    def register_snapshot(self, name: str, render: Callable[[], bytes]):
+        """Раз в SHARED_SNAPSHOT_INTERVAL сохранять render() этого воркера под именем name"""
+        self._snapshots[name] = render
+
+    async def snapshots(self, name: str) -> list:
+        """Свежие снимки name от других живых воркеров"""
+        if not self.shared:
+            return []
+        own = f"{self.prefix}snapshot:{name}:{self.worker_id}"
+        items = await self.backend.items(f"{self.prefix}snapshot:{name}:")
+        return [value for key, value in items.items() if key != own]
+
+    async def start(self):
+        if not self.shared:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._outbox = asyncio.Queue()
+        self._tasks = [
+            asyncio.create_task(self._send_loop()),
+            asyncio.create_task(self._listen_loop()),
+            asyncio.create_task(self._snapshot_loop()),
+        ]
+
+    async def stop(self):
+        self._loop = None
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _send_loop(self):
+        while True:
+            message = await self._outbox.get()
+            try:
+                await self.backend.publish(message)
+                self.sent += 1
+            except Exception as e:
+                self.errors += 1
+                logger.warning("Shared state publish error: %s", e)
+
+    async def _listen_loop(self):
+        while True:
+            try:
+                await self.backend.listen(self._dispatch)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.errors += 1
+                logger.warning("Shared state listen error: %s", e)
+                await asyncio.sleep(1)
+
+    async def _dispatch(self, raw: bytes):
+        message = json.loads(raw)
+        if message["origin"] == self.worker_id:
+            return
+        handler = self._handlers.get(message["channel"])
+        if handler is None:
+            return
+        self.received += 1
+        try:
+            result = handler(message["data"])
+            if asyncio.iscoroutine(result):
+                await result
+        except Exception:
+            self.errors += 1
+            logger.exception("Shared state handler error (%s)", message["channel"])
+
+    async def _snapshot_loop(self):
+        while True:
+            for name, render in self._snapshots.items():
+                try:
+                    await self.backend.set(
+                        f"{self.prefix}snapshot:{name}:{self.worker_id}", render(),
+                        int(SHARED_SNAPSHOT_INTERVAL * 3) + 1
+                    )
+                except Exception as e:
+                    self.errors += 1
+                    logger.warning("Shared state snapshot error: %s", e)
+            await asyncio.sleep(SHARED_SNAPSHOT_INTERVAL)
+
+    def stats(self) -> dict:
+        return {
+            "backend": self.backend.name,
+            "worker": self.worker_id,
+            "sent": self.sent,
+            "received": self.received,
+            "errors": self.errors,
+        }
+
+
+shared_state = SharedState(create_backend(SHARED_STATE_BACKEND), SHARED_STATE_PREFIX)
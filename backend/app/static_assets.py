@@ -0,0 +1,215 @@
+"""Статические файлы фронтенда из памяти, сжатые заранее.
+
+При старте (или при первом обращении) все файлы STATIC_ROOT читаются,
+получают хэш содержимого и сжимаются gzip и brotli (если установлен пакет
+brotli). Ссылки на css/ и js/ в HTML и импорты модулей в JS дополняются
+?v=<хэш>: такие URL отдаются с Cache-Control: immutable и больше не
+запрашиваются, пока файл не изменится. Без ?v (и HTML всегда) ответ
+проверяется по ETag. Отдаются только файлы из собранного списка, поэтому
+путь с ../ за пределы каталога просто не найдется.
+
+    STATIC_ROOT=../frontend   каталог фронтенда
+    STATIC_RELOAD=1           пересобирать при изменении файлов (разработка)
+
+Размеры и хэши собранных файлов: python -m app.static_assets
+"""
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import posixpath
+import re
+import sys
+import threading
+from typing import Dict, Optional
+
+from starlette.responses import Response
+
+STATIC_ROOT = os.getenv("STATIC_ROOT", "../frontend")
+STATIC_RELOAD = os.getenv("STATIC_RELOAD", "0") == "1"
+
+IMMUTABLE = "public, max-age=31536000, immutable"
+REVALIDATE = "no-cache"
+# charset=utf-8 к text/* добавляет Starlette
+MEDIA_TYPES = {
+    ".html": "text/html",
+    ".css": "text/css",
+    ".js": "text/javascript",
+}
+COMPRESSIBLE = {".html", ".css", ".js", ".json", ".svg", ".txt"}
+# Предпочтительное сжатие — первым
+ENCODINGS = ("br", "gzip")
+
+HTML_REFERENCE = re.compile(r'((?:href|src)=")((?:css|js)/[^"?#]+)(")')
+JS_IMPORT = re.compile(r"""((?:\bfrom|\bimport)\s*\(?\s*['"])(\.{1,2}/[^'"?#]+)(['"])""")
+
+
+def _brotli():
+    # Пакет brotli необязателен: без него остается gzip
+    try:
+        import brotli
+    except ImportError:
+        return None
+    return brotli
+
+
+def accepted_encodings(header: Optional[str]) -> set:
+    """Кодировки из Accept-Encoding, кроме явно запрещенных (q=0)"""
+    accepted = set()
+    for part in (header or "").split(","):
+        name, _, params = part.partition(";")
+        name = name.strip().lower()
+        params = params.strip().replace(" ", "")
+        if not name or params in ("q=0", "q=0.0", "q=0.00", "q=0.000"):
+            continue
+        accepted.add(name)
+    return accepted
+
+
+class Asset:
+    __slots__ = ("path", "media_type", "hash", "bodies")
+
+    def __init__(self, path: str, content: bytes, brotli=None):
+        ext = posixpath.splitext(path)[1]
+        self.path = path
+        self.media_type = MEDIA_TYPES.get(ext) or mimetypes.guess_type(path)[0] or "application/octet-stream"
+        self.hash = hashlib.sha256(content).hexdigest()[:16]
+        self.bodies = {"identity": content}
+        if ext in COMPRESSIBLE:
+            compressed = {"gzip": gzip.compress(content, 9, mtime=0)}
+            if brotli is not None:
+                compressed["br"] = brotli.compress(content, quality=11)
+            # Сжатый вариант хранится, только если он меньше исходного
+            for encoding, body in compressed.items():
+                if len(body) < len(content):
+                    self.bodies[encoding] = body
+
+    def etag(self, encoding: str) -> str:
+        return f'"{self.hash}"' if encoding == "identity" else f'"{self.hash}-{encoding}"'
+
+    def matches(self, if_none_match: str) -> bool:
+        tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+        return "*" in tags or any(self.etag(encoding) in tags for encoding in self.bodies)
+
+    def response(self, headers, version: Optional[str]) -> Response:
+        """Ответ по заголовкам запроса; version — значение ?v из URL"""
+        accepted = accepted_encodings(headers.get("accept-encoding"))
+        encoding = next((e for e in ENCODINGS if e in self.bodies and e in accepted), "identity")
+        response_headers = {
+            "ETag": self.etag(encoding),
+            # Старый ?v после обновления файла не должен закрепиться в кэше
+            "Cache-Control": IMMUTABLE if version == self.hash else REVALIDATE,
+            "Vary": "Accept-Encoding",
+        }
+        if encoding != "identity":
+            response_headers["Content-Encoding"] = encoding
+
+        if_none_match = headers.get("if-none-match")
+        if if_none_match and self.matches(if_none_match):
+            return Response(status_code=304, headers=response_headers)
+        return Response(self.bodies[encoding], media_type=self.media_type, headers=response_headers)
+
+
+class StaticAssets:
+    def __init__(self, root: str, reload: bool = False):
+        self.root = root
+        self.reload = reload
+        self._assets: Optional[Dict[str, Asset]] = None
+        self._files: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def _scan(self) -> Dict[str, int]:
+        """{путь относительно root: mtime}"""
+        files = {}
+        for dirpath, _, filenames in os.walk(self.root):
+            for name in filenames:
+                full_path = os.path.join(dirpath, name)
+                relative = os.path.relpath(full_path, self.root).replace(os.sep, "/")
+                files[relative] = os.stat(full_path).st_mtime_ns
+        return files
+
+    def load(self) -> Dict[str, Asset]:
+        """Прочитать, связать хэшами и сжать все файлы"""
+        with self._lock:
+            return self._build()
+
+    def ensure_loaded(self) -> Dict[str, Asset]:
+        """Собрать, если еще не собрано; идущую сборку дожидается, а не повторяет"""
+        with self._lock:
+            if self._assets is None:
+                self._build()
+            return self._assets
+
+    def _build(self) -> Dict[str, Asset]:
+        files = self._scan()
+        sources = {}
+        for relative in files:
+            with open(os.path.join(self.root, relative), "rb") as f:
+                sources[relative] = f.read()
+
+        brotli = _brotli()
+        assets = {}
+
+        # Хэш файла зависит от хэшей файлов, на которые он ссылается
+        def version_of(path: str, stack: frozenset) -> Optional[str]:
+            if path in assets:
+                return assets[path].hash
+            if path not in sources or path in stack:
+                return None
+            content = link_references(path, sources[path], lambda target: version_of(target, stack | {path}))
+            assets[path] = Asset(path, content, brotli)
+            return assets[path].hash
+
+        for path in sources:
+            version_of(path, frozenset())
+
+        self._assets = assets
+        self._files = files
+        return assets
+
+    def ready(self) -> Optional[Dict[str, Asset]]:
+        """Собранные файлы без блокировки и обращения к диску; None — нужен get() (в потоке)"""
+        return None if self.reload else self._assets
+
+    def get(self, path: str) -> Optional[Asset]:
+        if self.reload and self._assets is not None and self._scan() != self._files:
+            self.load()
+        return self.ensure_loaded().get(path)
+
+    def stats(self) -> list:
+        assets = self.ensure_loaded()
+        return [
+            {"path": asset.path, "hash": asset.hash, **{e: len(body) for e, body in asset.bodies.items()}}
+            for asset in sorted(assets.values(), key=lambda asset: asset.path)
+        ]
+
+
+def link_references(path: str, content: bytes, version_of) -> bytes:
+    """Дописать ?v=<хэш> к ссылкам HTML на css/js и к относительным импортам JS"""
+    ext = posixpath.splitext(path)[1]
+    pattern = HTML_REFERENCE if ext == ".html" else JS_IMPORT if ext == ".js" else None
+    if pattern is None:
+        return content
+
+    base = posixpath.dirname(path)
+
+    def replace(match):
+        prefix, reference, suffix = match.groups()
+        version = version_of(posixpath.normpath(posixpath.join(base, reference)))
+        if version is None:
+            return match.group(0)
+        return f"{prefix}{reference}?v={version}{suffix}"
+
+    return pattern.sub(replace, content.decode("utf-8")).encode("utf-8")
+
+
+static_assets = StaticAssets(STATIC_ROOT, STATIC_RELOAD)
+
+
+def main():
+    print(json.dumps(static_assets.stats(), ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,169 @@
+"""Сводная таблица defect_statistics.
+
+Обработчики дефектов обновляют счетчики в той же транзакции, что и сами
+дефекты. Пересчет с нуля и проверка расхождений:
+
+    python -m app.statistics rebuild
+    python -m app.statistics check
+"""
+import sys
+
+from sqlalchemy import func, insert, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from . import models
+
+NO_STAGE = 0
+
+
+def stage_key(project_stage_id):
+    return project_stage_id if project_stage_id is not None else NO_STAGE
+
+
+def apply_defect_delta(db: Session, project_id: int, project_stage_id, status, priority, delta: int):
+    """Изменить счетчик группы на delta (без commit — в транзакции вызывающего)"""
+    if delta == 0 or status is None or priority is None:
+        return
+
+    table = models.DefectStatistic.__table__
+    key = (
+        (table.c.project_id == project_id)
+        & (table.c.project_stage_id == stage_key(project_stage_id))
+        & (table.c.status == status)
+        & (table.c.priority == priority)
+    )
+    increment = update(table).where(key).values(count=table.c.count + delta)
+
+    if db.execute(increment).rowcount:
+        return
+
+    # Группы еще нет: вставляем, а при гонке с другой транзакцией повторяем UPDATE
+    try:
+        with db.begin_nested():
+            db.execute(insert(table).values(
+                project_id=project_id,
+                project_stage_id=stage_key(project_stage_id),
+                status=status,
+                priority=priority,
+                count=delta,
+            ))
+    except IntegrityError:
+        db.execute(increment)
+
+
+def defect_key(defect: models.Defect):
+    """Ключ группы дефекта: (project_id, project_stage_id, status, priority)"""
+    return (defect.project_id, defect.project_stage_id, defect.status, defect.priority)
+
+
+def lock_order(key: tuple):
+    # Enum и None не сравниваются между собой: сортируем по строке группы в таблице
+    project_id, project_stage_id, status, priority = key
+    return (project_id, stage_key(project_stage_id), getattr(status, "name", ""), getattr(priority, "name", ""))
+
+
+def apply_defect_deltas(db: Session, deltas: dict):
+    """Применить накопленные изменения {ключ группы: delta} — по одному запросу на группу"""
+    # Один порядок блокировок строк сводной таблицы во всех транзакциях — без взаимных блокировок
+    for key in sorted(deltas, key=lock_order):
+        apply_defect_delta(db, *key, deltas[key])
+
+
+def track_defect_created(db: Session, defect: models.Defect):
+    apply_defect_delta(db, *defect_key(defect), 1)
+
+
+def track_defect_changed(db: Session, old_key: tuple, defect: models.Defect):
+    """old_key — defect_key(defect) до изменения, снятый со строки под SELECT ... FOR UPDATE:
+    иначе два параллельных изменения вычтут из одной и той же старой группы"""
+    new_key = defect_key(defect)
+    if old_key == new_key:
+        return
+    apply_defect_deltas(db, {old_key: -1, new_key: 1})
+
+
+def live_defect_counts(db: Session):
+    """Счетчики, посчитанные напрямую по таблице defects"""
+    rows = (
+        db.query(
+            models.Defect.project_id,
+            func.coalesce(models.Defect.project_stage_id, NO_STAGE),
+            models.Defect.status,
+            models.Defect.priority,
+            func.count(models.Defect.id),
+        )
+        .filter(models.Defect.status.isnot(None), models.Defect.priority.isnot(None))
+        .group_by(
+            models.Defect.project_id,
+            func.coalesce(models.Defect.project_stage_id, NO_STAGE),
+            models.Defect.status,
+            models.Defect.priority,
+        )
+        .all()
+    )
+    return {tuple(row[:4]): row[4] for row in rows}
+
+
+def stored_defect_counts(db: Session):
+    rows = db.query(
+        models.DefectStatistic.project_id,
+        models.DefectStatistic.project_stage_id,
+        models.DefectStatistic.status,
+        models.DefectStatistic.priority,
+        models.DefectStatistic.count,
+    ).all()
+    return {tuple(row[:4]): row[4] for row in rows if row[4]}
+
+
+def rebuild_defect_statistics(db: Session):
+    """Пересчитать сводную таблицу с нуля"""
+    counts = live_defect_counts(db)
+    db.query(models.DefectStatistic).delete()
+    if counts:
+        db.execute(insert(models.DefectStatistic.__table__), [
+            {
+                "project_id": project_id,
+                "project_stage_id": project_stage_id,
+                "status": status,
+                "priority": priority,
+                "count": count,
+            }
+            for (project_id, project_stage_id, status, priority), count in counts.items()
+        ])
+    db.commit()
+    return len(counts)
+
+
+def check_defect_statistics(db: Session):
+    """Список расхождений: (ключ группы, в сводной таблице, фактически)"""
+    live = live_defect_counts(db)
+    stored = stored_defect_counts(db)
+    return [
+        (key, stored.get(key, 0), live.get(key, 0))
+        for key in sorted(set(live) | set(stored), key=repr)
+        if stored.get(key, 0) != live.get(key, 0)
+    ]
+
+
+if __name__ == "__main__":
+    from .database import SessionLocal
+
+    command = sys.argv[1] if len(sys.argv) > 1 else "check"
+    db = SessionLocal()
+    try:
+        if command == "rebuild":
+            groups = rebuild_defect_statistics(db)
+            print(f"✅ Статистика пересчитана: {groups} групп")
+        elif command == "check":
+            drift = check_defect_statistics(db)
+            for key, stored, live in drift:
+                print(f"⚠️ {key}: в таблице {stored}, фактически {live}")
+            if drift:
+                sys.exit(1)
+            print("✅ Расхождений нет")
+        else:
+            print("Использование: python -m app.statistics [rebuild|check]")
+            sys.exit(2)
+    finally:
+        db.close()
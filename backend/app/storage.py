@@ -0,0 +1,109 @@
+"""Хранилище вложений с адресацией по содержимому.
+
+Файл лежит в ATTACHMENTS_DIR/<sha[:2]>/<sha[2:4]>/<sha>, поэтому одинаковые
+фотографии хранятся один раз. Загрузка и выдача идут кусками фиксированного
+размера и не держат файл в памяти целиком.
+"""
+import hashlib
+import os
+import re
+import tempfile
+from typing import Optional, Tuple
+
+ATTACHMENTS_DIR = os.path.abspath(os.getenv("ATTACHMENTS_DIR", "./attachments"))
+ATTACHMENT_MAX_SIZE = int(os.getenv("ATTACHMENT_MAX_SIZE", str(50 * 1024 * 1024)))
+CHUNK_SIZE = 1024 * 1024
+
+
+class AttachmentTooLarge(Exception):
+    pass
+
+
+def content_path(sha256: str) -> str:
+    """Путь внутри хранилища (его и пишем в DefectAttachment.file_path)"""
+    return os.path.join(sha256[:2], sha256[2:4], sha256)
+
+
+def absolute_path(file_path: str) -> str:
+    path = os.path.abspath(os.path.join(ATTACHMENTS_DIR, file_path))
+    if os.path.commonpath([path, ATTACHMENTS_DIR]) != ATTACHMENTS_DIR:
+        raise ValueError("Путь вне хранилища вложений")
+    return path
+
+
+def sha256_of(file_path: str) -> str:
+    return os.path.basename(file_path)
+
+
+def store_file(source) -> Tuple[str, int]:
+    """Скопировать файл в хранилище, считая SHA-256 на лету. Блокирующая функция."""
+    os.makedirs(ATTACHMENTS_DIR, exist_ok=True)
+    digest = hashlib.sha256()
+    size = 0
+
+    fd, tmp_path = tempfile.mkstemp(dir=ATTACHMENTS_DIR, prefix=".upload-")
+    try:
+        with os.fdopen(fd, "wb") as tmp:
+            while True:
+                chunk = source.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > ATTACHMENT_MAX_SIZE:
+                    raise AttachmentTooLarge()
+                digest.update(chunk)
+                tmp.write(chunk)
+
+        sha256 = digest.hexdigest()
+        final_path = absolute_path(content_path(sha256))
+        if os.path.exists(final_path):
+            # Такой файл уже есть — повторно не храним
+            os.remove(tmp_path)
+        else:
+            os.makedirs(os.path.dirname(final_path), exist_ok=True)
+            os.replace(tmp_path, final_path)
+        return sha256, size
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def parse_range(header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """Один диапазон из заголовка Range -> (start, end) включительно.
+
+    None — отдать файл целиком (нет заголовка или несколько диапазонов),
+    ValueError — диапазон не удовлетворим (416).
+    """
+    if not header:
+        return None
+    match = re.fullmatch(r"\s*bytes=(\d*)-(\d*)\s*", header)
+    if not match:
+        return None
+    start, end = match.groups()
+    if not start and not end:
+        return None
+    if not start:
+        # bytes=-N — последние N байт
+        length = int(end)
+        if length == 0:
+            raise ValueError("Пустой диапазон")
+        return max(size - length, 0), size - 1
+    start = int(start)
+    end = min(int(end), size - 1) if end else size - 1
+    if start >= size or start > end:
+        raise ValueError("Диапазон вне файла")
+    return start, end
+
+
+def iter_file(path: str, start: int, end: int):
+    """Байты файла с start по end включительно, кусками по CHUNK_SIZE"""
+    with open(path, "rb") as f:
+        f.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            chunk = f.read(min(CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
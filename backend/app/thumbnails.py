@@ -0,0 +1,91 @@
+"""Превью фотографий дефектов.
+
+Превью считаются в пуле процессов сразу после загрузки и кладутся рядом с
+оригиналом: <sha>.thumb<размер>.jpg и .webp. Если превью еще нет (например,
+файл загружен до появления превью), оно строится при первом запросе.
+"""
+import asyncio
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+THUMBNAIL_SIZE = int(os.getenv("THUMBNAIL_SIZE", "320"))
+THUMBNAIL_WORKERS = int(os.getenv("THUMBNAIL_WORKERS", "2"))
+THUMBNAIL_FORMATS = {
+    "jpeg": ("jpg", "image/jpeg"),
+    "webp": ("webp", "image/webp"),
+}
+
+
+def is_image(content_type) -> bool:
+    return bool(content_type) and content_type.startswith("image/")
+
+
+def thumbnail_path(original_path: str, fmt: str) -> str:
+    extension, _ = THUMBNAIL_FORMATS[fmt]
+    return f"{original_path}.thumb{THUMBNAIL_SIZE}.{extension}"
+
+
+def generate_thumbnails(original_path: str):
+    """Построить все варианты превью. Выполняется в процессе пула."""
+    from PIL import Image, ImageOps
+
+    with Image.open(original_path) as image:
+        # JPEG декодируется сразу в уменьшенном масштабе
+        image.draft("RGB", (THUMBNAIL_SIZE * 2, THUMBNAIL_SIZE * 2))
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail((THUMBNAIL_SIZE, THUMBNAIL_SIZE))
+        if image.mode != "RGB":
+            image = image.convert("RGB")
+
+        for fmt in THUMBNAIL_FORMATS:
+            path = thumbnail_path(original_path, fmt)
+            if os.path.exists(path):
+                continue
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            image.save(tmp_path, format=fmt.upper(), quality=80)
+            os.replace(tmp_path, path)
+
+
+_thumbnail_pool = None
+
+
+def get_thumbnail_pool():
+    global _thumbnail_pool
+    if _thumbnail_pool is None:
+        _thumbnail_pool = ProcessPoolExecutor(max_workers=THUMBNAIL_WORKERS)
+    return _thumbnail_pool
+
+
+def shutdown_thumbnail_pool():
+    global _thumbnail_pool
+    if _thumbnail_pool is not None:
+        _thumbnail_pool.shutdown(wait=False, cancel_futures=True)
+        _thumbnail_pool = None
+
+
+def _report_failure(future):
+    if not future.cancelled() and future.exception():
+        print(f"Thumbnail generation failed: {future.exception()}")
+
+
+def schedule_thumbnails(original_path: str):
+    """Поставить построение превью в очередь, не дожидаясь результата"""
+    future = get_thumbnail_pool().submit(generate_thumbnails, original_path)
+    future.add_done_callback(_report_failure)
+
+
+class ThumbnailError(Exception):
+    """Файл не удалось разобрать как изображение"""
+
+
+async def ensure_thumbnail(original_path: str, fmt: str) -> str:
+    path = thumbnail_path(original_path, fmt)
+    if not os.path.exists(path):
+        # Pillow нужен только здесь и в процессах пула
+        from PIL import Image
+        loop = asyncio.get_running_loop()
+        try:
+            await loop.run_in_executor(get_thumbnail_pool(), generate_thumbnails, original_path)
+        except (OSError, Image.DecompressionBombError) as e:
+            raise ThumbnailError(str(e))
+    return path
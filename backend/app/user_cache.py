@@ -0,0 +1,124 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session, object_session
+
+from .models import User
+from .shared_state import shared_state
+
+USER_CACHE_TTL = float(os.getenv("USER_CACHE_TTL", "60"))
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "1024"))
+
+
+class CachedUser:
+    """Снимок подтвержденного пользователя, не привязанный к сессии БД"""
+    __slots__ = ("id", "email", "login", "fio", "role", "reg_token")
+
+    def __init__(self, user: User):
+        self.id = user.id
+        self.email = user.email
+        self.login = user.login
+        self.fio = user.fio
+        self.role = user.role
+        self.reg_token = user.reg_token
+
+
+class UserCache:
+    """LRU-кэш пользователей по email из JWT с ограничением времени жизни"""
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, email: str):
+        with self._lock:
+            item = self._items.get(email)
+            if item is None or item[1] < time.monotonic():
+                if item is not None:
+                    del self._items[email]
+                self.misses += 1
+                return None
+            self._items.move_to_end(email)
+            self.hits += 1
+            return item[0]
+
+    def put(self, email: str, user: CachedUser):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._items[email] = (user, time.monotonic() + self.ttl)
+            self._items.move_to_end(email)
+            while len(self._items) > self.maxsize:
+                self._items.popitem(last=False)
+
+    def invalidate(self, email: str):
+        with self._lock:
+            self._items.pop(email, None)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+    def stats(self):
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "size": len(self._items)}
+
+
+user_cache = UserCache(USER_CACHE_SIZE, USER_CACHE_TTL)
+# Изменение пользователя в другом воркере сбрасывает запись и здесь
+shared_state.on("user_cache", user_cache.invalidate)
+
+
+def invalidate_everywhere(email: str):
+    user_cache.invalidate(email)
+    shared_state.broadcast("user_cache", email)
+
+
+# Смена роли, регистрационного токена или email сбрасывает запись, где бы она
+# ни произошла, — но только после commit: до него параллельный запрос прочитал
+# бы из базы старую строку и снова положил ее в кэш на USER_CACHE_TTL
+DIRTY_EMAILS = "user_cache_dirty_emails"
+
+
+def _mark_dirty(target, email: str):
+    session = object_session(target)
+    if session is None:
+        invalidate_everywhere(email)
+        return
+    session.info.setdefault(DIRTY_EMAILS, set()).add(email)
+
+
+@event.listens_for(User.role, "set")
+@event.listens_for(User.reg_token, "set")
+def _invalidate_on_change(target, value, oldvalue, initiator):
+    if target.email and value != oldvalue:
+        _mark_dirty(target, target.email)
+
+
+@event.listens_for(User.email, "set")
+def _invalidate_on_email_change(target, value, oldvalue, initiator):
+    if isinstance(oldvalue, str) and value != oldvalue:
+        _mark_dirty(target, oldvalue)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_after_commit(session):
+    # Savepoint (begin_nested) еще не делает изменения видимыми
+    if session.in_nested_transaction():
+        return
+    for email in session.info.pop(DIRTY_EMAILS, ()):
+        invalidate_everywhere(email)
+
+
+@event.listens_for(Session, "after_transaction_end")
+def _forget_after_rollback(session, transaction):
+    # После commit список уже разослан; после rollback или close изменений нет
+    if transaction.parent is None:
+        session.info.pop(DIRTY_EMAILS, None)
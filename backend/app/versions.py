@@ -0,0 +1,63 @@
+"""Счетчики версий данных для условных GET (ETag / If-None-Match).
+
+Обработчики увеличивают версию в той же транзакции, что и изменение:
+"projects" — список проектов, "defects:<project_id>" — дефекты проекта.
+ETag ответа строится из версий и параметров запроса, поэтому для ответа
+304 достаточно прочитать несколько строк data_versions.
+"""
+import hashlib
+from typing import Iterable, Optional
+
+from sqlalchemy import insert, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from . import models
+
+PROJECTS = "projects"
+DEFECTS_PREFIX = "defects:"
+
+
+def defects_key(project_id: int) -> str:
+    return f"{DEFECTS_PREFIX}{project_id}"
+
+
+def bump_version(db: Session, key: str):
+    """Увеличить версию (без commit — в транзакции вызывающего)"""
+    table = models.DataVersion.__table__
+    increment = update(table).where(table.c.key == key).values(version=table.c.version + 1)
+
+    if db.execute(increment).rowcount:
+        return
+
+    # Версии еще нет: вставляем, а при гонке с другой транзакцией повторяем UPDATE
+    try:
+        with db.begin_nested():
+            db.execute(insert(table).values(key=key, version=1))
+    except IntegrityError:
+        db.execute(increment)
+
+
+def bump_defect_versions(db: Session, project_ids: Iterable[int]):
+    # Один порядок блокировок во всех транзакциях — без взаимных блокировок
+    for project_id in sorted(set(project_ids)):
+        bump_version(db, defects_key(project_id))
+
+
+async def defect_versions(db, project_id: Optional[int]) -> list:
+    """[(ключ, версия)] дефектов проекта или всех проектов"""
+    query = select(models.DataVersion.key, models.DataVersion.version)
+    if project_id:
+        query = query.where(models.DataVersion.key == defects_key(project_id))
+    else:
+        query = query.where(models.DataVersion.key.startswith(DEFECTS_PREFIX))
+    return [tuple(row) for row in (await db.execute(query.order_by(models.DataVersion.key))).all()]
+
+
+async def get_version(db, key: str) -> int:
+    return await db.scalar(select(models.DataVersion.version).where(models.DataVersion.key == key)) or 0
+
+
+def make_etag(*parts) -> str:
+    digest = hashlib.sha256(repr(parts).encode("utf-8")).hexdigest()[:32]
+    return f'"{digest}"'
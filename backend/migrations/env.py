@@ -0,0 +1,61 @@
+"""Окружение Alembic: база из DATABASE_URL, целевая схема — app.models"""
+from logging.config import fileConfig
+
+from alembic import context
+from sqlalchemy.engine import make_url
+
+from app.database import Base, DATABASE_URL, engine
+from app.db_schema import include_object_for
+from app import models  # noqa: F401
+
+config = context.config
+
+# Логирование настраиваем только при запуске команды alembic, а не из приложения
+if config.config_file_name is not None and "connection" not in config.attributes:
+    fileConfig(config.config_file_name, disable_existing_loggers=False)
+
+target_metadata = Base.metadata
+
+
+def run_migrations_offline():
+    """alembic upgrade --sql: вывести SQL, не подключаясь к базе"""
+    url = make_url(DATABASE_URL)
+    context.configure(
+        url=url,
+        target_metadata=target_metadata,
+        literal_binds=True,
+        include_object=include_object_for(url.get_backend_name()),
+        transaction_per_migration=True,
+    )
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+def run_with_connection(connection):
+    context.configure(
+        connection=connection,
+        target_metadata=target_metadata,
+        include_object=include_object_for(connection.dialect.name),
+        compare_type=True,
+        # SQLite не умеет большинство ALTER TABLE: autogenerate пишет batch-операции
+        render_as_batch=connection.dialect.name == "sqlite",
+        # Каждая миграция в своей транзакции: сбой не откатывает уже примененные
+        transaction_per_migration=True,
+    )
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+def run_migrations_online():
+    connection = config.attributes.get("connection")
+    if connection is not None:
+        run_with_connection(connection)
+        return
+    with engine.connect() as connection:
+        run_with_connection(connection)
+
+
+if context.is_offline_mode():
+    run_migrations_offline()
+else:
+    run_migrations_online()
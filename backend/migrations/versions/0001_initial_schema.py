@@ -0,0 +1,141 @@
+"""Исходная схема: пользователи, проекты, этапы, дефекты, комментарии, вложения, история
+
+Базу, созданную раньше через create_all, app.db_schema.migrate помечает
+этой ревизией без выполнения; таблицы, добавленные позже, создает 0002.
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0001"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+# В базе хранятся имена членов перечислений (DefectStatus.NEW -> 'NEW')
+DEFECT_STATUS = ("NEW", "IN_PROGRESS", "UNDER_REVIEW", "CLOSED", "CANCELLED")
+PRIORITY_LEVEL = ("LOW", "MEDIUM", "HIGH", "CRITICAL")
+
+
+def defect_status():
+    return sa.Enum(*DEFECT_STATUS, name="defectstatus")
+
+
+def priority_level():
+    return sa.Enum(*PRIORITY_LEVEL, name="prioritylevel")
+
+
+def created_at(name="created_at"):
+    return sa.Column(name, sa.DateTime(timezone=True), server_default=sa.func.now())
+
+
+def upgrade():
+    op.create_table(
+        "users",
+        sa.Column("id", sa.Integer(), primary_key=True, autoincrement=True),
+        sa.Column("email", sa.String(255), nullable=False),
+        sa.Column("login", sa.String(100), nullable=False),
+        sa.Column("fio", sa.String(200), nullable=False),
+        sa.Column("password_hash", sa.String(255), nullable=False),
+        sa.Column("reg_token", sa.String(255), nullable=True),
+        sa.Column("role", sa.String(50), nullable=False),
+        created_at(),
+    )
+    op.create_index("ix_users_id", "users", ["id"])
+    op.create_index("ix_users_email", "users", ["email"], unique=True)
+    op.create_index("ix_users_login", "users", ["login"], unique=True)
+
+    op.create_table(
+        "projects",
+        sa.Column("id", sa.Integer(), primary_key=True, autoincrement=True),
+        sa.Column("name", sa.String(255), nullable=False),
+        sa.Column("description", sa.Text()),
+        sa.Column("address", sa.String(500)),
+        sa.Column("start_date", sa.Date()),
+        sa.Column("end_date", sa.Date()),
+        sa.Column("status", sa.String(50)),
+        sa.Column("created_by", sa.Integer(), sa.ForeignKey("users.id")),
+        created_at(),
+        sa.Column("updated_at", sa.DateTime(timezone=True)),
+    )
+    op.create_index("ix_projects_id", "projects", ["id"])
+
+    op.create_table(
+        "project_stages",
+        sa.Column("id", sa.Integer(), primary_key=True, autoincrement=True),
+        sa.Column("project_id", sa.Integer(), sa.ForeignKey("projects.id"), nullable=False),
+        sa.Column("name", sa.String(255), nullable=False),
+        sa.Column("description", sa.Text()),
+        sa.Column("sequence", sa.Integer()),
+        sa.Column("start_date", sa.Date()),
+        sa.Column("end_date", sa.Date()),
+        sa.Column("status", sa.String(50)),
+        created_at(),
+    )
+    op.create_index("ix_project_stages_id", "project_stages", ["id"])
+
+    op.create_table(
+        "defects",
+        sa.Column("id", sa.Integer(), primary_key=True, autoincrement=True),
+        sa.Column("project_id", sa.Integer(), sa.ForeignKey("projects.id"), nullable=False),
+        sa.Column("project_stage_id", sa.Integer(), sa.ForeignKey("project_stages.id"), nullable=True),
+        sa.Column("title", sa.String(500), nullable=False),
+        sa.Column("description", sa.Text()),
+        sa.Column("priority", priority_level()),
+        sa.Column("status", defect_status()),
+        sa.Column("assigned_to", sa.Integer(), sa.ForeignKey("users.id")),
+        sa.Column("reported_by", sa.Integer(), sa.ForeignKey("users.id"), nullable=False),
+        sa.Column("due_date", sa.Date()),
+        sa.Column("actual_completion_date", sa.Date()),
+        created_at(),
+        sa.Column("updated_at", sa.DateTime(timezone=True)),
+    )
+    op.create_index("ix_defects_id", "defects", ["id"])
+
+    op.create_table(
+        "defect_comments",
+        sa.Column("id", sa.Integer(), primary_key=True, autoincrement=True),
+        sa.Column("defect_id", sa.Integer(), sa.ForeignKey("defects.id"), nullable=False),
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id"), nullable=False),
+        sa.Column("comment", sa.Text(), nullable=False),
+        created_at(),
+    )
+    op.create_index("ix_defect_comments_id", "defect_comments", ["id"])
+
+    op.create_table(
+        "defect_attachments",
+        sa.Column("id", sa.Integer(), primary_key=True, autoincrement=True),
+        sa.Column("defect_id", sa.Integer(), sa.ForeignKey("defects.id"), nullable=False),
+        sa.Column("filename", sa.String(255), nullable=False),
+        sa.Column("file_path", sa.String(500), nullable=False),
+        sa.Column("file_type", sa.String(100)),
+        sa.Column("uploaded_by", sa.Integer(), sa.ForeignKey("users.id"), nullable=False),
+        created_at("uploaded_at"),
+    )
+    op.create_index("ix_defect_attachments_id", "defect_attachments", ["id"])
+
+    # project_id и индексы для пагинации добавляют 0003 и 0004
+    op.create_table(
+        "defect_history",
+        sa.Column("id", sa.Integer(), primary_key=True, autoincrement=True),
+        sa.Column("defect_id", sa.Integer(), sa.ForeignKey("defects.id"), nullable=False),
+        sa.Column("field_name", sa.String(100), nullable=False),
+        sa.Column("old_value", sa.Text()),
+        sa.Column("new_value", sa.Text()),
+        sa.Column("changed_by", sa.Integer(), sa.ForeignKey("users.id"), nullable=False),
+        created_at("changed_at"),
+    )
+    op.create_index("ix_defect_history_id", "defect_history", ["id"])
+
+
+def downgrade():
+    for table in (
+        "defect_history", "defect_attachments", "defect_comments", "defects", "project_stages", "projects", "users",
+    ):
+        op.drop_table(table)
+    if op.get_bind().dialect.name == "postgresql":
+        op.execute("DROP TYPE IF EXISTS defectstatus")
+        op.execute("DROP TYPE IF EXISTS prioritylevel")
@@ -0,0 +1,122 @@
+"""Сводная статистика, версии данных, очередь писем и поисковый индекс
+
+Эти таблицы create_all добавлял по мере появления, поэтому в помеченной
+базе часть из них уже может быть: создаются только недостающие. Новая
+defect_statistics сразу заполняется по существующим дефектам; поисковый
+индекс строит python -m app.manage migrate (термы считает код app.search).
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+from app.db_schema import has_table
+
+revision = "0002"
+down_revision = "0001"
+branch_labels = None
+depends_on = None
+
+DEFECT_STATUS = ("NEW", "IN_PROGRESS", "UNDER_REVIEW", "CLOSED", "CANCELLED")
+PRIORITY_LEVEL = ("LOW", "MEDIUM", "HIGH", "CRITICAL")
+
+# Те же группы, что у app.statistics.live_defect_counts; дефект без этапа — этап 0
+STATISTICS_BACKFILL = """
+    INSERT INTO defect_statistics (project_id, project_stage_id, status, priority, count)
+    SELECT project_id, coalesce(project_stage_id, 0), status, priority, count(*)
+    FROM defects
+    WHERE status IS NOT NULL AND priority IS NOT NULL
+    GROUP BY project_id, coalesce(project_stage_id, 0), status, priority
+"""
+
+SQLITE_SEARCH_DDL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS search_fts USING fts5(terms, content='search_documents', content_rowid='id')",
+    """CREATE TRIGGER IF NOT EXISTS search_documents_ai AFTER INSERT ON search_documents BEGIN
+        INSERT INTO search_fts(rowid, terms) VALUES (new.id, new.terms);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS search_documents_ad AFTER DELETE ON search_documents BEGIN
+        INSERT INTO search_fts(search_fts, rowid, terms) VALUES ('delete', old.id, old.terms);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS search_documents_au AFTER UPDATE ON search_documents BEGIN
+        INSERT INTO search_fts(search_fts, rowid, terms) VALUES ('delete', old.id, old.terms);
+        INSERT INTO search_fts(rowid, terms) VALUES (new.id, new.terms);
+    END""",
+]
+
+
+def existing_enum(values, name):
+    # В PostgreSQL тип уже создан вместе с defects (0001)
+    if op.get_bind().dialect.name == "postgresql":
+        return postgresql.ENUM(*values, name=name, create_type=False)
+    return sa.Enum(*values, name=name)
+
+
+def upgrade():
+    if not has_table("defect_statistics"):
+        op.create_table(
+            "defect_statistics",
+            sa.Column("project_id", sa.Integer(), primary_key=True, autoincrement=False),
+            sa.Column("project_stage_id", sa.Integer(), primary_key=True, autoincrement=False),
+            sa.Column("status", existing_enum(DEFECT_STATUS, "defectstatus"), primary_key=True),
+            sa.Column("priority", existing_enum(PRIORITY_LEVEL, "prioritylevel"), primary_key=True),
+            sa.Column("count", sa.Integer(), nullable=False),
+        )
+        op.execute(STATISTICS_BACKFILL)
+
+    if not has_table("data_versions"):
+        op.create_table(
+            "data_versions",
+            sa.Column("key", sa.String(100), primary_key=True),
+            sa.Column("version", sa.Integer(), nullable=False),
+        )
+
+    if not has_table("email_outbox"):
+        op.create_table(
+            "email_outbox",
+            sa.Column("id", sa.Integer(), primary_key=True, autoincrement=True),
+            sa.Column("recipient", sa.String(255), nullable=False),
+            sa.Column("subject", sa.String(255), nullable=False),
+            sa.Column("body", sa.Text(), nullable=False),
+            sa.Column("status", sa.String(20), nullable=False),
+            sa.Column("attempts", sa.Integer(), nullable=False),
+            sa.Column("next_attempt_at", sa.DateTime(), nullable=False),
+            sa.Column("last_error", sa.Text()),
+            sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+            sa.Column("sent_at", sa.DateTime()),
+        )
+        op.create_index("ix_email_outbox_id", "email_outbox", ["id"])
+        op.create_index("ix_email_outbox_status_next_attempt", "email_outbox", ["status", "next_attempt_at"])
+
+    if not has_table("search_documents"):
+        op.create_table(
+            "search_documents",
+            sa.Column("id", sa.Integer(), primary_key=True, autoincrement=True),
+            sa.Column("source", sa.String(20), nullable=False),
+            sa.Column("source_id", sa.Integer(), nullable=False),
+            sa.Column("defect_id", sa.Integer(), sa.ForeignKey("defects.id"), nullable=False),
+            sa.Column("project_id", sa.Integer(), sa.ForeignKey("projects.id"), nullable=False),
+            sa.Column("title", sa.String(500)),
+            sa.Column("body", sa.Text()),
+            sa.Column("terms", sa.Text(), nullable=False),
+            sa.Column("updated_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+        )
+        op.create_index("ix_search_documents_id", "search_documents", ["id"])
+        op.create_index("ix_search_documents_source", "search_documents", ["source", "source_id"], unique=True)
+        op.create_index("ix_search_documents_project_id", "search_documents", ["project_id"])
+
+        dialect = op.get_bind().dialect.name
+        if dialect == "mysql":
+            op.create_index("ix_search_documents_terms", "search_documents", ["terms"], mysql_prefix="FULLTEXT")
+        elif dialect == "sqlite":
+            for statement in SQLITE_SEARCH_DDL:
+                op.execute(statement)
+
+
+def downgrade():
+    if op.get_bind().dialect.name == "sqlite":
+        op.execute("DROP TABLE IF EXISTS search_fts")
+    for table in ("search_documents", "email_outbox", "data_versions", "defect_statistics"):
+        op.drop_table(table)
@@ -0,0 +1,39 @@
+"""defect_history.project_id: лента проекта читается по индексу без JOIN с defects
+
+Колонка добавляется пустой (в MySQL 8 и PostgreSQL — без перестройки
+таблицы) и заполняется пачками по id, каждая в своей транзакции: строки
+истории не блокируются на все время миграции. Внешний ключ добавляет 0004
+после индекса по project_id.
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+from app.db_schema import backfill_by_id, has_column
+
+revision = "0003"
+down_revision = "0002"
+branch_labels = None
+depends_on = None
+
+BACKFILL_BATCH = 50000
+
+
+def upgrade():
+    # В базе после create_all новой версии колонка уже может быть
+    if not has_column("defect_history", "project_id"):
+        op.add_column("defect_history", sa.Column("project_id", sa.Integer(), nullable=True))
+    backfill_by_id(
+        "defect_history",
+        "project_id = (SELECT defects.project_id FROM defects WHERE defects.id = defect_history.defect_id)",
+        "project_id IS NULL",
+        BACKFILL_BATCH,
+    )
+
+
+def downgrade():
+    with op.batch_alter_table("defect_history") as batch:
+        batch.drop_column("project_id")
@@ -0,0 +1,44 @@
+"""Индексы списка дефектов и истории, построенные без блокировки записи
+
+Фильтры и keyset-пагинация /api/defects, история дефекта и лента проекта.
+PostgreSQL строит индексы CONCURRENTLY, MySQL — ALGORITHM=INPLACE, LOCK=NONE
+(app.db_schema.create_index_online). Уже существующие индексы (база после
+create_all новой версии) пропускаются.
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-18
+"""
+from alembic import op
+
+from app.db_schema import create_foreign_key_online, create_index_online
+
+revision = "0004"
+down_revision = "0003"
+branch_labels = None
+depends_on = None
+
+INDEXES = [
+    ("ix_defects_project_status", "defects", ["project_id", "status"]),
+    ("ix_defects_reported_by", "defects", ["reported_by"]),
+    ("ix_defects_assigned_to", "defects", ["assigned_to"]),
+    ("ix_defects_created_at_id", "defects", ["created_at", "id"]),
+    ("ix_defect_history_defect_changed", "defect_history", ["defect_id", "changed_at", "id"]),
+    ("ix_defect_history_project_changed", "defect_history", ["project_id", "changed_at", "id"]),
+]
+
+
+def upgrade():
+    for name, table, columns in INDEXES:
+        create_index_online(name, table, columns)
+    # Индекс ix_defect_history_project_changed уже покрывает внешний ключ
+    create_foreign_key_online(
+        "fk_defect_history_project_id", "defect_history", "projects", ["project_id"], ["id"]
+    )
+
+
+def downgrade():
+    if op.get_bind().dialect.name != "sqlite":
+        op.drop_constraint("fk_defect_history_project_id", "defect_history", type_="foreignkey")
+    for name, table, _ in reversed(INDEXES):
+        op.drop_index(name, table_name=table)
@@ -0,0 +1,36 @@
+"""Индексы списка дефектов с фильтром и сортировкой по (created_at, id)
+
+Страница с фильтром по проекту или статусу раньше находила строки по
+ix_defects_project_status и сортировала все дефекты проекта ради limit
+строк. Индексы (фильтр, created_at, id) отдают их уже по порядку.
+(project_id, status, created_at, id) покрывает и запросы, которым служил
+ix_defects_project_status, поэтому тот удаляется.
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-18
+"""
+from app.db_schema import create_index_online, drop_index_online
+
+revision = "0005"
+down_revision = "0004"
+branch_labels = None
+depends_on = None
+
+INDEXES = [
+    ("ix_defects_project_created", "defects", ["project_id", "created_at", "id"]),
+    ("ix_defects_status_created", "defects", ["status", "created_at", "id"]),
+    ("ix_defects_project_status_created", "defects", ["project_id", "status", "created_at", "id"]),
+]
+
+
+def upgrade():
+    for name, table, columns in INDEXES:
+        create_index_online(name, table, columns)
+    drop_index_online("ix_defects_project_status", "defects")
+
+
+def downgrade():
+    create_index_online("ix_defects_project_status", "defects", ["project_id", "status"])
+    for name, table, _ in reversed(INDEXES):
+        drop_index_online(name, table)
@@ -1,9 +1,31 @@
+import os
+import sys
+
 import uvicorn
 
+# WORKERS=4 (или auto — по числу ядер) запускает несколько процессов. Кэши,
+# события /api/events и метрики они согласуют через SHARED_STATE_BACKEND:
+# по умолчанию shm (воркеры одного сервера), для нескольких серверов — redis.
+WORKERS = os.getenv("WORKERS", "1")
+
+
+def worker_count() -> int:
+    return (os.cpu_count() or 1) if WORKERS == "auto" else int(WORKERS)
+
+
 if __name__ == "__main__":
+    workers = worker_count()
+    if workers > 1:
+        os.environ.setdefault("SHARED_STATE_BACKEND", "shm")
+        if os.environ["SHARED_STATE_BACKEND"] == "local":
+            sys.exit("SHARED_STATE_BACKEND=local работает только с одним воркером")
+        if os.getenv("DB_INIT_ON_STARTUP", "0") == "1":
+            sys.exit("DB_INIT_ON_STARTUP=1 с несколькими воркерами: сначала python -m app.manage init")
+
     uvicorn.run(
-        "app.main:app", 
+        "app.main:app",
         host="0.0.0.0",
         port=25526,
-        reload=False
-    )
\ No newline at end of file
+        reload=False,
+        workers=workers
+    )
@@ -0,0 +1,75 @@
+"""Общие фикстуры: временная база SQLite со схемой из миграций и клиент API.
+
+Переменные окружения задаются до импорта app: модули читают их при импорте.
+"""
+import os
+import tempfile
+import uuid
+
+TEST_DIR = tempfile.mkdtemp(prefix="control-system-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(TEST_DIR, 'test.sqlite')}"
+os.environ.pop("ASYNC_DATABASE_URL", None)
+os.environ["SHARED_STATE_BACKEND"] = "local"
+os.environ["RESPONSE_CACHE_BACKEND"] = "memory"
+os.environ["DB_INIT_ON_STARTUP"] = "0"
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app import models
+from app.auth import create_access_token
+from app.database import SessionLocal, engine
+from app.db_schema import migrate
+from app.main import app
+
+
+@pytest.fixture(scope="session", autouse=True)
+def database():
+    migrate(engine)
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def db():
+    with SessionLocal() as session:
+        yield session
+
+
+@pytest.fixture(scope="session")
+def client(database):
+    # Без with: lifespan (рассылка писем, общее состояние) тестам API не нужен
+    return TestClient(app)
+
+
+def make_user(db, role: str) -> models.User:
+    name = uuid.uuid4().hex[:12]
+    user = models.User(
+        email=f"{name}@example.com", login=name, fio=f"Пользователь {name}",
+        password_hash="-", role=role
+    )
+    db.add(user)
+    db.commit()
+    return user
+
+
+def auth_headers(user: models.User) -> dict:
+    return {"Authorization": f"Bearer {create_access_token({'email': user.email})}"}
+
+
+@pytest.fixture
+def manager(db):
+    return make_user(db, "manager")
+
+
+@pytest.fixture
+def manager_headers(manager):
+    return auth_headers(manager)
+
+
+@pytest.fixture
+def project(db, manager):
+    project = models.Project(name="Тестовый объект", created_by=manager.id)
+    db.add(project)
+    db.commit()
+    return project
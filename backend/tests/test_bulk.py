@@ -0,0 +1,48 @@
+"""Пакетное создание дефектов: ошибка в элементе не роняет остальные"""
+from app import models
+
+
+def test_bad_references_reported_per_item(client, db, manager, manager_headers, project):
+    stage = models.ProjectStage(project_id=project.id, name="Каркас")
+    other_project = models.Project(name="Другой объект", created_by=manager.id)
+    db.add_all([stage, other_project])
+    db.commit()
+    other_stage = models.ProjectStage(project_id=other_project.id, name="Кровля")
+    db.add(other_stage)
+    db.commit()
+
+    response = client.post("/api/defects/bulk", json=[
+        {"project_id": project.id, "title": "ok", "project_stage_id": stage.id, "assigned_to": manager.id},
+        {"project_id": project.id, "title": "нет этапа", "project_stage_id": 10 ** 9},
+        {"project_id": project.id, "title": "чужой этап", "project_stage_id": other_stage.id},
+        {"project_id": project.id, "title": "нет исполнителя", "assigned_to": 10 ** 9},
+        {"project_id": 10 ** 9, "title": "нет проекта"},
+    ], headers=manager_headers)
+
+    assert response.status_code == 200, response.text
+    results = response.json()
+    assert [item["ok"] for item in results] == [True, False, False, False, False]
+    assert [item["detail"] for item in results[1:]] == [
+        "Этап не найден", "Этап относится к другому проекту", "Исполнитель не найден", "Проект не найден",
+    ]
+    assert db.get(models.Defect, results[0]["id"]).project_stage_id == stage.id
+
+
+def test_unknown_assignee_reported_per_item_on_update(client, db, manager, manager_headers, project):
+    response = client.post("/api/defects/bulk", json=[
+        {"project_id": project.id, "title": "первый"}, {"project_id": project.id, "title": "второй"},
+    ], headers=manager_headers)
+    first, second = (item["id"] for item in response.json())
+
+    response = client.patch("/api/defects/bulk", json=[
+        {"id": first, "assigned_to": manager.id},
+        {"id": second, "assigned_to": 10 ** 9},
+    ], headers=manager_headers)
+
+    assert response.status_code == 200, response.text
+    results = response.json()
+    assert [item["ok"] for item in results] == [True, False]
+    assert results[1]["detail"] == "Исполнитель не найден"
+    db.expire_all()
+    assert db.get(models.Defect, first).assigned_to == manager.id
+    assert db.get(models.Defect, second).assigned_to is None
@@ -0,0 +1,19 @@
+"""События дефектов: без подписчиков ничего не сериализуется и не рассылается"""
+from app import main
+
+
+def test_no_subscribers_no_event(client, manager_headers, project, monkeypatch):
+    published = []
+    monkeypatch.setattr(main.broker, "publish", published.append)
+
+    response = client.post("/api/defects", json={"project_id": project.id, "title": "Скол"}, headers=manager_headers)
+    assert response.status_code == 200, response.text
+    assert published == []
+
+    subscriber = main.broker.subscribe(0, "manager")
+    try:
+        client.patch(f"/api/defects/{response.json()['id']}", json={"title": "Скол плитки"}, headers=manager_headers)
+    finally:
+        main.broker.unsubscribe(subscriber)
+    assert [event["type"] for event in published] == ["defect_updated"]
+    assert published[0]["defect"]["title"] == "Скол плитки"
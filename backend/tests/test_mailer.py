@@ -0,0 +1,160 @@
+"""Отправка писем из email_outbox через локальный SMTP-сервер aiosmtpd"""
+import asyncio
+import socket
+from datetime import datetime, timedelta
+
+import pytest
+from aiosmtpd.controller import Controller
+
+from app import mailer
+from app.mailer import EmailDispatcher, queue_email
+from app.models import EmailOutbox
+
+
+class Handler:
+    def __init__(self):
+        self.messages = []
+        self.fail = False
+
+    async def handle_DATA(self, server, session, envelope):
+        if self.fail:
+            return "451 Временная ошибка"
+        self.messages.append(envelope)
+        return "250 OK"
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@pytest.fixture
+def smtp(monkeypatch):
+    handler = Handler()
+    controller = Controller(handler, hostname="127.0.0.1", port=free_port())
+    controller.start()
+    monkeypatch.setattr(mailer, "SMTP_SERVER", "127.0.0.1")
+    monkeypatch.setattr(mailer, "SMTP_PORT", controller.port)
+    monkeypatch.setattr(mailer, "SMTP_USERNAME", None)
+    monkeypatch.setattr(mailer, "SMTP_PASSWORD", None)
+    monkeypatch.setattr(mailer, "SMTP_STARTTLS", False)
+    yield handler
+    controller.stop()
+
+
+@pytest.fixture
+def outbox(db):
+    db.query(EmailOutbox).delete()
+    db.commit()
+
+    def add(recipient: str = "user@example.com") -> int:
+        message = queue_email(db, recipient, "Тема", "Текст письма")
+        db.commit()
+        return message.id
+    return add
+
+
+def run(*steps):
+    """Выполнить шаги диспетчера в одном цикле событий и закрыть SMTP-соединение"""
+    dispatcher = EmailDispatcher()
+
+    async def main():
+        try:
+            return [await step(dispatcher) for step in steps]
+        finally:
+            await dispatcher._disconnect()
+    return asyncio.run(main())
+
+
+def dispatch(dispatcher):
+    return dispatcher.dispatch_batch()
+
+
+def stored(db, message_id: int) -> EmailOutbox:
+    db.expire_all()
+    return db.get(EmailOutbox, message_id)
+
+
+def test_delivers_pending_messages(smtp, outbox, db):
+    ids = [outbox(f"user{i}@example.com") for i in range(3)]
+
+    assert run(dispatch) == [3]
+
+    assert sorted(envelope.rcpt_tos[0] for envelope in smtp.messages) == [
+        "user0@example.com", "user1@example.com", "user2@example.com",
+    ]
+    for message_id in ids:
+        message = stored(db, message_id)
+        assert (message.status, message.attempts, message.last_error) == ("sent", 1, None)
+        assert message.sent_at is not None
+    # Отправленное письмо повторно не уходит
+    assert run(dispatch) == [0]
+
+
+def test_claimed_message_leased_until_expiry(smtp, outbox, db):
+    message_id = outbox()
+
+    async def claim(dispatcher):
+        from app.database import AsyncSessionLocal
+        async with AsyncSessionLocal() as session:
+            return [message.id for message in await dispatcher._claim(session)]
+
+    # Пока действует аренда, письмо не забирает никто (и другой процесс тоже: условие в UPDATE)
+    assert run(claim, claim) == [[message_id], []]
+    message = stored(db, message_id)
+    assert message.status == "sending"
+    assert message.next_attempt_at > datetime.utcnow() + timedelta(seconds=mailer.EMAIL_LEASE - 60)
+
+    # Аренда истекла (процесс упал, не отправив): письмо забирают снова и отправляют
+    message.next_attempt_at = datetime.utcnow() - timedelta(seconds=1)
+    db.commit()
+    assert run(dispatch) == [1]
+    assert stored(db, message_id).status == "sent"
+    assert len(smtp.messages) == 1
+
+
+def test_failed_send_retried_with_backoff(smtp, outbox, db):
+    message_id = outbox()
+    smtp.fail = True
+
+    started = datetime.utcnow()
+    assert run(dispatch) == [1]
+    message = stored(db, message_id)
+    assert (message.status, message.attempts) == ("pending", 1)
+    assert "451" in message.last_error
+    assert message.next_attempt_at >= started + timedelta(seconds=mailer.EMAIL_RETRY_BASE)
+    # До срока повтора письмо не берется
+    assert run(dispatch) == [0]
+
+    smtp.fail = False
+    message.next_attempt_at = datetime.utcnow() - timedelta(seconds=1)
+    db.commit()
+    assert run(dispatch) == [1]
+    message = stored(db, message_id)
+    assert (message.status, message.attempts) == ("sent", 2)
+    assert len(smtp.messages) == 1
+
+
+async def stats(dispatcher):
+    return dispatcher.stats()
+
+
+def test_gives_up_after_max_attempts(smtp, outbox, db, monkeypatch, caplog):
+    monkeypatch.setattr(mailer, "EMAIL_MAX_ATTEMPTS", 2)
+    message_id = outbox()
+    smtp.fail = True
+
+    results = []
+    for attempt in range(2):
+        results.append(run(dispatch, stats)[1])
+        message = stored(db, message_id)
+        message.next_attempt_at = datetime.utcnow() - timedelta(seconds=1)
+        db.commit()
+
+    message = stored(db, message_id)
+    assert (message.status, message.attempts) == ("failed", 2)
+    assert [(result["retried"], result["failed"]) for result in results] == [(1, 0), (0, 1)]
+    assert [record.levelname for record in caplog.records if record.name == "app.mailer"] == ["ERROR"]
+    assert run(dispatch) == [0]
+    assert smtp.messages == []
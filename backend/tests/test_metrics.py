@@ -0,0 +1,31 @@
+"""Метрики: ряды БД разделены по методу, ожидание и удержание соединений пула"""
+import re
+
+
+def series_value(text: str, name: str, labels: str) -> float:
+    match = re.search(rf"^{name}\{{{re.escape(labels)}\}} (\S+)$", text, re.MULTILINE)
+    return float(match.group(1)) if match else 0.0
+
+
+def test_db_metrics_split_by_method(client, manager_headers, project):
+    before = client.get("/metrics").text
+    client.get("/api/defects", params={"project_id": project.id}, headers=manager_headers)
+    client.post("/api/defects", json={"project_id": project.id, "title": "Скол"}, headers=manager_headers)
+    client.post("/api/defects", json={"project_id": project.id, "title": "Трещина"}, headers=manager_headers)
+    after = client.get("/metrics").text
+
+    def added(labels):
+        return series_value(after, "db_queries_per_request_count", labels) - series_value(
+            before, "db_queries_per_request_count", labels
+        )
+
+    assert added('method="GET",route="/api/defects"') == 1
+    assert added('method="POST",route="/api/defects"') == 2
+    wait = 'method="POST",route="/api/defects"'
+    assert series_value(after, "db_pool_checkout_wait_seconds_count", wait) - series_value(
+        before, "db_pool_checkout_wait_seconds_count", wait
+    ) == 2
+    assert series_value(after, "db_pool_checkouts_total", 'engine="async"') > series_value(
+        before, "db_pool_checkouts_total", 'engine="async"'
+    )
+    assert series_value(after, "db_pool_connection_hold_seconds_count", 'engine="async"') > 0
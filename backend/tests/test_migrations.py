@@ -0,0 +1,32 @@
+"""Обновление базы, созданной без миграций: производные таблицы заполняются"""
+from sqlalchemy import create_engine, func, select, text
+from sqlalchemy.orm import Session
+
+from app import models
+from app.db_schema import migrate
+from app.manage import fill_derived_tables
+from app.statistics import check_defect_statistics
+
+
+def test_upgrade_fills_statistics_and_search(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'old.sqlite'}")
+    # База create_all до появления миграций: исходные таблицы без alembic_version
+    migrate(engine, "0001")
+    with engine.begin() as conn:
+        conn.execute(text("DROP TABLE alembic_version"))
+        conn.execute(text(
+            "INSERT INTO users (id, email, login, fio, password_hash, role) VALUES (1, 'a@b', 'a', 'A', 'x', 'manager')"
+        ))
+        conn.execute(text("INSERT INTO projects (id, name, created_by) VALUES (1, 'Объект', 1)"))
+        conn.execute(text(
+            "INSERT INTO defects (project_id, title, priority, status, reported_by) VALUES "
+            "(1, 'Трещина в стене', 'HIGH', 'NEW', 1), (1, 'Скол плитки', 'LOW', 'CLOSED', 1)"
+        ))
+
+    migrate(engine)
+    with Session(engine) as db:
+        # Сводку заполняет сама миграция
+        assert check_defect_statistics(db) == []
+        fill_derived_tables(db)
+        assert db.scalar(select(func.count()).select_from(models.SearchDocument)) == 2
+    engine.dispose()
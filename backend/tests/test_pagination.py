@@ -0,0 +1,80 @@
+"""Keyset-пагинация по (время, id), когда у многих строк одно и то же время"""
+import json
+
+from app import models
+
+ROWS = 300
+PAGE = 100
+
+
+def fetch_all_pages(client, url: str, headers: dict) -> list:
+    ids = []
+    cursor = None
+    for _ in range(ROWS // PAGE + 2):
+        params = {"limit": PAGE, **({"cursor": cursor} if cursor else {})}
+        response = client.get(url, params=params, headers=headers)
+        assert response.status_code == 200, response.text
+        ids += [row["id"] for row in response.json()]
+        cursor = response.headers.get("X-Next-Cursor")
+        if cursor is None:
+            return ids
+    raise AssertionError(f"курсор не продвигается: {len(ids)} строк, повторы {len(ids) - len(set(ids))}")
+
+
+def create_same_second_defects(client, headers, project_id: int) -> list:
+    # Пачка создается одной транзакцией: у всех строк одинаковый created_at из server_default
+    response = client.post(
+        "/api/defects/bulk",
+        json=[{"project_id": project_id, "title": f"Дефект {i}"} for i in range(ROWS)],
+        headers=headers,
+    )
+    assert response.status_code == 200, response.text
+    return [item["id"] for item in response.json()]
+
+
+def test_defect_pages_pass_equal_timestamps(client, db, manager, manager_headers, project):
+    headers = manager_headers
+    created = create_same_second_defects(client, headers, project.id)
+
+    # Строки с тем же временем, записанные ORM (с микросекундами), тоже попадают в выборку
+    same_time = db.get(models.Defect, created[0]).created_at
+    extra = [models.Defect(project_id=project.id, title="ORM", reported_by=manager.id, created_at=same_time)
+             for _ in range(5)]
+    db.add_all(extra)
+    db.commit()
+    expected = set(created) | {defect.id for defect in extra}
+
+    ids = fetch_all_pages(client, f"/api/defects?project_id={project.id}", headers)
+    assert len(ids) == len(set(ids))
+    assert set(ids) == expected
+
+
+def test_activity_pages_pass_equal_timestamps(client, manager_headers, project):
+    headers = manager_headers
+    create_same_second_defects(client, headers, project.id)
+
+    ids = fetch_all_pages(client, f"/api/projects/{project.id}/activity", headers)
+    assert len(ids) == len(set(ids)) == ROWS
+
+
+def test_export_ends_after_equal_timestamps(client, manager_headers, project, monkeypatch):
+    from app import main
+    headers = manager_headers
+    created = create_same_second_defects(client, headers, project.id)
+    monkeypatch.setattr(main, "EXPORT_BATCH_SIZE", PAGE)
+
+    response = client.get(f"/api/defects/export?project_id={project.id}", headers=headers)
+    assert response.status_code == 200
+    ids = [json.loads(line)["id"] for line in response.text.splitlines()]
+    assert sorted(ids) == sorted(created)
+
+
+def test_filtered_page_read_in_index_order(db):
+    from app.main import build_defects_query
+    order = (models.Defect.created_at.desc(), models.Defect.id.desc())
+    for project_id, status in [(1, None), (None, "новая"), (1, "новая")]:
+        query = build_defects_query(1, "manager", project_id, status).order_by(*order).limit(PAGE)
+        sql = str(query.compile(db.get_bind(), compile_kwargs={"literal_binds": True}))
+        plan = " ".join(row[-1] for row in db.connection().exec_driver_sql(f"EXPLAIN QUERY PLAN {sql}"))
+        # Без индекса (фильтр, created_at, id) страница сортирует все подходящие строки
+        assert "TEMP B-TREE" not in plan, plan
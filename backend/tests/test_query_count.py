@@ -0,0 +1,81 @@
+"""Число SQL-запросов детального дефекта и expand= не зависит от числа связанных строк"""
+from contextlib import contextmanager
+
+import pytest
+from sqlalchemy import event
+
+from app import models
+from app.database import async_engine
+
+ALL_EXPANSIONS = "project,stage,assignee,reporter,comments,attachments,history"
+
+
+@contextmanager
+def count_statements():
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(async_engine.sync_engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(async_engine.sync_engine, "before_cursor_execute", before_cursor_execute)
+
+
+def add_related(db, defect_id: int, user_id: int, count: int):
+    for i in range(count):
+        db.add(models.DefectComment(defect_id=defect_id, user_id=user_id, comment=f"Комментарий {i}"))
+        db.add(models.DefectAttachment(
+            defect_id=defect_id, filename=f"photo{i}.jpg", file_path=f"ab/{i}.jpg",
+            file_type="image/jpeg", uploaded_by=user_id
+        ))
+        db.add(models.DefectHistory(
+            defect_id=defect_id, field_name="status", old_value="новая", new_value="в работе", changed_by=user_id
+        ))
+    db.commit()
+
+
+@pytest.fixture
+def make_defect(client, db, manager, manager_headers, project):
+    stage = models.ProjectStage(project_id=project.id, name="Фундамент")
+    db.add(stage)
+    db.commit()
+
+    def make(related: int) -> int:
+        response = client.post("/api/defects", json={
+            "project_id": project.id, "project_stage_id": stage.id, "assigned_to": manager.id, "title": "Трещина"
+        }, headers=manager_headers)
+        defect_id = response.json()["id"]
+        add_related(db, defect_id, manager.id, related)
+        return defect_id
+    return make
+
+
+def statements_for(client, headers, url: str) -> list:
+    # Пользователь уже в кэше после первого запроса: считаем только запросы самого обработчика
+    client.get(url, headers=headers)
+    with count_statements() as statements:
+        response = client.get(url, headers=headers)
+    assert response.status_code == 200, response.text
+    return statements
+
+
+def test_defect_full_fixed_statement_count(client, manager_headers, make_defect):
+    few = statements_for(client, manager_headers, f"/api/defects/{make_defect(1)}/full")
+    many = statements_for(client, manager_headers, f"/api/defects/{make_defect(20)}/full")
+
+    # Дефект со ссылками одним JOIN и по одному IN-запросу на каждый список
+    assert len(few) == len(many) == 4
+
+
+def test_defect_list_expand_fixed_statement_count(client, manager_headers, project, make_defect):
+    url = f"/api/defects?project_id={project.id}&limit=5&expand={ALL_EXPANSIONS}"
+    make_defect(1)
+    few = statements_for(client, manager_headers, url)
+    for _ in range(4):
+        make_defect(10)
+    many = statements_for(client, manager_headers, url)
+
+    assert len(few) == len(many) == 4
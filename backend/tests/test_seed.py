@@ -0,0 +1,30 @@
+"""Синтетические данные: id после загрузки и настройки соединения из пула"""
+from sqlalchemy import create_engine, func, select
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import StaticPool
+
+from app import models
+from app.db_schema import migrate
+from app.seed import seed_dataset
+
+
+def test_seed_restores_connection_and_keeps_ids(tmp_path):
+    # Одно соединение на движок: загрузчик вернет в пул именно его
+    engine = create_engine(f"sqlite:///{tmp_path / 'seed.sqlite'}", poolclass=StaticPool)
+    migrate(engine)
+    with engine.connect() as conn:
+        synchronous = conn.exec_driver_sql("PRAGMA synchronous").scalar()
+
+    counts = seed_dataset(engine, projects=2, defects=20, history=30, comments=10, users=3, seed=1)
+    assert counts["defects"] == 20
+
+    with engine.connect() as conn:
+        assert conn.exec_driver_sql("PRAGMA synchronous").scalar() == synchronous
+
+    with Session(engine) as db:
+        last_project = db.scalar(select(func.max(models.Project.id)))
+        project = models.Project(name="После загрузки", created_by=1)
+        db.add(project)
+        db.commit()
+        assert project.id == last_project + 1
+    engine.dispose()
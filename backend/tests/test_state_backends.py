@@ -0,0 +1,207 @@
+"""Один контракт для бэкендов кэша ответов и общего состояния: память, Redis (fakeredis), shm"""
+import asyncio
+import os
+import sqlite3
+import tempfile
+import threading
+
+import fakeredis
+import pytest
+
+from app.response_cache import MemoryBackend, RedisBackend, ResponseCache
+from app.shared_state import LocalState, RedisState, SharedState, SqliteState, default_state_path
+
+EXPIRY_TTL = 1
+
+
+def fake_redis_factory():
+    # Клиенты одной фабрики видят одни и те же данные, как процессы с одним сервером Redis
+    server = fakeredis.FakeServer()
+    return lambda: fakeredis.FakeAsyncRedis(server=server)
+
+
+def sqlite_state_factory():
+    path = os.path.join(tempfile.mkdtemp(), "state.sqlite")
+    return lambda: SqliteState(path)
+
+
+def memory_cache_factory():
+    return lambda: MemoryBackend(100)
+
+
+def redis_cache_factory():
+    client = fake_redis_factory()
+    return lambda: RedisBackend(client())
+
+
+def local_state_factory():
+    return LocalState
+
+
+def redis_state_factory():
+    client = fake_redis_factory()
+    return lambda: RedisState(client(), "test:")
+
+
+KV_BACKENDS = {
+    "cache-memory": memory_cache_factory,
+    "cache-redis": redis_cache_factory,
+    "state-local": local_state_factory,
+    "state-shm": sqlite_state_factory,
+    "state-redis": redis_state_factory,
+}
+SHARED_BACKENDS = {
+    "state-shm": sqlite_state_factory,
+    "state-redis": redis_state_factory,
+}
+
+
+@pytest.fixture(params=KV_BACKENDS)
+def backend(request):
+    return KV_BACKENDS[request.param]()()
+
+
+@pytest.fixture(params=SHARED_BACKENDS)
+def shared_factory(request):
+    return SHARED_BACKENDS[request.param]()
+
+
+def test_get_set(backend):
+    async def scenario():
+        assert await backend.get("k1") is None
+        await backend.set("k1", b"value", 60)
+        await backend.set("k2", b"\x00binary\n", 60)
+        assert await backend.get("k1") == b"value"
+        assert await backend.get("k2") == b"\x00binary\n"
+        await backend.set("k1", b"new", 60)
+        assert await backend.get("k1") == b"new"
+    asyncio.run(scenario())
+
+
+def test_counters(backend):
+    async def scenario():
+        assert await backend.counter("gen:a") == 0
+        assert await backend.incr("gen:a") == 1
+        assert await backend.incr("gen:a") == 2
+        assert await backend.counter("gen:a") == 2
+        assert await backend.counter("gen:b") == 0
+    asyncio.run(scenario())
+
+
+def test_expiry(backend):
+    async def scenario():
+        await backend.set("short", b"1", EXPIRY_TTL)
+        await backend.set("long", b"2", 60)
+        await asyncio.sleep(EXPIRY_TTL + 0.2)
+        assert await backend.get("short") is None
+        assert await backend.get("long") == b"2"
+    asyncio.run(scenario())
+
+
+def test_shared_backends_share_values(shared_factory):
+    first, second = shared_factory(), shared_factory()
+
+    async def scenario():
+        await first.set("k", b"v", 60)
+        await first.incr("n")
+        assert await second.get("k") == b"v"
+        assert await second.incr("n") == 2
+        assert await second.items("k") == {"k": b"v"}
+    asyncio.run(scenario())
+
+
+async def wait_for(condition, timeout: float = 3):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not condition() and asyncio.get_running_loop().time() < deadline:
+        await asyncio.sleep(0.02)
+
+
+def test_broadcast_reaches_other_workers_only(shared_factory):
+    sender, receiver = SharedState(shared_factory()), SharedState(shared_factory())
+    sender.worker_id, receiver.worker_id = "worker-a", "worker-b"
+    own, received = [], []
+    sender.on("defects", own.append)
+    receiver.on("defects", received.append)
+
+    async def scenario():
+        await sender.start()
+        await receiver.start()
+        try:
+            # Подписка устанавливается в фоне
+            await asyncio.sleep(0.2)
+            sender.broadcast("defects", {"id": 1})
+            sender.broadcast("other", {"id": 2})
+            await wait_for(lambda: received)
+            await asyncio.sleep(0.1)
+        finally:
+            await sender.stop()
+            await receiver.stop()
+
+    asyncio.run(scenario())
+    assert received == [{"id": 1}]
+    assert own == []
+    assert receiver.received == 1
+
+
+def test_local_state_does_not_broadcast():
+    state = SharedState(LocalState())
+    received = []
+    state.on("defects", received.append)
+
+    async def scenario():
+        await state.start()
+        state.broadcast("defects", {"id": 1})
+        await asyncio.sleep(0.05)
+        await state.stop()
+        assert await state.snapshots("metrics") == []
+
+    asyncio.run(scenario())
+    assert received == []
+    assert state.sent == 0
+
+
+def test_response_cache_invalidation_shared_through_redis():
+    client = fake_redis_factory()
+    first = ResponseCache(RedisBackend(client()), ttl=60, prefix="test:")
+    second = ResponseCache(RedisBackend(client()), ttl=60, prefix="test:")
+
+    async def scenario():
+        key = await first.make_key("projects", "list")
+        await first.set(key, '"v1"', b"[]")
+        assert await second.get(await second.make_key("projects", "list")) == ('"v1"', b"[]")
+        await second.invalidate("projects")
+        assert await first.get(await first.make_key("projects", "list")) is None
+    asyncio.run(scenario())
+
+
+def test_default_shm_path_is_per_deployment(monkeypatch):
+    monkeypatch.setenv("DATABASE_URL", "postgresql://db/first")
+    first = default_state_path()
+    monkeypatch.setenv("DATABASE_URL", "postgresql://db/second")
+    assert default_state_path() != first
+
+
+def test_shm_lock_wait_does_not_block_event_loop(tmp_path):
+    path = str(tmp_path / "state.sqlite")
+    state = SqliteState(path)
+    ticks = []
+
+    async def ticker():
+        while True:
+            ticks.append(1)
+            await asyncio.sleep(0.01)
+
+    async def scenario():
+        await state.set("k", b"1", 60)
+        # Другой процесс держит запись в файл; отпускаем ее из потока
+        other = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+        other.execute("BEGIN EXCLUSIVE")
+        threading.Timer(0.3, other.rollback).start()
+        task = asyncio.create_task(ticker())
+        await state.set("k", b"2", 60)
+        task.cancel()
+        other.close()
+        assert await state.get("k") == b"2"
+
+    asyncio.run(scenario())
+    assert len(ticks) >= 10
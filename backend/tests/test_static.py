@@ -0,0 +1,51 @@
+"""Статика: сборка и проверка файлов не выполняются в цикле событий"""
+import asyncio
+import os
+
+from app import main
+from app.static_assets import StaticAssets
+
+FRONTEND = os.path.join(os.path.dirname(__file__), "..", "..", "frontend")
+
+
+def test_lookup_off_event_loop_until_built(client, monkeypatch):
+    assets = StaticAssets(FRONTEND)
+    monkeypatch.setattr(main, "static_assets", assets)
+    in_loop = []
+    get = assets.get
+
+    def tracking_get(path):
+        try:
+            asyncio.get_running_loop()
+            in_loop.append(path)
+        except RuntimeError:
+            pass
+        return get(path)
+
+    monkeypatch.setattr(assets, "get", tracking_get)
+
+    # До сборки запрос ждет ее в потоке, после — отдается из памяти без get()
+    assert client.get("/").status_code == 200
+    assert assets.ready() is not None
+    assert client.get("/main-page").status_code == 200
+    assert in_loop == []
+
+
+def test_reload_scans_off_event_loop(client, monkeypatch):
+    assets = StaticAssets(FRONTEND, reload=True)
+    assets.load()
+    monkeypatch.setattr(main, "static_assets", assets)
+    scans = []
+    scan = assets._scan
+
+    def tracking_scan():
+        try:
+            asyncio.get_running_loop()
+            scans.append("loop")
+        except RuntimeError:
+            scans.append("thread")
+        return scan()
+
+    monkeypatch.setattr(assets, "_scan", tracking_scan)
+    assert client.get("/").status_code == 200
+    assert scans == ["thread"]
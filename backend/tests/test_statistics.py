@@ -0,0 +1,43 @@
+"""Сводная таблица defect_statistics при изменении дефектов"""
+from app import statistics
+from app.models import DefectStatus, PriorityLevel
+from app.statistics import apply_defect_deltas, check_defect_statistics
+
+
+def test_updates_keep_rollup_consistent(client, db, manager_headers, project):
+    created = client.post(
+        "/api/defects/bulk",
+        json=[{"project_id": project.id, "title": f"Дефект {i}"} for i in range(6)],
+        headers=manager_headers,
+    ).json()
+    ids = [item["id"] for item in created]
+
+    response = client.patch(f"/api/defects/{ids[0]}", json={"status": "в работе"}, headers=manager_headers)
+    assert response.status_code == 200, response.text
+    response = client.patch("/api/defects/bulk", json=[
+        {"id": ids[1], "status": "закрыта", "priority": "высокий"},
+        {"id": ids[2], "status": "в работе"},
+        {"id": ids[0], "status": "на проверке"},
+    ], headers=manager_headers)
+    assert all(item["ok"] for item in response.json()), response.text
+
+    # Другие тесты пишут дефекты в обход статистики: сверяем только свой проект
+    assert [drift for drift in check_defect_statistics(db) if drift[0][0] == project.id] == []
+
+
+def test_deltas_applied_in_lock_order(monkeypatch):
+    applied = []
+    monkeypatch.setattr(statistics, "apply_defect_delta", lambda db, *key_and_delta: applied.append(key_and_delta[:4]))
+    deltas = {
+        (2, None, DefectStatus.NEW, PriorityLevel.LOW): -1,
+        (1, 5, DefectStatus.NEW, PriorityLevel.HIGH): 1,
+        (1, None, DefectStatus.CLOSED, PriorityLevel.LOW): 1,
+        (1, None, DefectStatus.CLOSED, PriorityLevel.HIGH): -1,
+    }
+    apply_defect_deltas(None, deltas)
+    assert applied == [
+        (1, None, DefectStatus.CLOSED, PriorityLevel.HIGH),
+        (1, None, DefectStatus.CLOSED, PriorityLevel.LOW),
+        (1, 5, DefectStatus.NEW, PriorityLevel.HIGH),
+        (2, None, DefectStatus.NEW, PriorityLevel.LOW),
+    ]
@@ -0,0 +1,32 @@
+"""Сброс кэша пользователей при изменении роли — только после commit"""
+from app.user_cache import CachedUser, user_cache
+
+from conftest import make_user
+
+
+def cached(user) -> bool:
+    return user_cache.get(user.email) is not None
+
+
+def test_role_change_invalidates_after_commit(db):
+    user = make_user(db, "engineer")
+    user_cache.put(user.email, CachedUser(user))
+
+    user.role = "manager"
+    db.flush()
+    # До commit в базе старая роль: запись в кэше ей соответствует
+    assert cached(user)
+    db.commit()
+    assert not cached(user)
+
+
+def test_rolled_back_change_keeps_cache(db):
+    user = make_user(db, "engineer")
+    user_cache.put(user.email, CachedUser(user))
+
+    user.role = "manager"
+    db.rollback()
+    assert cached(user)
+    # Следующий commit той же сессии не сбрасывает запись за откаченное изменение
+    db.commit()
+    assert cached(user)
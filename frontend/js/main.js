@@ -1,6 +1,9 @@
 const { createApp } = Vue;
 import { API_BASE_URL } from './config.js';
 
+// Дефекты грузятся страницами по запросу пользователя, а не всей таблицей
+const DEFECTS_PAGE_SIZE = 100;
+
 createApp({
     data() {
         return {
@@ -10,22 +13,35 @@ createApp({
             // Данные для всех ролей
             projects: [],
             defects: [],
+            // Курсор следующей страницы дефектов; null - загружены все
+            defectsCursor: null,
+            loadingMoreDefects: false,
             myDefects: [],
             stats: {},
             // Флаги для модальных окон
             showCreateProject: false,
             showCreateDefect: false,
-            showAllDefects: false
+            showAllDefects: false,
+            // Поток изменений с сервера (/api/events)
+            eventsController: null,
+            statsRefreshTimer: null,
+            // Список пользователей (только для менеджеров)
+            users: []
         };
     },
     async mounted() {
-        await this.checkAuthentication();
+        await this.loadDashboard();
         if (this.userProfile) {
-            await this.loadInitialData();
+            this.subscribeToEvents();
         }
     },
+    beforeUnmount() {
+        if (this.eventsController) this.eventsController.abort();
+    },
     methods: {
-        async checkAuthentication() {
+        // Профиль, проекты, первая страница дефектов, статистика и пользователи -
+        // одним запросом /api/dashboard вместо отдельного запроса на каждый список
+        async loadDashboard() {
             const token = localStorage.getItem('authToken');
             const email = localStorage.getItem('userEmail');
             
@@ -35,43 +51,41 @@ createApp({
             }
             
             try {
-                const response = await fetch(`${API_BASE_URL}/main`, {
+                const response = await fetch(`${API_BASE_URL}/api/dashboard?limit=${DEFECTS_PAGE_SIZE}`, {
                     method: 'GET',
                     headers: {
                         'Authorization': `Bearer ${token}`
                     }
                 });
                 
-                if (response.ok) {
-                    const data = await response.json();
-                    this.userProfile = data.user;
-                    this.isLoading = false;
-                } else {
+                if (response.status === 401 || response.status === 403) {
                     this.clearAuthData();
                     this.redirectToLogin();
+                    return;
                 }
-            } catch (error) {
-                console.error('Auth check error:', error);
-                this.clearAuthData();
-                this.redirectToLogin();
-            }
-        },
-
-        async loadInitialData() {
-            try {
-                await this.loadProjects();
-                await this.loadDefects();
-                await this.loadStatistics();
+                if (!response.ok) {
+                    throw new Error(`HTTP ${response.status}`);
+                }
+                
+                const data = await response.json();
+                this.userProfile = data.user;
+                this.projects = data.projects;
+                this.defects = data.defects;
+                this.defectsCursor = data.next_cursor;
+                if (data.statistics) this.stats = data.statistics;
+                if (data.users) this.users = data.users;
+                this.isLoading = false;
                 
                 // Для инженера фильтруем его дефекты
-                if (this.userProfile.role === 'engineer') {
-                    this.myDefects = this.defects.filter(defect => 
-                        defect.reported_by === this.userProfile.id
-                    );
-                }
+                this.refreshMyDefects();
             } catch (error) {
-                console.error('Error loading initial data:', error);
-                this.showNotification('Ошибка загрузки данных', 'error');
+                console.error('Error loading dashboard:', error);
+                if (this.userProfile) {
+                    this.showNotification('Ошибка загрузки данных', 'error');
+                } else {
+                    this.clearAuthData();
+                    this.redirectToLogin();
+                }
             }
         },
 
@@ -94,34 +108,154 @@ createApp({
             }
         },
 
-        async loadDefects() {
+        // Одна страница дефектов -> { defects, cursor } (курсор следующей - из X-Next-Cursor)
+        async fetchDefectsPage(cursor = null) {
+            const token = localStorage.getItem('authToken');
+            const params = new URLSearchParams({ limit: String(DEFECTS_PAGE_SIZE) });
+            if (cursor) params.set('cursor', cursor);
+
+            const response = await fetch(`${API_BASE_URL}/api/defects?${params}`, {
+                headers: {
+                    'Authorization': `Bearer ${token}`
+                }
+            });
+            if (!response.ok) {
+                throw new Error(`HTTP ${response.status}`);
+            }
+            return {
+                defects: await response.json(),
+                cursor: response.headers.get('X-Next-Cursor')
+            };
+        },
+
+        // Кнопка "Показать еще": следующая страница после уже загруженных
+        async loadMoreDefects() {
+            if (!this.defectsCursor || this.loadingMoreDefects) return;
+            this.loadingMoreDefects = true;
             try {
-                const token = localStorage.getItem('authToken');
-                const response = await fetch(`${API_BASE_URL}/api/defects`, {
-                    headers: {
-                        'Authorization': `Bearer ${token}`
-                    }
-                });
+                const page = await this.fetchDefectsPage(this.defectsCursor);
+                const loaded = new Set(this.defects.map(defect => defect.id));
+                this.defects.push(...page.defects.filter(defect => !loaded.has(defect.id)));
+                this.defectsCursor = page.cursor;
+                this.refreshMyDefects();
+            } catch (error) {
+                console.error('Error loading defects:', error);
+                this.showNotification('Ошибка загрузки дефектов', 'error');
+            } finally {
+                this.loadingMoreDefects = false;
+            }
+        },
 
-                if (response.ok) {
-                    this.defects = await response.json();
-                } else {
-                    console.error('Failed to load defects');
+        // После обрыва потока событий: заново только первая страница и сводка,
+        // догруженные страницы остаются как есть
+        async refreshVisibleData() {
+            try {
+                const page = await this.fetchDefectsPage();
+                const fresh = new Map(page.defects.map(defect => [defect.id, defect]));
+                const rest = this.defects.filter(defect => !fresh.has(defect.id));
+                this.defects = [...page.defects, ...rest];
+                if (this.defects.length === page.defects.length) {
+                    this.defectsCursor = page.cursor;
                 }
+                this.refreshMyDefects();
             } catch (error) {
                 console.error('Error loading defects:', error);
             }
+            if (['manager', 'observer'].includes(this.userProfile.role)) {
+                await this.loadStatistics();
+            }
+        },
+
+        // Изменения дефектов приходят потоком Server-Sent Events вместо повторных
+        // запросов /api/defects. fetch, а не EventSource: нужен заголовок Authorization
+        async subscribeToEvents() {
+            let retryDelay = 1000;
+            while (this.userProfile) {
+                this.eventsController = new AbortController();
+                try {
+                    const token = localStorage.getItem('authToken');
+                    const response = await fetch(`${API_BASE_URL}/api/events`, {
+                        headers: {
+                            'Authorization': `Bearer ${token}`
+                        },
+                        signal: this.eventsController.signal
+                    });
+                    if (response.status === 401) {
+                        this.clearAuthData();
+                        this.redirectToLogin();
+                        return;
+                    }
+                    if (response.ok) {
+                        retryDelay = 1000;
+                        await this.readEvents(response.body);
+                    }
+                } catch (error) {
+                    if (error.name === 'AbortError') return;
+                    console.error('Events stream error:', error);
+                }
+                // Пока нас не было, события могли потеряться - обновляем видимое
+                await new Promise(resolve => setTimeout(resolve, retryDelay));
+                retryDelay = Math.min(retryDelay * 2, 30000);
+                await this.refreshVisibleData();
+            }
+        },
+
+        async readEvents(body) {
+            const reader = body.pipeThrough(new TextDecoderStream()).getReader();
+            let buffer = '';
+            while (true) {
+                const { value, done } = await reader.read();
+                if (done) return;
+                buffer += value;
+                let boundary;
+                while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+                    const block = buffer.slice(0, boundary);
+                    buffer = buffer.slice(boundary + 2);
+                    const data = block.split('\n')
+                        .filter(line => line.startsWith('data:'))
+                        .map(line => line.slice(5).trim())
+                        .join('\n');
+                    if (data) this.handleEvent(JSON.parse(data));
+                }
+            }
+        },
+
+        handleEvent(event) {
+            if (event.defect) {
+                const index = this.defects.findIndex(defect => defect.id === event.defect.id);
+                if (index === -1) {
+                    this.defects.unshift(event.defect);
+                } else {
+                    this.defects.splice(index, 1, event.defect);
+                }
+                this.refreshMyDefects();
+                this.scheduleStatisticsRefresh();
+            }
+        },
+
+        refreshMyDefects() {
+            if (this.userProfile.role === 'engineer') {
+                this.myDefects = this.defects.filter(defect => 
+                    defect.reported_by === this.userProfile.id
+                );
+            }
+        },
+
+        // Пачка событий подряд - одна перезагрузка статистики
+        scheduleStatisticsRefresh() {
+            clearTimeout(this.statsRefreshTimer);
+            this.statsRefreshTimer = setTimeout(() => this.loadStatistics(), 2000);
         },
 
         async loadAllDefects() {
-            await this.loadDefects();
             this.showAllDefects = true;
+            await this.loadMoreDefects();
         },
 
         async loadStatistics() {
             try {
                 const token = localStorage.getItem('authToken');
-                const response = await fetch(`${API_BASE_URL}/api/reports/defects-statistics`, {
+                const response = await fetch(`${API_BASE_URL}/api/reports/defects-statistics?breakdown=project`, {
                     headers: {
                         'Authorization': `Bearer ${token}`
                     }
@@ -161,8 +295,8 @@ createApp({
                 });
 
                 if (response.ok) {
-                    const users = await response.json();
-                    this.showNotification(`Загружено ${users.length} пользователей`, 'info');
+                    this.users = await response.json();
+                    this.showNotification(`Загружено ${this.users.length} пользователей`, 'info');
                 }
             } catch (error) {
                 console.error('Error loading users:', error);
@@ -194,11 +328,20 @@ createApp({
             return roles[role] || role;
         },
 
+        // Счетчики по проекту - из статистики: загружена лишь часть дефектов
+        projectStatistics(projectId) {
+            return (this.stats.by_project || []).find(group => group.project_id === projectId);
+        },
+
         getProjectDefectsCount(projectId) {
+            const group = this.projectStatistics(projectId);
+            if (group) return group.total;
             return this.defects.filter(defect => defect.project_id === projectId).length;
         },
 
         getProjectCompletedCount(projectId) {
+            const group = this.projectStatistics(projectId);
+            if (group) return group.by_status['закрыта'];
             return this.defects.filter(defect => 
                 defect.project_id === projectId && defect.status === 'закрыта'
             ).length;
@@ -257,6 +400,8 @@ createApp({
         },
         
         logout() {
+            this.userProfile = null;
+            if (this.eventsController) this.eventsController.abort();
             this.clearAuthData();
             window.location.href = '/';
         }